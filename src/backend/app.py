@@ -2,31 +2,220 @@ import os
 import time
 import uuid
 import re
-import httpx
-from typing import Dict, Any, Optional, List
+import functools
+import math
+from typing import TYPE_CHECKING, Dict, Any, Optional, List, Callable, Awaitable, Tuple
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from langchain_openai import ChatOpenAI
-from langchain.memory import ConversationBufferMemory
-from langchain.schema import HumanMessage, AIMessage, SystemMessage
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse
+from pydantic import BaseModel, ValidationError
 import json
 import glob
+import hashlib
+import hmac
+import logging
 from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
 
 # Import only the needed function for log processing
-from utils.log_handler import partition_log_into_blocks
+from utils.log_handler import load_config
+from utils.async_utils import run_in_thread
+from utils.job_store import JobStore
+from utils.job_queue import JobWorkerPool
+from utils.preprocess import PreprocessService, build_blocks, block_byte_sizes, combined_content_hash
+from utils.results_store import ResultsStore
+from utils.singleflight import SingleFlight
+from utils.admission import AdmissionController, AdmissionRejected
+from utils.template_cache import TemplateResultCache, template_result_key
+from utils.analytics import AnalyticsStore
+from utils.template_registry import TemplateRegistry, TemplatePathNotAllowed
+from utils.upload_store import UploadStore, UploadNotFound, UploadTooLarge
+from utils.blank_extraction import LogIndex, extract_blanks, format_local_result, format_prefilled_blanks
+from utils.metrics import MetricsRegistry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from utils.tracing import Tracer, TraceExporter
+from utils.profiling import RequestProfiler, ProfilerBusy
+from utils.structured_logging import setup_logging, shutdown_logging, log_context, current_log_context
+from utils.token_ledger import TokenLedger, UsageRecorder, BudgetExceeded, call_cost, recording, current_recorder
+from utils.estimate import (DEFAULT_BYTES_PER_TOKEN, DEFAULT_COMPLETION_TOKENS, PROMPT_OVERHEAD_TOKENS,
+                            latency_range, project_conversation, text_tokens)
+
+# LangChain and the OpenAI client account for most of the import time, so they are imported
+# on first use (or by the startup warm-up) and worker processes start serving sooner
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+    from langchain.memory import ConversationBufferMemory
+    from langchain.schema import SystemMessage
 
 # Load environment variables
 load_dotenv()
 
+config = load_config("./config.json")
+
+# JSON lines on stdout, written by a background thread so logging never blocks the event loop
+setup_logging(
+    config.get("log_level", "INFO"),
+    log_format=config.get("log_format", "json"),
+    payload_max_chars=config.get("log_payload_max_chars", 500),
+    payload_sample_rate=config.get("log_payload_sample_rate", 0.01)
+)
+logger = logging.getLogger(__name__)
+
 app = FastAPI()
 
+# Log files are read and split in worker processes so ingestion never blocks the event loop
+preprocess_service = PreprocessService(
+    cache_dir=config.get("preprocess_cache_dir", "preprocess_cache"),
+    max_workers=config.get("preprocess_workers"),
+    max_cache_bytes=config.get("preprocess_cache_max_bytes", 2 * 1024 ** 3),
+    min_cache_age_seconds=config.get("preprocess_cache_min_age_seconds", 3600)
+)
+
+# Identical concurrent requests share one pipeline run
+inflight_analyses = SingleFlight()
+
+# Template answers memoized per (logs, template, model, prompt version)
+template_cache = TemplateResultCache(
+    config.get("template_cache_db_path", "results/template_cache.db"),
+    max_age_days=config.get("results_max_age_days"),
+    max_entries=config.get("template_cache_max_entries", 100000),
+    retention_every=config.get("template_cache_retention_every_puts", 500)
+)
+
+# Bounded concurrency with fair queueing across users and sessions
+admission = AdmissionController(
+    max_concurrency=config.get("max_concurrent_analyses", 4),
+    max_queue=config.get("max_queued_analyses", 16)
+)
+
+# Runs are stored by unique run ID, so concurrent requests never overwrite each other
+results_store = ResultsStore(
+    config.get("results_db_path", "results/results.db"),
+    max_age_days=config.get("results_max_age_days"),
+    max_total_bytes=config.get("results_max_total_bytes"),
+    retention_every=config.get("results_retention_every_saves", 50)
+)
+# Directories the timestamped JSON results were written to before the results store,
+# imported into it once at startup
+LEGACY_RESULTS_DIRS = {"analysis": "interaction_analysis_results", "diagnosis": "diagnosis_results"}
+
+# Log files uploaded by clients that do not share the backend's filesystem,
+# stored once per distinct content and shared between sessions
+upload_store = UploadStore(
+    config.get("upload_dir", "uploads"),
+    max_upload_bytes=config.get("max_upload_bytes"),
+    max_total_bytes=config.get("upload_max_total_bytes"),
+    ref_ttl_seconds=config.get("upload_ref_ttl_hours", 24) * 3600
+)
+
+# Parsed templates kept in memory and reloaded when their files change
+# Templates paths come from clients, so only paths under template_roots are served
+template_registry = TemplateRegistry(
+    poll_interval=config.get("template_poll_seconds", 2.0),
+    roots=config.get("template_roots", ["./template/"]),
+    max_sets=config.get("template_registry_max_paths", 32),
+    idle_seconds=config.get("template_idle_seconds", 600)
+)
+
+# Column store of normalized results for fast aggregate queries over history
+analytics_store = AnalyticsStore(config.get("analytics_dir", "results/analytics"))
+
+# Append-only ledger of LLM calls with their tokens and cost, per request, session and user
+token_ledger = TokenLedger(config.get("token_ledger_db_path", "results/token_ledger.db"))
+LLM_PRICES = config.get("llm_prices_usd_per_1k_tokens", {})
+BUDGET_WINDOW_SECONDS = config.get("budget_window_hours", 24) * 3600
+
+# Metrics served from /metrics in the Prometheus text format
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram(
+    "log_analysis_stage_duration_seconds",
+    "Time spent in pipeline stages other than LLM calls (file_read, partition, template_load, memory_compress, persistence)",
+    ["stage"]
+)
+llm_call_seconds = metrics.histogram(
+    "log_analysis_llm_call_duration_seconds",
+    "Latency of LLM calls by pipeline stage (block_feed, interaction, dispatch, template)",
+    ["stage"]
+)
+llm_prompt_tokens = metrics.counter(
+    "log_analysis_llm_prompt_tokens_total", "Prompt tokens sent to the LLM by pipeline stage", ["stage"]
+)
+llm_completion_tokens = metrics.counter(
+    "log_analysis_llm_completion_tokens_total", "Completion tokens received from the LLM by pipeline stage", ["stage"]
+)
+template_results = metrics.counter(
+    "log_analysis_template_results_total",
+    "Diagnosis template results by source: reused (cache hit), local (extracted from logs) or fresh (LLM)",
+    ["source"]
+)
+coalesced_requests = metrics.counter(
+    "log_analysis_coalesced_requests_total", "Requests attached to an identical in-flight analysis", ["endpoint"]
+)
+requests_total = metrics.counter(
+    "log_analysis_requests_total", "Analysis requests by endpoint and response status", ["endpoint", "status"]
+)
+request_seconds = metrics.histogram(
+    "log_analysis_request_duration_seconds", "End-to-end latency of analysis requests", ["endpoint"]
+)
+requests_in_flight = metrics.gauge(
+    "log_analysis_requests_in_flight", "Analysis requests being processed, queued ones included", ["endpoint"]
+)
+metrics.gauge("log_analysis_admission_queue_depth", "Analyses waiting for an admission slot",
+              function=lambda: admission.queued)
+metrics.gauge("log_analysis_admission_active", "Analyses holding an admission slot",
+              function=lambda: admission.active)
+
+# One trace per request, written to trace_dir when the request finishes
+trace_exporter = TraceExporter(
+    config.get("trace_dir", "traces"),
+    trace_format=config.get("trace_format", "chrome"),
+    max_files=config.get("trace_max_files", 1000)
+) if config.get("tracing_enabled", True) else None
+tracer = Tracer(trace_exporter)
+
+# Admin-only request profiling, enabled by setting PROFILE_ADMIN_TOKEN in the environment
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN")
+request_profiler = RequestProfiler(
+    config.get("profile_dir", "profiles"),
+    sample_interval=config.get("profile_sample_interval", 0.005),
+    max_profiles=config.get("profile_max_count", 50)
+)
+PROFILE_ARTIFACTS = {"summary.json": "application/json", "cpu.prof": "application/octet-stream",
+                     "stacks.folded": "text/plain"}
+
 # Define input model for interaction analysis
 class InteractionAnalysisRequest(BaseModel):
     log_files: Optional[List[str]] = None
+    upload_ids: Optional[List[str]] = None  # Files sent to POST /uploads, analyzed with log_files
     templates_path: Optional[str] = "./template/"
     session_id: Optional[str] = None
+    user_id: Optional[str] = None
+
+# Define output models for LLM token usage
+class UsageTotals(BaseModel):
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+
+class RequestUsage(UsageTotals):
+    request_id: str
+    model: str
+    latency_ms: float = 0.0  # Summed LLM call latency
+    downgraded: bool = False  # Run with the budget downgrade model because the user was over budget
+    coalesced: bool = False  # Served by another request's identical run; nothing was charged
+    by_stage: Dict[str, UsageTotals] = {}
+    session_total: Optional[UsageTotals] = None  # All runs of the session so far
+    user_total: Optional[UsageTotals] = None  # The user's runs in the budget window
+    user_budget_usd: Optional[float] = None
+
+class UsageGroup(UsageTotals):
+    key: Dict[str, Optional[str]]
+    mean_latency_ms: float
+
+class UsageResponse(BaseModel):
+    group_by: List[str]
+    totals: UsageTotals
+    groups: List[UsageGroup]
 
 # Define output model for interaction analysis
 class InteractionAnalysisResponse(BaseModel):
@@ -34,18 +223,265 @@ class InteractionAnalysisResponse(BaseModel):
     dispatched_interactions: str
     success: bool
     message: Optional[str] = None
+    run_id: Optional[str] = None
+    usage: Optional[RequestUsage] = None  # LLM usage of the run that produced this response
 
 # Define input model for diagnosis
 class DiagnoseRequest(BaseModel):
     log_files: Optional[List[str]] = None
+    upload_ids: Optional[List[str]] = None
     templates_path: Optional[str] = None
     session_id: Optional[str] = None
+    user_id: Optional[str] = None
+    force_refresh: bool = False  # Ignore stored template results and ask the LLM again
 
 # Define output model for diagnosis
 class DiagnoseResponse(BaseModel):
     results: Dict[str, List[str]]
     success: bool
     message: Optional[str] = None
+    run_id: Optional[str] = None
+    template_status: Dict[str, str] = {}  # template_id -> "fresh", "reused" or "local" (filled without the LLM)
+    usage: Optional[RequestUsage] = None
+
+# Define output models for stored results
+class RunSummary(BaseModel):
+    run_id: str
+    kind: str
+    session_id: Optional[str] = None
+    log_hash: Optional[str] = None
+    templates_path: Optional[str] = None
+    created_at: float
+    size: int
+
+class RunDetail(RunSummary):
+    template_ids: List[str]
+    payload: Dict[str, Any]
+
+class RunListResponse(BaseModel):
+    total: int
+    limit: int
+    offset: int
+    runs: List[RunSummary]
+
+# Define output model for analytics queries
+class AnalyticsGroup(BaseModel):
+    key: Dict[str, str]
+    count: int
+
+class AnalyticsResponse(BaseModel):
+    group_by: List[str]
+    matched_rows: int
+    groups: List[AnalyticsGroup]
+    elapsed_ms: float
+
+# Define output model for uploads
+class UploadResponse(BaseModel):
+    upload_id: str
+    filename: str
+    size: int
+    sha256: str
+    deduplicated: bool = False  # The content was already stored and is shared
+
+# Define input model for referencing an already uploaded file by content hash
+class UploadByHashRequest(BaseModel):
+    sha256: str
+    filename: str
+    session_id: Optional[str] = None
+
+# Define input model for background jobs
+class JobRequest(BaseModel):
+    kind: str  # "analyze_interaction" or "diagnose"
+    request: Dict[str, Any] = {}
+
+# Define input model for run estimates; same shape as a job request
+class EstimateRequest(BaseModel):
+    kind: str  # "analyze_interaction" or "diagnose"
+    request: Dict[str, Any] = {}
+
+# Define output models for run estimates
+class StrategyEstimate(BaseModel):
+    llm_calls: int
+    prompt_tokens: int
+    peak_context_tokens: int
+    cost_usd: float
+
+class EstimateResponse(BaseModel):
+    kind: str
+    model: str
+    log_files: int
+    total_bytes: int
+    total_lines: int
+    log_tokens: int
+    blocks: int
+    templates: int = 0
+    templates_reused: int = 0  # Templates with a stored result for these logs
+    memory_strategy: str
+    llm_calls: int
+    prompt_tokens: int
+    completion_tokens: int
+    peak_context_tokens: int  # Largest prompt sent in one call
+    cost_usd: float
+    by_stage: Dict[str, UsageTotals]
+    latency_seconds_low: Optional[float] = None  # LLM time from past calls in the token ledger
+    latency_seconds_high: Optional[float] = None
+    strategies: Dict[str, StrategyEstimate] = {}  # The same run under each memory strategy
+    warnings: List[str] = []
+
+# Define output model for background jobs
+class JobResponse(BaseModel):
+    job_id: str
+    kind: str
+    status: str
+    progress: float
+    stage: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+# Progress callback used by background jobs: (stage, done, total)
+ProgressCallback = Callable[[str, int, int], Awaitable[None]]
+
+# Arguments of results_store.save_run for a finished pipeline run, minus the session
+RunRecord = Dict[str, Any]
+
+DEFAULT_LOG_FILES = [
+    "/homes/gws/kanzhu/furina/source_code/bug_logs/HIVE-3335/hadoop_namenode.log",
+    "/homes/gws/kanzhu/furina/source_code/bug_logs/HIVE-3335/hadoop_datanode.log",
+    "/homes/gws/kanzhu/furina/source_code/bug_logs/HIVE-3335/hive_job_log.log",
+    "/homes/gws/kanzhu/furina/source_code/bug_logs/HIVE-3335/hive_log.log",
+    "/homes/gws/kanzhu/furina/source_code/bug_logs/HIVE-3335/hive_cli_terminal.log"
+]
+
+DEFAULT_TEMPLATES_PATH = "/homes/gws/kanzhu/furina/furina/agents/template/"
+
+# Model settings; part of the key used to coalesce identical requests
+MODEL_SETTINGS = {
+    "model": "gpt-4o",
+    "temperature": 0
+}
+
+# Trace IDs are 32 hex digits; anything else never names a trace file
+TRACE_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+# Bump when the diagnosis prompts change so stored template results are not reused
+DIAGNOSIS_PROMPT_VERSION = "1"
+
+def create_llm(model: Optional[str] = None) -> "ChatOpenAI":
+    """Initialize LLM with GPT-4o for better analysis, or `model` (e.g. the budget downgrade model)"""
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model=model or MODEL_SETTINGS["model"],
+        temperature=MODEL_SETTINGS["temperature"],
+        api_key=os.getenv("OPENAI_API_KEY")
+    )
+
+def create_conversation_memory(llm: "ChatOpenAI", system_message: "SystemMessage") -> "ConversationBufferMemory":
+    """
+    Create the conversation memory for one analysis run.
+    With the "rolling_summary" strategy, older log blocks are compressed into a summary
+    once the configured token ceiling is passed, so prompt size stays flat.
+    """
+    from langchain.memory import ConversationBufferMemory
+    from utils.memory import RollingSummaryChatHistory
+    if config.get("memory_strategy", "buffer") == "rolling_summary":
+        chat_memory = RollingSummaryChatHistory(
+            llm=llm,
+            max_token_limit=config.get("memory_max_tokens", 60000),
+            keep_recent_messages=config.get("memory_keep_recent_messages", 4),
+            max_summary_tokens=config.get("memory_max_summary_tokens")
+        )
+        conversation_memory = ConversationBufferMemory(
+            chat_memory=chat_memory,
+            memory_key="chat_history",
+            return_messages=True
+        )
+    else:
+        conversation_memory = ConversationBufferMemory(
+            memory_key="chat_history",
+            return_messages=True
+        )
+    conversation_memory.chat_memory.add_message(system_message)
+    return conversation_memory
+
+async def ask_llm(llm: "ChatOpenAI", conversation_memory: "ConversationBufferMemory", prompt: str,
+                  stage: str = "other") -> str:
+    """
+    Send a prompt with the conversation context and record the reply in memory.
+    `stage` labels the call's latency and token metrics and its token ledger entry.
+    """
+    from utils.llm_usage import TokenUsageHandler
+    from utils.memory import RollingSummaryChatHistory
+    chat_memory = conversation_memory.chat_memory
+    chat_memory.add_user_message(prompt)
+    recorder = current_recorder()
+    
+    # Compress older blocks before sending if the history is over its token ceiling
+    if isinstance(chat_memory, RollingSummaryChatHistory):
+        compress_usage = TokenUsageHandler()
+        start = time.perf_counter()
+        with stage_seconds.time(stage="memory_compress"):
+            compressed = await chat_memory.acompress(callbacks=[compress_usage])
+        if compressed and recorder is not None:
+            recorder.add("memory_compress", llm.model_name, compress_usage.prompt_tokens,
+                         compress_usage.completion_tokens, (time.perf_counter() - start) * 1000)
+    
+    messages = chat_memory.messages
+    usage = TokenUsageHandler()
+    with tracer.span("llm.invoke", stage=stage, messages=len(messages)) as span:
+        start = time.perf_counter()
+        with llm_call_seconds.time(stage=stage):
+            response = await llm.ainvoke(messages, config={"callbacks": [usage]})
+        latency_ms = (time.perf_counter() - start) * 1000
+        span.set_attributes(
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            latency_ms=round(latency_ms, 1)
+        )
+    llm_prompt_tokens.inc(usage.prompt_tokens, stage=stage)
+    llm_completion_tokens.inc(usage.completion_tokens, stage=stage)
+    if recorder is not None:
+        recorder.add(stage, llm.model_name, usage.prompt_tokens, usage.completion_tokens, latency_ms)
+    chat_memory.add_ai_message(response.content)
+    return response.content
+
+async def resolve_log_files(log_files: Optional[List[str]], upload_ids: Optional[List[str]] = None) -> List[str]:
+    """
+    Combine log file/folder paths and uploaded files into the list of log files to analyze.
+    Falls back to the default log files when neither is given.
+    """
+    if log_files is None and not upload_ids:
+        log_files = DEFAULT_LOG_FILES
+    inputs = list(log_files or [])
+    if upload_ids:
+        inputs.extend(await run_in_thread(upload_store.paths, upload_ids))
+    with tracer.span("process_log_inputs", inputs=len(inputs)) as span:
+        log_files = await run_in_thread(process_log_inputs, inputs)
+        span.set_attribute("log_files", len(log_files))
+    return log_files
+
+async def read_log_shards(log_files: List[str]) -> List[Dict[str, Any]]:
+    """Preprocess log files into shards (sidecars are reused while a file is unchanged)."""
+    with tracer.span("read_log_files", log_files=len(log_files)) as span, stage_seconds.time(stage="file_read"):
+        shards = await preprocess_service.preprocess(log_files)
+        span.set_attribute("bytes", sum(shard["size"] for shard in shards))
+    return shards
+
+async def partition_log_shards(shards: List[Dict[str, Any]]) -> List[str]:
+    """Split preprocessed shards into blocks of the configured number of lines."""
+    with tracer.span("partition_log_into_blocks") as span, stage_seconds.time(stage="partition"):
+        log_blocks = await run_in_thread(build_blocks, shards, config["log_block_size"])
+        span.set_attribute("blocks", len(log_blocks))
+    return log_blocks
+
+async def load_templates(templates_path: str) -> Dict[str, Any]:
+    """Parsed templates of a file or directory, from the template registry."""
+    with tracer.span("load_templates_recursive", templates_path=templates_path) as span, \
+            stage_seconds.time(stage="template_load"):
+        registered = await run_in_thread(template_registry.get, templates_path)
+        span.set_attribute("templates", len(registered))
+    return registered
 
 def process_log_inputs(inputs: List[str]) -> List[str]:
     """
@@ -58,21 +494,20 @@ def process_log_inputs(inputs: List[str]) -> List[str]:
         if os.path.isfile(input_path):
             # It's a single file
             log_files.append(input_path)
-            print(f"Added file: {input_path}")
+            logger.debug("Added file: %s", input_path)
         elif os.path.isdir(input_path):
             # It's a directory, get all files in it
             folder_files = glob.glob(os.path.join(input_path, "*"))
             folder_files = [f for f in folder_files if os.path.isfile(f)]
             log_files.extend(folder_files)
-            print(f"Added {len(folder_files)} files from folder: {input_path}")
-            for f in folder_files:
-                print(f"  - {f}")
+            logger.debug("Added %d files from folder: %s", len(folder_files), input_path,
+                         extra={"log_files": folder_files})
         else:
-            print(f"Warning: {input_path} is neither a file nor a directory, skipping...")
+            logger.warning("%s is neither a file nor a directory, skipping...", input_path)
     
     return log_files
 
-async def pattern_dispatcher(llm: ChatOpenAI, interaction_pairs: str, conversation_memory: ConversationBufferMemory) -> str:
+async def pattern_dispatcher(llm: "ChatOpenAI", interaction_pairs: str, conversation_memory: "ConversationBufferMemory") -> str:
     """
     Dispatch interaction pairs to bug categories using context-aware LLM
     """
@@ -107,335 +542,1076 @@ async def pattern_dispatcher(llm: ChatOpenAI, interaction_pairs: str, conversati
         "Please ensure the final output is a valid JSON object that contains all detected interaction patterns, with structured entries, reasoning, assumptions, and associated regexes."
     )
     
-    # Add to memory and get response
-    conversation_memory.chat_memory.add_user_message(prompt)
-    
-    # Get all messages from memory to maintain context
-    messages = conversation_memory.chat_memory.messages
-    response = llm.invoke(messages)
-    
-    # Add response to memory
-    conversation_memory.chat_memory.add_ai_message(response.content)
-    
-    return response.content
+    # Get response with context and add it to memory
+    with tracer.span("pattern_dispatcher"):
+        return await ask_llm(llm, conversation_memory, prompt, stage="dispatch")
 
 def load_templates_recursive(templates_path: str) -> Dict[str, str]:
     """
     Recursively load template files from a directory or a single file.
     Returns a dictionary mapping template_id to template_content.
+    Templates come from the in-memory registry; files are only re-read when they change.
     """
-    templates = {}
-    
-    if os.path.isfile(templates_path):
-        # Single template file
-        template_id = os.path.basename(templates_path).replace('.txt', '').replace('.template', '')
-        try:
-            with open(templates_path, 'r', encoding='utf-8') as f:
-                templates[template_id] = f.read().strip()
-            print(f"Loaded template: {template_id}")
-        except Exception as e:
-            print(f"Error loading template file {templates_path}: {e}")
-    
-    elif os.path.isdir(templates_path):
-        # Recursively find all template files in directory and subdirectories
-        for root, dirs, files in os.walk(templates_path):
-            for file in files:
-                if file.endswith('.txt') or file.endswith('.template'):
-                    file_path = os.path.join(root, file)
-                    # Create template ID based on relative path
-                    relative_path = os.path.relpath(file_path, templates_path)
-                    template_id = relative_path.replace(os.sep, '_').replace('.txt', '').replace('.template', '')
-                    
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            templates[template_id] = f.read().strip()
-                        print(f"Loaded template: {template_id} from {relative_path}")
-                    except Exception as e:
-                        print(f"Error loading template file {file_path}: {e}")
-    
-    else:
-        print(f"Warning: {templates_path} is neither a file nor a directory")
+    return {
+        template_id: template.content
+        for template_id, template in template_registry.get(templates_path).items()
+    }
+
+async def report_progress(progress: Optional[ProgressCallback], stage: str, done: int, total: int) -> None:
+    """Report pipeline progress to a job worker, if the run is a background job."""
+    if progress is not None:
+        await progress(stage, done, total)
+
+async def feed_log_blocks(llm: "ChatOpenAI", conversation_memory: "ConversationBufferMemory",
+                          log_blocks: List[str], progress: Optional[ProgressCallback] = None,
+                          total_steps: int = 0) -> None:
+    """
+    Feed log blocks into the LLM conversation one at a time.
+    """
+    log_type = "Cross-Component log"
     
-    return templates
+    for block_index, log_block in enumerate(log_blocks):
+        if block_index == len(log_blocks) - 1:
+            prompt = (
+                f"{log_block}\n\n"
+                f"I have sent the final log block. I'll give you some templates."
+            )
+        elif block_index == 0:
+            prompt = (
+                f"The following are {log_type}.\n\n"
+                f"I may send the log in multiple parts. Please respond only after I indicate that the final part has been provided.\n\n"
+                f"{log_block}"
+            )
+        else:
+            prompt = (
+                f"{log_block}\n\n"
+                f"Let me continue sending the log in blocks. Please wait for my signal before responding."
+            )
+        
+        # Add to memory and get response with context
+        with tracer.span("log_block", block=block_index + 1, blocks=len(log_blocks), chars=len(log_block)):
+            await ask_llm(llm, conversation_memory, prompt, stage="block_feed")
+        await report_progress(progress, "log_blocks", block_index + 1, total_steps)
 
-# Main analyze interaction function
-@app.post("/analyze_interaction")
-async def analyze_interaction(request: InteractionAnalysisRequest):
+async def run_interaction_analysis(request: InteractionAnalysisRequest,
+                                   progress: Optional[ProgressCallback] = None,
+                                   model: Optional[str] = None) -> Tuple[InteractionAnalysisResponse, Optional[RunRecord]]:
     """
-    Analyze log files for cross-component interactions using context-aware LLM.
+    Run the interaction analysis pipeline: feed logs, find interaction pairs, dispatch them to bug categories.
+    Returns the response and the run to store; the run is stored by each caller (see save_response_run).
     """
-    try:
-        # Initialize LLM with GPT-4o for better analysis
-        llm = ChatOpenAI(
-            model="gpt-4o",
-            temperature=0,
-            api_key=os.getenv("OPENAI_API_KEY")
-        )
+    from langchain.schema import SystemMessage
+    llm = create_llm(model)
 
-        # Create a new conversation memory for context awareness
-        conversation_memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True
+    # Initialize with system message
+    system_message = SystemMessage(
+        content=(
+            "You are a log analysis expert that helps detect cross-component issues. "
+            "Cross-component refers to different frameworks, may include Hive, Spark, Flink, Hadoop etc. Your task is to:\n"
+            "1. Analyze log files to identify cross-component interactions via resource utilization.\n"
+            "2. Maintain context from previous messages to build a comprehensive understanding."
         )
-        
-        # Initialize with system message
-        system_message = SystemMessage(
-            content=(
-                "You are a log analysis expert that helps detect cross-component issues. "
-                "Cross-component refers to different frameworks, may include Hive, Spark, Flink, Hadoop etc. Your task is to:\n"
-                "1. Analyze log files to identify cross-component interactions via resource utilization.\n"
-                "2. Maintain context from previous messages to build a comprehensive understanding."
-            )
+    )
+    
+    # Create a new conversation memory for context awareness
+    conversation_memory = create_conversation_memory(llm, system_message)
+    
+    # Use provided log files and uploads or default ones; folders are expanded to the files they contain
+    log_files = await resolve_log_files(request.log_files, request.upload_ids)
+    
+    logger.info("Processing %d log files", len(log_files), extra={"log_files": log_files})
+    
+    # Step 1: Feed logs into the LLM in blocks
+    shards = await read_log_shards(log_files)
+    log_hash = combined_content_hash(shards)
+    log_blocks = await partition_log_shards(shards)
+    total_steps = len(log_blocks) + 2
+    await feed_log_blocks(llm, conversation_memory, log_blocks, progress, total_steps)
+    
+    # Step 2: Find all interaction pairs (component_a, component_b)
+    interaction_task = (
+        f"Construct cross-component components interaction relationship graph from logs and return a JSON file that describes the interaction relationships.\n"
+        "refers to different framework, may include Hive, Spark, Flink, Hadoop etc.\n"
+        f"Instructions for constructing the graph:\n"
+        f"1. Two components have an interaction relationship only if:\n"
+        f"  1.1 [component_A] directly interacts with a resource that [component_B] also utilizes. \n"
+        f"  1.2 [component_A] invokes [component_B], which utilizes the same resource. \n"
+        f"For each object in the JSON file, the format of the file will be as follows: \n"
+        "{ [component_A]: [component_B] }\n"
+        f"   - If a specific interaction relationship exists, provide regular expressions that can help developers extract the corresponding log lines. \n"
+        f"   - Describe your reasoning process for constructing the graph. \n"
+        f"   - Specify any assumptions made during the process. \n"
+        f"Please ensure the output is in a structured JSON format. \n"
+    )
+    
+    # Get response with full context
+    with tracer.span("interaction_pairs"):
+        interaction_pairs = await ask_llm(llm, conversation_memory, interaction_task, stage="interaction")
+    await report_progress(progress, "interaction_pairs", len(log_blocks) + 1, total_steps)
+    logger.info("Interactions response", extra={"payload": interaction_pairs})
+    
+    # Step 3: Dispatch interaction pairs to three categories
+    dispatched_interactions = await pattern_dispatcher(llm, interaction_pairs, conversation_memory)
+    await report_progress(progress, "dispatch", total_steps, total_steps)
+    logger.info("Dispatched interaction response", extra={"payload": dispatched_interactions})
+    
+    # Interaction analysis results to save
+    run_record = {
+        "kind": "analysis",
+        "payload": {
+            "interaction_pairs": interaction_pairs,
+            "dispatched_interactions": dispatched_interactions,
+            "log_files": log_files
+        },
+        "log_hash": log_hash
+    }
+    
+    return InteractionAnalysisResponse(
+        interaction_pairs=interaction_pairs,
+        dispatched_interactions=dispatched_interactions,
+        success=True,
+        message="Analysis completed successfully"
+    ), run_record
+
+async def run_diagnosis(request: DiagnoseRequest,
+                        progress: Optional[ProgressCallback] = None,
+                        model: Optional[str] = None) -> Tuple[DiagnoseResponse, Optional[RunRecord]]:
+    """
+    Run the diagnosis pipeline: feed logs, then fill every template based on the log context.
+    Returns the response and the run to store, if any; the run is stored by each caller.
+    """
+    from langchain.schema import SystemMessage
+    llm = create_llm(model)
+    
+    # Initialize with system message
+    system_message = SystemMessage(
+        content=(
+            "You are a log analysis expert that helps detect cross-component issues,"
+            "cross-component refers to different framework, such as Hive, Spark, Flink, Hadoop. Your task is to:\n"
+            "1. Analyze log files to identify cross-component interaction\n"
+            "2. For each feeded template, fill in blanks([]) based on context from the logs\n"
+            "3. Write general template that can be applied to similar cases if current templates can't work\n"
+            "4. Always provide clear reasoning for your conclusions"
         )
-        conversation_memory.chat_memory.add_message(system_message)
-        
-        # Use provided log files or default ones
-        log_files = request.log_files
-        if log_files is None:
-            log_files = [
-                "/homes/gws/kanzhu/furina/source_code/bug_logs/HIVE-3335/hadoop_namenode.log",
-                "/homes/gws/kanzhu/furina/source_code/bug_logs/HIVE-3335/hadoop_datanode.log",
-                "/homes/gws/kanzhu/furina/source_code/bug_logs/HIVE-3335/hive_job_log.log",
-                "/homes/gws/kanzhu/furina/source_code/bug_logs/HIVE-3335/hive_log.log",
-                "/homes/gws/kanzhu/furina/source_code/bug_logs/HIVE-3335/hive_cli_terminal.log"
-            ]
-        
-        print(f"\nProcessing {len(log_files)} log files:")
-        for f in log_files:
-            print(f"  - {f}")
-        
-        # Step 1: Feed logs into the LLM in blocks
-        logs = [("Cross-Component log", log_files)]
+    )
+    
+    # Create a new conversation memory for context awareness
+    conversation_memory = create_conversation_memory(llm, system_message)
+    
+    # Use provided log files and uploads or default ones; folders are expanded to the files they contain
+    log_files = await resolve_log_files(request.log_files, request.upload_ids)
+    
+    # Use provided templates path or default
+    templates_path = request.templates_path
+    if templates_path is None:
+        templates_path = DEFAULT_TEMPLATES_PATH
+    
+    # Load templates first so a bad templates path fails before any LLM call
+    registered = await load_templates(templates_path)
+    templates = {template_id: template.content for template_id, template in registered.items()}
+    if not templates:
+        logger.warning("No templates found at %s", templates_path)
+        return DiagnoseResponse(
+            results={},
+            success=False,
+            message=f"No templates found at {templates_path}"
+        ), None
+    
+    logger.info("Processing %d log files", len(log_files), extra={"log_files": log_files})
+    
+    shards = await read_log_shards(log_files)
+    log_hash = combined_content_hash(shards)
+    
+    # Reuse stored answers for templates whose content, logs, model and prompt are unchanged
+    template_hashes = {template_id: template.content_hash for template_id, template in registered.items()}
+    cache_keys = {
+        template_id: template_result_key(log_hash, template_hash, llm.model_name, DIAGNOSIS_PROMPT_VERSION)
+        for template_id, template_hash in template_hashes.items()
+    }
+    cached = {} if request.force_refresh else await run_in_thread(template_cache.get_many, cache_keys.values())
+    stale_templates = [template_id for template_id in templates if cache_keys[template_id] not in cached]
+    
+    # Fill countable and classifiable blanks straight from the logs; fully resolved templates skip the LLM
+    prefilled = {}
+    if stale_templates and config.get("local_blank_extraction", True):
+        with tracer.span("extract_blanks", templates=len(stale_templates)):
+            log_index = LogIndex(shards)
+            for template_id in stale_templates:
+                prefilled[template_id] = await run_in_thread(extract_blanks, registered[template_id], log_index)
+    local_templates = {template_id for template_id, (filled, unresolved) in prefilled.items() if filled and not unresolved}
+    llm_templates = [template_id for template_id in stale_templates if template_id not in local_templates]
+    logger.info("Reusing %d stored template results, %d resolved from logs, %d to analyze",
+                len(templates) - len(stale_templates), len(stale_templates) - len(llm_templates), len(llm_templates))
+    
+    # Step 1: Feed logs into the LLM in blocks, only if some template needs the LLM
+    if llm_templates:
+        log_blocks = await partition_log_shards(shards)
+        total_steps = len(log_blocks) + len(templates)
+        await feed_log_blocks(llm, conversation_memory, log_blocks, progress, total_steps)
+    else:
+        total_steps = len(templates)
+    
+    # Step 2: Process templates and fill in blanks
+    logger.info("Processing %d templates", len(templates))
+    results = defaultdict(list)
+    template_status = {}
+    
+    for template_index, (template_id, template_content) in enumerate(templates.items()):
+        cache_key = cache_keys[template_id]
+        if cache_key in cached:
+            results[template_id].append(cached[cache_key])
+            template_status[template_id] = "reused"
+            template_results.inc(source="reused")
+            await report_progress(progress, f"template:{template_id}", total_steps - len(templates) + template_index + 1, total_steps)
+            continue
         
-        for log_type, log_paths in logs:
-            log_blocks = partition_log_into_blocks(log_paths)
-            
-            for block_index, log_block in enumerate(log_blocks):
-                if block_index == len(log_blocks) - 1:
-                    prompt = (
-                        f"{log_block}\n\n"
-                        f"I have sent the final log block. I'll give you some templates."
-                    )
-                elif block_index == 0:
-                    prompt = (
-                        f"The following are {log_type}.\n\n"
-                        f"I may send the log in multiple parts. Please respond only after I indicate that the final part has been provided.\n\n"
-                        f"{log_block}"
-                    )
-                else:
-                    prompt = (
-                        f"{log_block}\n\n"
-                        f"Let me continue sending the log in blocks. Please wait for my signal before responding."
-                    )
-                
-                # Add to memory and get response with context
-                conversation_memory.chat_memory.add_user_message(prompt)
-                messages = conversation_memory.chat_memory.messages
-                response = llm.invoke(messages)
-                conversation_memory.chat_memory.add_ai_message(response.content)
+        filled, _ = prefilled.get(template_id, ({}, []))
+        if template_id in local_templates:
+            results[template_id].append(format_local_result(registered[template_id], filled))
+            template_status[template_id] = "local"
+            template_results.inc(source="local")
+            await report_progress(progress, f"template:{template_id}", total_steps - len(templates) + template_index + 1, total_steps)
+            continue
         
-        # Step 2: Find all interaction pairs (component_a, component_b)
-        interaction_task = (
-            f"Construct cross-component components interaction relationship graph from logs and return a JSON file that describes the interaction relationships.\n"
-            "refers to different framework, may include Hive, Spark, Flink, Hadoop etc.\n"
-            f"Instructions for constructing the graph:\n"
-            f"1. Two components have an interaction relationship only if:\n"
-            f"  1.1 [component_A] directly interacts with a resource that [component_B] also utilizes. \n"
-            f"  1.2 [component_A] invokes [component_B], which utilizes the same resource. \n"
-            f"For each object in the JSON file, the format of the file will be as follows: \n"
-            "{ [component_A]: [component_B] }\n"
-            f"   - If a specific interaction relationship exists, provide regular expressions that can help developers extract the corresponding log lines. \n"
-            f"   - Describe your reasoning process for constructing the graph. \n"
-            f"   - Specify any assumptions made during the process. \n"
-            f"Please ensure the output is in a structured JSON format. \n"
+        logger.debug("Analyzing template %s", template_id)
+        task = (
+            f"In order to find cross-component issues from logs. Here is a template that may match with the root cause, try to fill blanks in the template based on the logs you've analyzed:\n\n"
+            f"Template ID: {template_id}\n"
+            f"Template Content:\n{template_content}\n\n"
+            f"Instructions:\n"
+            f"1. Fill in each blank (marked with []) based on evidence from the logs\n"
+            f"2. If you cannot fill in each blank based on your analysis from the logs, fill in 'unknown'\n"
+            f"3. After filling the template, provide a detailed explanation for each filled blank:\n"
+            f"   - Which specific log lines provided the evidence\n"
+            f"   - If specific log lines exist, write regular expressions that can help developers extract specific log lines\n"
+            f"   - Your reasoning process\n"
+            f"   - Any assumptions you made\n"
+            f"4. If you cannot provide specific log lines to explain you fill a blank, still fill it with 'unknown' \n"
+            f"5. If you think there are multiple ways to fill the template, please list all filled versions for the template. \n\n"
+            f"Finally please provide:\n"
+            f"1. The completed template with all blanks filled\n"
+            f"2. A reasoning section explaining each filled value"
         )
+        if filled:
+            task += (
+                f"\n\nThese blanks were already filled by extracting them directly from the logs. "
+                f"Keep these values unless the logs clearly contradict them, and cite the evidence lines:\n"
+                f"{format_prefilled_blanks(filled)}"
+            )
         
-        # Get response with full context
-        conversation_memory.chat_memory.add_user_message(interaction_task)
-        messages = conversation_memory.chat_memory.messages
-        interaction_response = llm.invoke(messages)
-        conversation_memory.chat_memory.add_ai_message(interaction_response.content)
-        
-        interaction_pairs = interaction_response.content
-        print(f"========= Interactions Response: ======== \n {interaction_pairs}")
-        
-        # Step 3: Dispatch interaction pairs to three categories
-        dispatched_interactions = await pattern_dispatcher(llm, interaction_pairs, conversation_memory)
-        print(f"========= Dispatched Interaction Response: ======== \n {dispatched_interactions}")
-        
-        # Save results
-        timestamp = time.strftime("%Y%m%d-%H%M%S")
-        results_dir = "interaction_analysis_results"
-        os.makedirs(results_dir, exist_ok=True)
+        # Get response with context
+        with tracer.span("template", template_id=template_id, prefilled_blanks=len(filled)):
+            response_content = await ask_llm(llm, conversation_memory, task, stage="template")
+        await report_progress(progress, f"template:{template_id}", total_steps - len(templates) + template_index + 1, total_steps)
         
-        # Save interaction analysis results
-        with open(f"{results_dir}/{timestamp}_analysis.json", "w") as f:
-            json.dump({
-                "interaction_pairs": interaction_pairs,
-                "dispatched_interactions": dispatched_interactions,
-                "log_files": log_files
-            }, f, indent=2)
+        logger.info("Template analysis result", extra={"template_id": template_id, "payload": response_content})
+        results[template_id].append(response_content)
+        template_status[template_id] = "fresh"
+        template_results.inc(source="fresh")
         
-        return InteractionAnalysisResponse(
-            interaction_pairs=interaction_pairs,
-            dispatched_interactions=dispatched_interactions,
-            success=True,
-            message=f"Analysis completed successfully. Results saved to {results_dir}/{timestamp}_analysis.json"
+        with stage_seconds.time(stage="persistence"):
+            await run_in_thread(
+                template_cache.put, cache_key, log_hash, template_id, template_hashes[template_id],
+                llm.model_name, DIAGNOSIS_PROMPT_VERSION, response_content
+            )
+    
+    # Diagnosis results to save
+    run_record = {
+        "kind": "diagnosis",
+        "payload": {
+            "results": dict(results),
+            "template_status": template_status,
+            "log_files": log_files,
+            "templates_path": templates_path
+        },
+        "log_hash": log_hash,
+        "templates_path": templates_path,
+        "template_ids": list(results)
+    }
+    
+    return DiagnoseResponse(
+        results=dict(results),
+        success=True,
+        message="Diagnosis completed successfully",
+        template_status=template_status
+    ), run_record
+
+def templates_content_hash(templates: Dict[str, str]) -> str:
+    """Hash of template IDs and contents, independent of load order."""
+    digest = hashlib.sha256()
+    for template_id in sorted(templates):
+        digest.update(template_id.encode("utf-8") + b"\0" + templates[template_id].encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+async def request_fingerprint(kind: str, log_files: Optional[List[str]], templates_path: Optional[str] = None,
+                              upload_ids: Optional[List[str]] = None, model: Optional[str] = None) -> str:
+    """
+    Key identifying a pipeline run by its inputs: log content, template content and model settings.
+    Preprocessing the logs here is not wasted work, the pipeline reuses the cached sidecars.
+    """
+    log_files = await resolve_log_files(log_files, upload_ids)
+    shards = await read_log_shards(log_files)
+    
+    digest = hashlib.sha256()
+    digest.update(kind.encode("utf-8"))
+    digest.update(combined_content_hash(shards).encode("ascii"))
+    if templates_path is not None:
+        registered = await load_templates(templates_path)
+        templates = {template_id: template.content for template_id, template in registered.items()}
+        digest.update(templates_content_hash(templates).encode("ascii"))
+    settings = dict(MODEL_SETTINGS, **{key: config.get(key) for key in ("log_block_size", "memory_strategy", "memory_max_tokens")})
+    if model is not None:
+        settings["model"] = model
+    digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+async def run_admitted(request, pipeline: Callable[[Any], Awaitable[Any]], bounded: bool = True):
+    """
+    Run a pipeline once the admission controller grants the request a slot.
+    `bounded` False waits even when the wait queue is full (see AdmissionController.admit).
+    """
+    queued_at = time.perf_counter()
+    async with admission.admit(request.user_id, request.session_id, bounded=bounded):
+        tracer.current_span().set_attribute("admission_wait_ms", round((time.perf_counter() - queued_at) * 1000, 1))
+        return await pipeline(request)
+
+async def run_coalesced(key: str, request, pipeline: Callable[[Any], Awaitable[Any]], coalesce: bool = True):
+    """
+    Run a pipeline under admission control, sharing the run with identical in-flight requests
+    unless `coalesce` is False.
+
+    Returns:
+        Tuple[Any, bool]: The pipeline result and whether it came from another request's run.
+    """
+    if not coalesce:
+        return await run_admitted(request, pipeline), False
+    return await inflight_analyses.do(key, lambda: run_admitted(request, pipeline))
+
+def user_budget(user_id: Optional[str]) -> Optional[float]:
+    """LLM budget in USD of a user per budget window, or None if the user has none."""
+    if user_id is None:
+        return None
+    return config.get("user_budgets_usd", {}).get(user_id, config.get("user_budget_usd"))
+
+def resolve_model(user_id: Optional[str]) -> Tuple[str, bool]:
+    """
+    Model to run a user's request with, and whether it was downgraded: once a user has
+    spent their budget in the budget window, requests are rejected, or run with
+    budget_downgrade_model when budget_exceeded_action is "downgrade".
+
+    Raises:
+        BudgetExceeded: If the user is over budget and requests are not downgraded.
+    """
+    model = MODEL_SETTINGS["model"]
+    budget = user_budget(user_id)
+    if budget is None:
+        return model, False
+    now = time.time()
+    spent = token_ledger.totals(user_id=user_id, since=now - BUDGET_WINDOW_SECONDS)["cost_usd"]
+    if spent < budget:
+        return model, False
+    downgrade_model = config.get("budget_downgrade_model")
+    if config.get("budget_exceeded_action", "reject") == "downgrade" and downgrade_model:
+        return downgrade_model, True
+    frees_at = token_ledger.budget_frees_at(user_id, now - BUDGET_WINDOW_SECONDS, budget)
+    retry_after = None if frees_at is None else max(1, math.ceil(frees_at + BUDGET_WINDOW_SECONDS - now))
+    raise BudgetExceeded(user_id, spent, budget, retry_after)
+
+def usage_report(recorder: UsageRecorder, downgraded: bool) -> RequestUsage:
+    """Usage of a finished run, with the session's and user's totals from the ledger."""
+    return RequestUsage(
+        **recorder.summary(),
+        downgraded=downgraded,
+        session_total=token_ledger.totals(session_id=recorder.session_id) if recorder.session_id else None,
+        user_total=token_ledger.totals(user_id=recorder.user_id, since=time.time() - BUDGET_WINDOW_SECONDS)
+        if recorder.user_id else None,
+        user_budget_usd=user_budget(recorder.user_id)
+    )
+
+def current_request_id() -> str:
+    """ID of the request or job being handled, from the log context."""
+    context = current_log_context()
+    return context.get("request_id") or context.get("job_id") or uuid.uuid4().hex
+
+async def run_metered(pipeline: Callable[..., Awaitable[Any]], kind: str, request, model: str,
+                      progress: Optional[ProgressCallback] = None) -> Tuple[Any, Optional[RunRecord], UsageRecorder]:
+    """
+    Run a pipeline with `model`, recording its LLM calls in the token ledger (also when it fails)
+    under the request that started the run.
+
+    Returns:
+        Tuple[Any, Optional[RunRecord], UsageRecorder]: The response, the run to store and the run's LLM calls.
+    """
+    recorder = UsageRecorder(current_request_id(), kind, model, LLM_PRICES, request.session_id, request.user_id)
+    try:
+        with recording(recorder):
+            response, run_record = await pipeline(request, progress, model)
+    finally:
+        await run_in_thread(token_ledger.record, recorder.calls)
+    return response, run_record, recorder
+
+async def attach_usage(request, kind: str, response, recorder: UsageRecorder, shared: bool, downgraded: bool):
+    """
+    Return a copy of a (possibly shared) response carrying the calling request's own usage.
+    A request served by another request's run made no LLM calls: it is recorded in the ledger
+    as a zero-cost "coalesced" entry, and the run's cost stays with the request that started it.
+    Users over budget are rejected or downgraded before they can attach to a run.
+    """
+    if shared:
+        caller = UsageRecorder(current_request_id(), kind, recorder.model, LLM_PRICES, request.session_id, request.user_id)
+        caller.add_coalesced()
+        await run_in_thread(token_ledger.record, caller.calls)
+    else:
+        caller = recorder
+    usage = await run_in_thread(usage_report, caller, downgraded)
+    return response.model_copy(update={"usage": usage})
+
+async def save_response_run(request, response, run_record: Optional[RunRecord]):
+    """
+    Store a run under the calling request's session and return a copy of the response
+    naming it. Coalesced requests share one pipeline run, so each stores its own copy
+    and finds it in its session's history.
+    """
+    if run_record is None:
+        return response
+    with stage_seconds.time(stage="persistence"):
+        run_id = await run_in_thread(results_store.save_run, session_id=request.session_id, **run_record)
+    return response.model_copy(update={"run_id": run_id, "message": f"{response.message}. Results saved as run {run_id}"})
+
+async def estimate_run(kind: str, request) -> EstimateResponse:
+    """
+    Project the LLM work of an analysis or diagnosis from the sizes of its logs and templates,
+    stored template results and past calls in the token ledger, without calling the model.
+    Preprocessing the logs here is not wasted work, the run reuses the cached sidecars.
+    """
+    warnings = []
+    try:
+        model, downgraded = await run_in_thread(resolve_model, request.user_id)
+        if downgraded:
+            warnings.append(f"The user is over their LLM budget; the run would use {model}")
+    except BudgetExceeded as e:
+        model = MODEL_SETTINGS["model"]
+        warnings.append(f"{e}; the run would be rejected")
+    
+    log_files = await resolve_log_files(request.log_files, request.upload_ids)
+    shards = await read_log_shards(log_files)
+    block_sizes = await run_in_thread(block_byte_sizes, shards, config["log_block_size"])
+    bytes_per_token = config.get("estimate_bytes_per_token", DEFAULT_BYTES_PER_TOKEN)
+    stage_stats = await run_in_thread(token_ledger.stage_stats)
+    completion_tokens = {stage: stats["mean_completion_tokens"] for stage, stats in stage_stats.items()}
+    block_calls = [("block_feed", PROMPT_OVERHEAD_TOKENS["block_feed"] + text_tokens(size, bytes_per_token))
+                   for size in block_sizes]
+    
+    templates = reused = 0
+    if kind == "diagnose":
+        templates_path = request.templates_path or DEFAULT_TEMPLATES_PATH
+        registered = await load_templates(templates_path)
+        if not registered:
+            warnings.append(f"No templates found at {templates_path}")
+        log_hash = combined_content_hash(shards)
+        cache_keys = {
+            template_id: template_result_key(log_hash, template.content_hash, model, DIAGNOSIS_PROMPT_VERSION)
+            for template_id, template in registered.items()
+        }
+        cached = {} if request.force_refresh else await run_in_thread(template_cache.get_many, cache_keys.values())
+        template_calls = [
+            ("template", PROMPT_OVERHEAD_TOKENS["template"] + text_tokens(len(template.content.encode("utf-8")), bytes_per_token))
+            for template_id, template in registered.items() if cache_keys[template_id] not in cached
+        ]
+        templates, reused = len(registered), len(registered) - len(template_calls)
+        # Logs are only fed to the model when some template needs it
+        calls = (block_calls if template_calls else []) + template_calls
+    else:
+        interaction_reply = completion_tokens.get("interaction", DEFAULT_COMPLETION_TOKENS["interaction"])
+        calls = block_calls + [
+            ("interaction", PROMPT_OVERHEAD_TOKENS["interaction"]),
+            ("dispatch", PROMPT_OVERHEAD_TOKENS["dispatch"] + int(interaction_reply))
+        ]
+    
+    memory_strategy = config.get("memory_strategy", "buffer")
+    projections = {
+        strategy: project_conversation(
+            calls, completion_tokens, strategy,
+            max_tokens=config.get("memory_max_tokens", 60000),
+            keep_recent_messages=config.get("memory_keep_recent_messages", 4),
+            max_summary_tokens=config.get("memory_max_summary_tokens")
         )
-        
-    except Exception as e:
-        print(f"Error in analyze_interaction: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        for strategy in ("buffer", "rolling_summary")
+    }
+    costs = {
+        strategy: call_cost(LLM_PRICES, model, projection["prompt_tokens"], projection["completion_tokens"])
+        for strategy, projection in projections.items()
+    }
+    projection = projections.get(memory_strategy, projections["buffer"])
+    cost = costs.get(memory_strategy, costs["buffer"])
+    
+    context_window = config.get("model_context_tokens", 128000)
+    if projection["peak_context_tokens"] > context_window:
+        warnings.append(f"The conversation would reach {projection['peak_context_tokens']} tokens, more than the "
+                        f"model's context window of {context_window}; use memory_strategy rolling_summary")
+    elif memory_strategy != "rolling_summary" and costs["rolling_summary"] < costs["buffer"] / 2:
+        warnings.append(f"memory_strategy rolling_summary would cut prompt tokens from {projections['buffer']['prompt_tokens']} "
+                        f"to {projections['rolling_summary']['prompt_tokens']}")
+    budget = user_budget(request.user_id)
+    if budget is not None:
+        spent = (await run_in_thread(token_ledger.totals, user_id=request.user_id,
+                                     since=time.time() - BUDGET_WINDOW_SECONDS))["cost_usd"]
+        if spent + cost > budget:
+            warnings.append(f"The run would cost about ${cost:.2f}, more than the ${max(budget - spent, 0):.2f} "
+                            f"left of the user's LLM budget")
+    
+    latency = latency_range(projection["by_stage"], stage_stats)
+    return EstimateResponse(
+        kind=kind,
+        model=model,
+        log_files=len(shards),
+        total_bytes=sum(shard["size"] for shard in shards),
+        # Every shard starts with a "# Content from:" header line
+        total_lines=sum(shard["line_count"] - 1 for shard in shards),
+        log_tokens=sum(text_tokens(size, bytes_per_token) for size in block_sizes),
+        blocks=len(block_sizes),
+        templates=templates,
+        templates_reused=reused,
+        memory_strategy=memory_strategy,
+        llm_calls=projection["calls"],
+        prompt_tokens=projection["prompt_tokens"],
+        completion_tokens=projection["completion_tokens"],
+        peak_context_tokens=projection["peak_context_tokens"],
+        cost_usd=round(cost, 4),
+        by_stage={
+            stage: UsageTotals(**totals, cost_usd=round(call_cost(LLM_PRICES, model, totals["prompt_tokens"],
+                                                                  totals["completion_tokens"]), 4))
+            for stage, totals in projection["by_stage"].items()
+        },
+        latency_seconds_low=latency[0] if latency else None,
+        latency_seconds_high=latency[1] if latency else None,
+        strategies={
+            strategy: StrategyEstimate(
+                llm_calls=projections[strategy]["calls"],
+                prompt_tokens=projections[strategy]["prompt_tokens"],
+                peak_context_tokens=projections[strategy]["peak_context_tokens"],
+                cost_usd=round(costs[strategy], 4)
+            )
+            for strategy in projections
+        },
+        warnings=warnings
+    )
+
+def check_profile_token(token: Optional[str]) -> None:
+    if not PROFILE_ADMIN_TOKEN or token is None or not hmac.compare_digest(token.encode(), PROFILE_ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Profiling requires a valid X-Profile-Token")
+
+@asynccontextmanager
+async def profile_request(label: str, token: Optional[str], http_response: Response):
+    """
+    Profile the body when the request carries the admin profiling token; yields whether it does.
+    The profile ID is returned in the X-Profile-Id header and the profile is stored when the body ends.
+    """
+    if token is None:
+        yield False
+        return
+    check_profile_token(token)
+    try:
+        session = request_profiler.start(label)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    http_response.headers["X-Profile-Id"] = session.profile_id
+    try:
+        yield True
+    finally:
+        request_profiler.stop(session)
+        path = await run_in_thread(request_profiler.save, session)
+        logger.info("Stored profile of %s in %s", label, path)
+
+def overload_response(error: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+def budget_response(error: BudgetExceeded) -> HTTPException:
+    """
+    402 for a user over their LLM budget: unlike an overload (429) it cannot succeed
+    until the budget window frees enough spending, which Retry-After tells when.
+    """
+    return HTTPException(
+        status_code=402,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)} if error.retry_after is not None else None
+    )
+
+@contextmanager
+def track_request(endpoint: str):
+    """Record an analysis request in the in-flight gauge, latency histogram and status counter."""
+    status = "cancelled"
+    start = time.perf_counter()
+    requests_in_flight.inc(endpoint=endpoint)
+    try:
+        yield
+        status = "200"
+    except HTTPException as e:
+        status = str(e.status_code)
+        raise
+    except Exception:
+        status = "500"
+        raise
+    finally:
+        requests_in_flight.dec(endpoint=endpoint)
+        request_seconds.observe(time.perf_counter() - start, endpoint=endpoint)
+        requests_total.inc(endpoint=endpoint, status=status)
+
+# Main analyze interaction function
+@app.post("/analyze_interaction")
+async def analyze_interaction(request: InteractionAnalysisRequest, http_response: Response,
+                              x_profile_token: Optional[str] = Header(None)):
+    """
+    Analyze log files for cross-component interactions using context-aware LLM.
+    Identical concurrent requests are coalesced into a single analysis.
+    The X-Trace-Id response header identifies the request's trace (see GET /traces/{trace_id}).
+    Admins can profile the request by sending X-Profile-Token (see GET /profiles/{profile_id});
+    a profiled request is never coalesced, so the profile covers its own work.
+    Users over their LLM budget are rejected with 402 or downgraded (see budget_exceeded_action).
+    """
+    with tracer.span("POST /analyze_interaction", session_id=request.session_id or "") as span, \
+            track_request("analyze_interaction"), \
+            log_context(request_id=span.trace_id or uuid.uuid4().hex, session_id=request.session_id):
+        if span.trace_id:
+            http_response.headers["X-Trace-Id"] = span.trace_id
+        try:
+            model, downgraded = await run_in_thread(resolve_model, request.user_id)
+            pipeline = functools.partial(run_metered, run_interaction_analysis, "analysis", model=model)
+            # Answer 429 before resolving uploads, preprocessing logs and hashing templates
+            admission.reject_if_full()
+            async with profile_request("POST /analyze_interaction", x_profile_token, http_response) as profiling:
+                key = await request_fingerprint("analysis", request.log_files, upload_ids=request.upload_ids, model=model)
+                (response, run_record, recorder), shared = await run_coalesced(key, request, pipeline,
+                                                                               coalesce=not profiling)
+            span.set_attribute("coalesced", shared)
+            if shared:
+                coalesced_requests.inc(endpoint="analyze_interaction")
+                logger.info("Request attached to in-flight analysis %s", key[:12])
+            response = await attach_usage(request, "analysis", response, recorder, shared, downgraded)
+            return await save_response_run(request, response, run_record)
+        except HTTPException:
+            raise
+        except AdmissionRejected as e:
+            raise overload_response(e)
+        except UploadNotFound as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except BudgetExceeded as e:
+            raise budget_response(e)
+        except Exception as e:
+            logger.exception("Error in analyze_interaction: %s", e)
+            raise HTTPException(status_code=500, detail=str(e))
 
 # Main diagnose function
 @app.post("/diagnose")
-async def diagnose(request: DiagnoseRequest):
+async def diagnose(request: DiagnoseRequest, http_response: Response,
+                   x_profile_token: Optional[str] = Header(None)):
     """
     Diagnose log files using templates to detect cross-component issues.
+    Identical concurrent requests are coalesced into a single diagnosis.
+    The X-Trace-Id response header identifies the request's trace (see GET /traces/{trace_id}).
+    Admins can profile the request by sending X-Profile-Token (see GET /profiles/{profile_id}).
+    Users over their LLM budget are rejected with 402 or downgraded (see budget_exceeded_action).
     """
-    try:
-        # Initialize LLM with GPT-4o for better analysis
-        llm = ChatOpenAI(
-            model="gpt-4o",
-            temperature=0,
-            api_key=os.getenv("OPENAI_API_KEY")
-        )
-        
-        # Create a new conversation memory for context awareness
-        conversation_memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True
+    with tracer.span("POST /diagnose", session_id=request.session_id or "") as span, \
+            track_request("diagnose"), \
+            log_context(request_id=span.trace_id or uuid.uuid4().hex, session_id=request.session_id):
+        if span.trace_id:
+            http_response.headers["X-Trace-Id"] = span.trace_id
+        try:
+            templates_path = request.templates_path
+            if templates_path is None:
+                templates_path = DEFAULT_TEMPLATES_PATH
+            kind = "diagnosis:refresh" if request.force_refresh else "diagnosis"
+            model, downgraded = await run_in_thread(resolve_model, request.user_id)
+            pipeline = functools.partial(run_metered, run_diagnosis, "diagnosis", model=model)
+            # Answer 429 before resolving uploads, preprocessing logs and hashing templates
+            admission.reject_if_full()
+            async with profile_request("POST /diagnose", x_profile_token, http_response) as profiling:
+                key = await request_fingerprint(kind, request.log_files, templates_path, request.upload_ids, model)
+                (response, run_record, recorder), shared = await run_coalesced(key, request, pipeline,
+                                                                               coalesce=not profiling)
+            span.set_attribute("coalesced", shared)
+            if shared:
+                coalesced_requests.inc(endpoint="diagnose")
+                logger.info("Request attached to in-flight diagnosis %s", key[:12])
+            response = await attach_usage(request, "diagnosis", response, recorder, shared, downgraded)
+            return await save_response_run(request, response, run_record)
+        except HTTPException:
+            raise
+        except AdmissionRejected as e:
+            raise overload_response(e)
+        except UploadNotFound as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except TemplatePathNotAllowed as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except BudgetExceeded as e:
+            raise budget_response(e)
+        except Exception as e:
+            logger.exception("Error in diagnose: %s", e)
+            raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/estimate")
+async def estimate(request: EstimateRequest):
+    """
+    Estimate an interaction analysis or diagnosis before running it: log lines, tokens and
+    blocks, LLM calls, projected prompt tokens under each memory strategy, cost, and an
+    expected LLM latency range from past calls. The model is not called. For diagnoses,
+    templates resolved by local blank extraction skip the LLM, so the figures are upper bounds.
+    `warnings` flags runs that would overflow the context window or the user's budget.
+    """
+    request_model = JOB_REQUEST_MODELS.get(request.kind)
+    if request_model is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown kind: {request.kind}. Expected one of: {', '.join(JOB_REQUEST_MODELS)}"
         )
-        
-        # Initialize with system message
-        system_message = SystemMessage(
-            content=(
-                "You are a log analysis expert that helps detect cross-component issues,"
-                "cross-component refers to different framework, such as Hive, Spark, Flink, Hadoop. Your task is to:\n"
-                "1. Analyze log files to identify cross-component interaction\n"
-                "2. For each feeded template, fill in blanks([]) based on context from the logs\n"
-                "3. Write general template that can be applied to similar cases if current templates can't work\n"
-                "4. Always provide clear reasoning for your conclusions"
-            )
+    try:
+        run_request = request_model(**request.request)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors())
+    
+    with tracer.span("POST /estimate", kind=request.kind):
+        try:
+            return await estimate_run(request.kind, run_request)
+        except UploadNotFound as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except TemplatePathNotAllowed as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/uploads")
+async def create_upload(request: Request, filename: str = Query(..., min_length=1),
+                        session_id: Optional[str] = None):
+    """
+    Upload one log file as the raw request body (chunked transfer encoding is fine).
+    The body is written to disk as it arrives, so memory use does not grow with file size.
+    Pass the returned upload_id in `upload_ids` of /analyze_interaction or /diagnose.
+    Try POST /uploads/by-hash first to skip sending content the backend already has.
+    """
+    upload = await run_in_thread(upload_store.create, filename, session_id)
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                await run_in_thread(upload.write, chunk)
+        info = await run_in_thread(upload.commit)
+    except UploadTooLarge as e:
+        await run_in_thread(upload.abort)
+        raise HTTPException(status_code=413, detail=str(e))
+    except BaseException:
+        # Client disconnects and cancellations must not leave partial files behind
+        await run_in_thread(upload.abort)
+        raise
+    logger.info("Stored upload %s: %s (%d bytes, %s)", info["upload_id"], info["filename"], info["size"],
+                "deduplicated" if info["deduplicated"] else "new content", extra={"session_id": session_id})
+    return UploadResponse(**info)
+
+@app.post("/uploads/by-hash")
+async def create_upload_by_hash(request: UploadByHashRequest):
+    """
+    Reference a file the backend already stores, identified by its SHA-256, without
+    uploading it again. Returns 404 if the content is unknown and must be uploaded.
+    """
+    info = await run_in_thread(upload_store.add_existing, request.sha256.lower(), request.filename, request.session_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail=f"No stored upload with SHA-256 {request.sha256}")
+    return UploadResponse(**info)
+
+@app.delete("/uploads/{upload_id}")
+async def delete_upload(upload_id: str):
+    """
+    Release an uploaded file. Its content is kept, shared with other uploads of the
+    same file, until it is unreferenced and evicted under the upload disk quota.
+    """
+    try:
+        await run_in_thread(upload_store.delete, upload_id)
+    except UploadNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"upload_id": upload_id, "deleted": True}
+
+@app.delete("/uploads")
+async def delete_session_uploads(session_id: str = Query(..., min_length=1)):
+    """
+    Release every uploaded file of a session.
+    """
+    released = await run_in_thread(upload_store.release_session, session_id)
+    return {"session_id": session_id, "released": released}
+
+@app.get("/results")
+async def list_results(kind: Optional[str] = None, session_id: Optional[str] = None,
+                       log_hash: Optional[str] = None, template_id: Optional[str] = None,
+                       since: Optional[float] = None, until: Optional[float] = None,
+                       limit: int = Query(20, ge=1, le=100), offset: int = Query(0, ge=0)):
+    """
+    List stored runs, newest first. Filter by kind ("analysis" or "diagnosis"), session,
+    log-content hash, template and creation time (Unix seconds).
+    """
+    total, runs = await run_in_thread(
+        results_store.list_runs,
+        kind=kind, session_id=session_id, log_hash=log_hash, template_id=template_id,
+        since=since, until=until, limit=limit, offset=offset
+    )
+    return RunListResponse(total=total, limit=limit, offset=offset, runs=[RunSummary(**run) for run in runs])
+
+@app.get("/results/{run_id}")
+async def get_result(run_id: str):
+    """
+    Return one stored run including its full results.
+    """
+    run = await run_in_thread(results_store.get_run, run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Run {run_id} not found")
+    return RunDetail(**run)
+
+@app.get("/analytics")
+async def get_analytics(group_by: str = "pattern", kind: Optional[str] = None,
+                        pattern: Optional[str] = None, template: Optional[str] = None,
+                        component: Optional[str] = None, resource: Optional[str] = None,
+                        since: Optional[float] = None, until: Optional[float] = None,
+                        distinct_runs: bool = False, limit: int = Query(20, ge=1, le=1000)):
+    """
+    Aggregate stored results, e.g. the most frequent interaction patterns or the most
+    common filled values of a template blank. `group_by` is a comma-separated list of
+    columns (pattern, component_a, component_b, resource, template, blank, value, kind, session).
+    `component` filters on component_a.
+    """
+    start = time.perf_counter()
+    columns = [column.strip() for column in group_by.split(",") if column.strip()]
+    filters = {name: value for name, value in (
+        ("kind", kind), ("pattern", pattern), ("template", template),
+        ("component_a", component), ("resource", resource)
+    ) if value}
+
+    # Pick up runs stored since the last query
+    await run_in_thread(analytics_store.refresh, results_store)
+    try:
+        result = await run_in_thread(
+            analytics_store.aggregate, columns, filters,
+            since=since, until=until, distinct_runs=distinct_runs, limit=limit
         )
-        conversation_memory.chat_memory.add_message(system_message)
-        
-        # Use provided log files or default ones
-        log_files = request.log_files
-        if log_files is None:
-            log_files = [
-                "/homes/gws/kanzhu/furina/source_code/bug_logs/HIVE-3335/hadoop_namenode.log",
-                "/homes/gws/kanzhu/furina/source_code/bug_logs/HIVE-3335/hadoop_datanode.log",
-                "/homes/gws/kanzhu/furina/source_code/bug_logs/HIVE-3335/hive_job_log.log",
-                "/homes/gws/kanzhu/furina/source_code/bug_logs/HIVE-3335/hive_log.log",
-                "/homes/gws/kanzhu/furina/source_code/bug_logs/HIVE-3335/hive_cli_terminal.log"
-            ]
-        
-        # Use provided templates path or default
-        templates_path = request.templates_path
-        if templates_path is None:
-            templates_path = "/homes/gws/kanzhu/furina/furina/agents/template/"
-        
-        print(f"\nProcessing {len(log_files)} log files:")
-        for f in log_files:
-            print(f"  - {f}")
-        
-        # Step 1: Feed logs into the LLM in blocks
-        logs = [("Cross-Component log", log_files)]
-        
-        for log_type, log_paths in logs:
-            log_blocks = partition_log_into_blocks(log_paths)
-            
-            for block_index, log_block in enumerate(log_blocks):
-                if block_index == len(log_blocks) - 1:
-                    prompt = (
-                        f"{log_block}\n\n"
-                        f"I have sent the final log block. I'll give you some templates."
-                    )
-                elif block_index == 0:
-                    prompt = (
-                        f"The following are {log_type}.\n\n"
-                        f"I may send the log in multiple parts. Please respond only after I indicate that the final part has been provided.\n\n"
-                        f"{log_block}"
-                    )
-                else:
-                    prompt = (
-                        f"{log_block}\n\n"
-                        f"Let me continue sending the log in blocks. Please wait for my signal before responding."
-                    )
-                
-                # Add to memory and get response with context
-                conversation_memory.chat_memory.add_user_message(prompt)
-                messages = conversation_memory.chat_memory.messages
-                response = llm.invoke(messages)
-                conversation_memory.chat_memory.add_ai_message(response.content)
-        
-        # Step 2: Process templates and fill in blanks
-        templates = load_templates_recursive(templates_path)
-        if not templates:
-            print(f"Warning: No templates found at {templates_path}")
-            return DiagnoseResponse(
-                results={},
-                success=False,
-                message=f"No templates found at {templates_path}"
-            )
-        
-        print(f"\nProcessing {len(templates)} templates...")
-        results = defaultdict(list)
-        
-        for template_id, template_content in templates.items():
-            print(f"\nAnalyzing template: {template_id}")
-            task = (
-                f"In order to find cross-component issues from logs. Here is a template that may match with the root cause, try to fill blanks in the template based on the logs you've analyzed:\n\n"
-                f"Template ID: {template_id}\n"
-                f"Template Content:\n{template_content}\n\n"
-                f"Instructions:\n"
-                f"1. Fill in each blank (marked with []) based on evidence from the logs\n"
-                f"2. If you cannot fill in each blank based on your analysis from the logs, fill in 'unknown'\n"
-                f"3. After filling the template, provide a detailed explanation for each filled blank:\n"
-                f"   - Which specific log lines provided the evidence\n"
-                f"   - If specific log lines exist, write regular expressions that can help developers extract specific log lines\n"
-                f"   - Your reasoning process\n"
-                f"   - Any assumptions you made\n"
-                f"4. If you cannot provide specific log lines to explain you fill a blank, still fill it with 'unknown' \n"
-                f"5. If you think there are multiple ways to fill the template, please list all filled versions for the template. \n\n"
-                f"Finally please provide:\n"
-                f"1. The completed template with all blanks filled\n"
-                f"2. A reasoning section explaining each filled value"
-            )
-            
-            # Get response with context
-            conversation_memory.chat_memory.add_user_message(task)
-            messages = conversation_memory.chat_memory.messages
-            response = llm.invoke(messages)
-            conversation_memory.chat_memory.add_ai_message(response.content)
-            
-            print(f"=== Template {template_id} Analysis result: ===\n {response.content}")
-            results[template_id].append(response.content)
-        
-        # Save results
-        timestamp = time.strftime("%Y%m%d-%H%M%S")
-        results_dir = "diagnosis_results"
-        os.makedirs(results_dir, exist_ok=True)
-        
-        # Save diagnosis results
-        with open(f"{results_dir}/{timestamp}_diagnosis.json", "w") as f:
-            json.dump({
-                "results": dict(results),
-                "log_files": log_files,
-                "templates_path": templates_path
-            }, f, indent=2)
-        
-        return DiagnoseResponse(
-            results=dict(results),
-            success=True,
-            message=f"Diagnosis completed successfully. Results saved to {results_dir}/{timestamp}_diagnosis.json"
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return AnalyticsResponse(
+        group_by=columns,
+        matched_rows=result["matched_rows"],
+        groups=[AnalyticsGroup(**group) for group in result["groups"]],
+        elapsed_ms=round((time.perf_counter() - start) * 1000, 2)
+    )
+
+@app.get("/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """
+    Return the trace of a request in the Chrome trace event format. Open it in
+    https://ui.perfetto.dev or chrome://tracing to see where the request spent its time.
+    """
+    if trace_exporter is None or trace_exporter.trace_format != "chrome":
+        raise HTTPException(status_code=404, detail="Traces are not stored as files; see trace_format in config.json")
+    path = trace_exporter.trace_path(trace_id)
+    if not TRACE_ID_PATTERN.fullmatch(trace_id) or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"Trace {trace_id} not found")
+    return FileResponse(path, media_type="application/json")
+
+@app.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, artifact: str = "summary.json",
+                      x_profile_token: Optional[str] = Header(None)):
+    """
+    Return a stored request profile (admin only). `artifact` is summary.json (CPU and
+    wall time per function, peak memory and top allocations), cpu.prof (pstats, for
+    snakeviz) or stacks.folded (collapsed stacks, for speedscope or flamegraph.pl).
+    """
+    check_profile_token(x_profile_token)
+    if artifact not in PROFILE_ARTIFACTS:
+        raise HTTPException(status_code=400, detail=f"artifact must be one of {', '.join(PROFILE_ARTIFACTS)}")
+    path = await run_in_thread(request_profiler.path, profile_id, artifact)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    return FileResponse(path, media_type=PROFILE_ARTIFACTS[artifact], filename=artifact)
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Pipeline metrics in the Prometheus text exposition format: per-stage and per-LLM-call
+    latency histograms, token counts, template cache hits, queue depth and in-flight requests.
+    """
+    return Response(content=metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/usage")
+async def get_usage(group_by: str = "stage", user_id: Optional[str] = None, session_id: Optional[str] = None,
+                    request_id: Optional[str] = None, kind: Optional[str] = None, stage: Optional[str] = None,
+                    model: Optional[str] = None, since: Optional[float] = None,
+                    limit: int = Query(20, ge=1, le=1000)):
+    """
+    LLM calls, tokens and cost from the token ledger, grouped by a comma-separated list of
+    columns (stage, model, kind, user_id, session_id, request_id), most expensive first.
+    E.g. group_by=kind,stage shows which pipeline paths cost the most.
+    """
+    columns = [column.strip() for column in group_by.split(",") if column.strip()]
+    filters = {name: value for name, value in (
+        ("user_id", user_id), ("session_id", session_id), ("request_id", request_id),
+        ("kind", kind), ("stage", stage), ("model", model)
+    ) if value}
+    try:
+        groups = await run_in_thread(token_ledger.usage_by, columns, filters, since=since, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    totals = await run_in_thread(token_ledger.totals, session_id, user_id, request_id, since)
+    return UsageResponse(group_by=columns, totals=UsageTotals(**totals),
+                         groups=[UsageGroup(**group) for group in groups])
+
+async def run_interaction_analysis_job(request: Dict[str, Any], progress: ProgressCallback) -> Dict[str, Any]:
+    with tracer.span("job analyze_interaction", session_id=request.get("session_id") or ""):
+        analysis_request = InteractionAnalysisRequest(**request)
+        model, downgraded = await run_in_thread(resolve_model, analysis_request.user_id)
+        # Jobs share the LLM slots with interactive requests; job_workers already bounds how many
+        # can wait, and a full queue should delay a job rather than fail it
+        pipeline = functools.partial(run_metered, run_interaction_analysis, "analysis", model=model, progress=progress)
+        response, run_record, recorder = await run_admitted(analysis_request, pipeline, bounded=False)
+        response = await attach_usage(analysis_request, "analysis", response, recorder, False, downgraded)
+        response = await save_response_run(analysis_request, response, run_record)
+    return response.model_dump()
+
+async def run_diagnosis_job(request: Dict[str, Any], progress: ProgressCallback) -> Dict[str, Any]:
+    with tracer.span("job diagnose", session_id=request.get("session_id") or ""):
+        diagnose_request = DiagnoseRequest(**request)
+        model, downgraded = await run_in_thread(resolve_model, diagnose_request.user_id)
+        pipeline = functools.partial(run_metered, run_diagnosis, "diagnosis", model=model, progress=progress)
+        response, run_record, recorder = await run_admitted(diagnose_request, pipeline, bounded=False)
+        response = await attach_usage(diagnose_request, "diagnosis", response, recorder, False, downgraded)
+        response = await save_response_run(diagnose_request, response, run_record)
+    return response.model_dump()
+
+JOB_REQUEST_MODELS = {
+    "analyze_interaction": InteractionAnalysisRequest,
+    "diagnose": DiagnoseRequest
+}
+
+JOB_HANDLERS = {
+    "analyze_interaction": run_interaction_analysis_job,
+    "diagnose": run_diagnosis_job
+}
+
+job_store: Optional[JobStore] = None
+job_pool: Optional[JobWorkerPool] = None
+
+def import_llm_dependencies() -> None:
+    """Import LangChain and the OpenAI client, which are otherwise imported by the first analysis."""
+    import langchain.memory
+    import langchain_openai
+    import utils.llm_usage
+    import utils.memory
+
+async def warm_up() -> None:
+    """
+    Pay the one-time costs of the first analysis before serving: import the LLM dependencies,
+    build an LLM client and parse the default templates. A failed step is logged and skipped.
+    """
+    start = time.perf_counter()
+    for step, func, args in (
+        ("import_llm_dependencies", import_llm_dependencies, ()),
+        ("create_llm", create_llm, ()),
+        ("load_default_templates", template_registry.get, (DEFAULT_TEMPLATES_PATH,))
+    ):
+        try:
+            await run_in_thread(func, *args)
+        except Exception as e:
+            logger.warning("Warm-up step %s failed: %s", step, e)
+    logger.info("Warm-up finished in %.2fs", time.perf_counter() - start)
+
+@app.on_event("startup")
+async def start_job_workers():
+    """
+    Open the job store and start the background job workers, import result files left
+    by older versions into the results store, then warm up unless warmup_on_startup is
+    off (e.g. for quick restarts with --reload).
+    """
+    global job_store, job_pool
+    job_store = JobStore(
+        config.get("job_db_path", "jobs/jobs.db"),
+        lease_seconds=config.get("job_lease_seconds", 60)
+    )
+    job_pool = JobWorkerPool(job_store, JOB_HANDLERS, concurrency=config.get("job_workers", 2))
+    job_pool.start()
+    template_registry.start()
+    await run_in_thread(results_store.import_legacy, LEGACY_RESULTS_DIRS)
+    if config.get("warmup_on_startup", True):
+        await warm_up()
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    """Stop the background workers; unfinished jobs are picked up again after restart."""
+    if job_pool is not None:
+        await job_pool.stop()
+    await template_registry.stop()
+    preprocess_service.shutdown()
+    if trace_exporter is not None:
+        await run_in_thread(trace_exporter.close)
+    await run_in_thread(shutdown_logging)
+
+def job_to_response(job: Dict[str, Any]) -> JobResponse:
+    return JobResponse(
+        job_id=job["id"],
+        kind=job["kind"],
+        status=job["status"],
+        progress=job["progress"],
+        stage=job["stage"],
+        result=job["result"],
+        error=job["error"],
+        created_at=job["created_at"],
+        updated_at=job["updated_at"]
+    )
+
+@app.post("/jobs")
+async def create_job(request: JobRequest):
+    """
+    Enqueue an interaction analysis or diagnosis and return its job ID immediately.
+    """
+    request_model = JOB_REQUEST_MODELS.get(request.kind)
+    if request_model is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown job kind: {request.kind}. Expected one of: {', '.join(JOB_REQUEST_MODELS)}"
         )
-        
-    except Exception as e:
-        print(f"Error in diagnose: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+    try:
+        job_request = request_model(**request.request)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors())
+    if request.kind == "diagnose" and job_request.templates_path is not None:
+        try:
+            template_registry.resolve(job_request.templates_path)
+        except TemplatePathNotAllowed as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    # Reject users over budget now rather than when a worker picks the job up
+    try:
+        await run_in_thread(resolve_model, job_request.user_id)
+    except BudgetExceeded as e:
+        raise budget_response(e)
+    
+    job = await run_in_thread(job_store.create, request.kind, job_request.model_dump())
+    job_pool.notify()
+    return job_to_response(job)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Return status, progress and (once finished) results of a job.
+    """
+    job = await run_in_thread(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job_to_response(job)
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """
+    Cancel a queued or running job.
+    """
+    job = await run_in_thread(job_store.request_cancel, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job_to_response(job)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000) 
@@ -0,0 +1,137 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Optional
+
+
+class AdmissionRejected(Exception):
+    """Raised when the wait queue is full. `retry_after` is in seconds."""
+
+    def __init__(self, retry_after: int, message: str):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Limit the number of concurrently running analyses, with a bounded wait queue.
+
+    Waiting requests are served fairly: round-robin across users, and within a
+    user round-robin across their sessions, so one user submitting many
+    analyses cannot starve everyone else. When the queue is full, requests are
+    rejected immediately with an estimate of when to retry.
+    """
+
+    def __init__(self, max_concurrency: int = 4, max_queue: int = 16,
+                 initial_service_time: float = 120.0, smoothing: float = 0.2):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.service_time = initial_service_time
+        self.smoothing = smoothing
+        self.active = 0
+        self.queued = 0
+        # user -> session -> waiting futures; dict order is the round-robin order
+        self._queues: "OrderedDict[str, OrderedDict[str, Deque[asyncio.Future]]]" = OrderedDict()
+
+    def retry_after(self) -> int:
+        """Seconds until a new request would likely get a slot, from queue depth and mean service time."""
+        waves = (self.queued + 1) / self.max_concurrency
+        return max(1, math.ceil(waves * self.service_time))
+
+    @asynccontextmanager
+    async def admit(self, user_id: Optional[str] = None, session_id: Optional[str] = None,
+                    bounded: bool = True):
+        """
+        Wait for a free slot, run the body, then hand the slot to the next waiter.
+        With `bounded` False the caller waits even when the queue is full, for callers
+        that are already limited in number and have no client to retry (background jobs).
+
+        Raises:
+            AdmissionRejected: If the wait queue is full and `bounded` is True.
+        """
+        await self._acquire(user_id or "anonymous", session_id or "default", bounded)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - start)
+
+    def _rejection(self) -> AdmissionRejected:
+        return AdmissionRejected(
+            self.retry_after(),
+            f"Server busy: {self.active} analyses running and {self.queued} waiting"
+        )
+
+    def reject_if_full(self) -> None:
+        """
+        Fail fast, before a request does any work, when admit() would reject it right now.
+        admit() checks again, for requests that race for the last queue places.
+
+        Raises:
+            AdmissionRejected: If every slot is taken and the wait queue is full.
+        """
+        if self.active >= self.max_concurrency and self.queued >= self.max_queue:
+            raise self._rejection()
+
+    async def _acquire(self, user: str, session: str, bounded: bool = True) -> None:
+        if self.active < self.max_concurrency and self.queued == 0:
+            self.active += 1
+            return
+        if bounded and self.queued >= self.max_queue:
+            raise self._rejection()
+
+        future = asyncio.get_running_loop().create_future()
+        sessions = self._queues.setdefault(user, OrderedDict())
+        sessions.setdefault(session, deque()).append(future)
+        self.queued += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted just as the caller gave up; pass it on
+                self._release(None)
+            else:
+                self._remove(user, session, future)
+            raise
+
+    def _remove(self, user: str, session: str, future: asyncio.Future) -> None:
+        sessions = self._queues.get(user)
+        if not sessions or session not in sessions:
+            return
+        try:
+            sessions[session].remove(future)
+            self.queued -= 1
+        except ValueError:
+            return
+        if not sessions[session]:
+            del sessions[session]
+        if not sessions:
+            del self._queues[user]
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        while self._queues:
+            user, sessions = self._queues.popitem(last=False)
+            session, waiters = sessions.popitem(last=False)
+            future = waiters.popleft()
+            self.queued -= 1
+            # Rotate: this session and this user go to the back of their round-robin order
+            if waiters:
+                sessions[session] = waiters
+            if sessions:
+                self._queues[user] = sessions
+            if not future.done():
+                return future
+        return None
+
+    def _release(self, elapsed: Optional[float]) -> None:
+        self.active -= 1
+        if elapsed is not None:
+            self.service_time += self.smoothing * (elapsed - self.service_time)
+        while self.active < self.max_concurrency:
+            future = self._next_waiter()
+            if future is None:
+                break
+            self.active += 1
+            future.set_result(None)
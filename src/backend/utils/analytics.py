@@ -0,0 +1,301 @@
+import fcntl
+import glob
+import json
+import os
+import re
+import threading
+import uuid
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.result_converter import format_results, parse_results_text
+
+
+INTERACTION_PATTERNS = ("resource_invocation", "abnormal_usage", "shared_object")
+
+# String columns are dictionary-encoded into int arrays; created_at is a float array
+STRING_COLUMNS = ("run", "session", "kind", "pattern", "component_a", "component_b",
+                  "resource", "template", "blank", "value")
+
+JSON_BLOCK_PATTERN = re.compile(r'```json\s*([\s\S]*?)\s*```')
+# Python-style tuples the LLM sometimes writes inside JSON: ("Hive", "Hadoop", "HDFS")
+TUPLE_PATTERN = re.compile(r'\(\s*("(?:[^"\\]|\\.)*"(?:\s*,\s*"(?:[^"\\]|\\.)*")*)\s*\)')
+
+
+def _load_llm_json(text: str) -> Any:
+    """Parse the JSON an LLM answer contains, tolerating tuples instead of arrays."""
+    matches = JSON_BLOCK_PATTERN.findall(text)
+    if matches:
+        candidate = matches[-1]
+    else:
+        start, end = text.find('{'), text.rfind('}')
+        if start == -1 or end <= start:
+            return None
+        candidate = text[start:end + 1]
+    for attempt in (candidate, TUPLE_PATTERN.sub(r'[\1]', candidate)):
+        try:
+            return json.loads(attempt)
+        except ValueError:
+            continue
+    return None
+
+
+def _interaction_triples(value: Any) -> Iterable[Tuple[str, str, str]]:
+    """Find (component_a, component_b, resource) entries anywhere in a dispatched pattern value."""
+    if isinstance(value, list):
+        if len(value) == 3 and all(isinstance(item, str) for item in value):
+            yield value[0], value[1], value[2]
+            return
+        for item in value:
+            yield from _interaction_triples(item)
+    elif isinstance(value, dict):
+        lowered = {key.lower(): item for key, item in value.items()}
+        component_a = lowered.get("component_a")
+        component_b = lowered.get("component_b")
+        if isinstance(component_a, str) and isinstance(component_b, str):
+            yield component_a, component_b, str(lowered.get("resource", ""))
+            return
+        for item in value.values():
+            if isinstance(item, (list, dict)):
+                yield from _interaction_triples(item)
+
+
+def rows_from_run(run: Dict[str, Any]) -> List[Dict[str, str]]:
+    """
+    Normalize one stored run into analytics rows.
+
+    Analysis runs give one row per classified interaction (pattern, components, resource).
+    Diagnosis runs give one row per filled template blank, with the template's
+    component_A/component_B fills as the components.
+    """
+    payload = run["payload"]
+    base = {"run": run["run_id"], "session": run.get("session_id") or "", "kind": run["kind"]}
+    rows = []
+
+    if run["kind"] == "analysis":
+        dispatched = _load_llm_json(payload.get("dispatched_interactions", "") or "")
+        if isinstance(dispatched, dict):
+            for pattern in INTERACTION_PATTERNS:
+                for component_a, component_b, resource in _interaction_triples(dispatched.get(pattern)):
+                    rows.append(dict(base, pattern=pattern, component_a=component_a,
+                                     component_b=component_b, resource=resource))
+
+    elif run["kind"] == "diagnosis":
+        templates = parse_results_text(format_results(payload.get("results", {})))
+        for template_id, parsed in templates.items():
+            blanks = parsed["filled_blanks"]
+            components = {
+                "component_a": blanks.get("component_A", ""),
+                "component_b": blanks.get("component_B", ""),
+                "resource": blanks.get("r", blanks.get("resource_name", ""))
+            }
+            for blank, value in blanks.items():
+                rows.append(dict(base, template=template_id, blank=blank, value=value, **components))
+
+    return rows
+
+
+class _DictColumn:
+    """A string column stored as int codes into a value dictionary."""
+
+    def __init__(self, values: Optional[List[str]] = None, codes: Optional[array] = None):
+        self.values: List[str] = values or []
+        self.index: Dict[str, int] = {value: code for code, value in enumerate(self.values)}
+        self.codes = codes if codes is not None else array("i")
+
+    def append(self, value: str) -> None:
+        code = self.index.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.index[value] = code
+        self.codes.append(code)
+
+
+class AnalyticsStore:
+    """
+    Column store of normalized historical results with group-by/filter aggregation.
+
+    Rows are kept in run creation order, so time filters are a binary search on
+    the created_at column. Columns are persisted under `data_dir` and kept up to
+    date incrementally from the results store, following the order runs were
+    saved in (so a run committed late by another process is still picked up);
+    rows of runs the results store evicted are dropped.
+
+    Each save writes a new generation of column files and then switches
+    columns.json to it, under a file lock shared by all worker processes, so a
+    crash or a concurrent save never leaves a torn set of columns.
+    """
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        # seq of the last results store run ingested
+        self.watermark = 0
+        self.created_at = array("d")
+        self.columns = {name: _DictColumn() for name in STRING_COLUMNS}
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self.created_at)
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        os.makedirs(self.data_dir, exist_ok=True)
+        with open(os.path.join(self.data_dir, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _column_path(self, name: str, generation: str) -> str:
+        return os.path.join(self.data_dir, f"{name}.{generation}.bin")
+
+    def _load(self) -> None:
+        meta_path = os.path.join(self.data_dir, "columns.json")
+        if not os.path.exists(meta_path):
+            return
+        with self._file_lock(exclusive=False):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            generation = meta.get("generation")
+            if generation is None or "watermark_seq" not in meta:
+                # Columns saved before generations, or before ingestion followed the results
+                # store's seq, are rebuilt from the results store
+                return
+            row_count = meta["rows"]
+            with open(self._column_path("created_at", generation), "rb") as f:
+                self.created_at.fromfile(f, row_count)
+            for name in STRING_COLUMNS:
+                codes = array("i")
+                with open(self._column_path(name, generation), "rb") as f:
+                    codes.fromfile(f, row_count)
+                self.columns[name] = _DictColumn(meta["dictionaries"][name], codes)
+        self.watermark = meta["watermark_seq"]
+
+    def _save(self) -> None:
+        generation = uuid.uuid4().hex[:12]
+        meta_path = os.path.join(self.data_dir, "columns.json")
+        with self._file_lock(exclusive=True):
+            with open(self._column_path("created_at", generation), "wb") as f:
+                self.created_at.tofile(f)
+            for name, column in self.columns.items():
+                with open(self._column_path(name, generation), "wb") as f:
+                    column.codes.tofile(f)
+            meta = {
+                "generation": generation,
+                "rows": len(self.created_at),
+                "watermark_seq": self.watermark,
+                "dictionaries": {name: column.values for name, column in self.columns.items()}
+            }
+            # Switching columns.json is the commit point; until then the previous generation is in effect
+            with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(meta_path + ".tmp", meta_path)
+            for path in glob.glob(os.path.join(self.data_dir, "*.bin")):
+                if not path.endswith(f".{generation}.bin"):
+                    os.remove(path)
+
+    def _evict_before(self, oldest_created_at: Optional[float]) -> int:
+        """Drop the rows of runs created before `oldest_created_at`, re-encoding the dictionaries."""
+        keep_from = len(self.created_at) if oldest_created_at is None else bisect_left(self.created_at, oldest_created_at)
+        if keep_from == 0:
+            return 0
+        self.created_at = self.created_at[keep_from:]
+        for name, column in self.columns.items():
+            compacted = _DictColumn()
+            for code in column.codes[keep_from:]:
+                compacted.append(column.values[code])
+            self.columns[name] = compacted
+        return keep_from
+
+    def _sort_by_created_at(self) -> None:
+        """Restore creation order after ingesting runs saved out of it (e.g. imported legacy results)."""
+        order = sorted(range(len(self.created_at)), key=self.created_at.__getitem__)
+        self.created_at = array("d", (self.created_at[i] for i in order))
+        for column in self.columns.values():
+            codes = column.codes
+            column.codes = array("i", (codes[i] for i in order))
+
+    def refresh(self, results_store) -> int:
+        """
+        Ingest runs stored since the last refresh and drop the rows of runs the
+        results store has evicted since.
+
+        Returns:
+            int: Number of rows added.
+        """
+        with self._lock:
+            added = 0
+            out_of_order = False
+            start_watermark = self.watermark
+            for run in results_store.iter_runs_after(self.watermark):
+                for row in rows_from_run(run):
+                    if self.created_at and run["created_at"] < self.created_at[-1]:
+                        out_of_order = True
+                    self.created_at.append(run["created_at"])
+                    for name, column in self.columns.items():
+                        column.append(row.get(name, ""))
+                    added += 1
+                self.watermark = run["seq"]
+            if out_of_order:
+                self._sort_by_created_at()
+            removed = self._evict_before(results_store.oldest_created_at()) if len(self.created_at) else 0
+            if added or removed or self.watermark != start_watermark:
+                self._save()
+            return added
+
+    def aggregate(self, group_by: List[str], filters: Optional[Dict[str, str]] = None,
+                  since: Optional[float] = None, until: Optional[float] = None,
+                  distinct_runs: bool = False, limit: int = 20) -> Dict[str, Any]:
+        """
+        Count rows (or distinct runs) per group, most frequent first.
+
+        Args:
+            group_by: Column names to group by
+            filters: Column name -> exact value
+            since, until: Creation time range (Unix seconds), until exclusive
+            distinct_runs: Count each run at most once per group
+            limit: Number of groups to return
+
+        Returns:
+            Dict[str, Any]: matched row count and the top groups
+        """
+        for name in list(group_by) + list(filters or {}):
+            if name not in self.columns:
+                raise ValueError(f"Unknown column: {name}. Available: {', '.join(STRING_COLUMNS)}")
+
+        with self._lock:
+            start = bisect_left(self.created_at, since) if since is not None else 0
+            end = bisect_left(self.created_at, until) if until is not None else len(self.created_at)
+            selected = range(start, max(start, end))
+
+            for name, value in (filters or {}).items():
+                column = self.columns[name]
+                code = column.index.get(value)
+                if code is None:
+                    selected = []
+                    break
+                codes = column.codes
+                selected = [i for i in selected if codes[i] == code]
+
+            group_codes = [self.columns[name].codes for name in group_by]
+            keys = zip(*[[codes[i] for i in selected] for codes in group_codes]) if group_by else (() for _ in selected)
+            if distinct_runs:
+                run_codes = self.columns["run"].codes
+                pairs = set(zip(keys, (run_codes[i] for i in selected)))
+                counts = Counter(key for key, _ in pairs)
+            else:
+                counts = Counter(keys)
+
+            dictionaries = [self.columns[name].values for name in group_by]
+            groups = [
+                {"key": {name: dictionary[code] for name, dictionary, code in zip(group_by, dictionaries, key)},
+                 "count": count}
+                for key, count in counts.most_common(limit)
+            ]
+            return {"matched_rows": len(selected), "groups": groups}
@@ -0,0 +1,15 @@
+import asyncio
+import contextvars
+import functools
+from typing import Any, Callable
+
+
+async def run_in_thread(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run a blocking function in the default thread pool without blocking the event loop.
+    Equivalent to asyncio.to_thread, which is not available on Python 3.8; like it,
+    the function runs in a copy of the caller's context, so log context is kept.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(None, functools.partial(context.run, func, *args, **kwargs))
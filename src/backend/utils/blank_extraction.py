@@ -0,0 +1,239 @@
+import logging
+import os
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.preprocess import iter_line_matches
+from utils.template_registry import Template
+
+logger = logging.getLogger(__name__)
+
+
+# Component names recognized in log lines, matched case-insensitively
+KNOWN_COMPONENTS = ("Hive", "Hadoop", "HDFS", "YARN", "MapReduce", "Spark", "Flink", "Kafka",
+                    "HBase", "ZooKeeper", "Tez", "Oozie")
+COMPONENT_PATTERN = r'\b(' + '|'.join(KNOWN_COMPONENTS) + r')\b'
+# Java-style exception and error class names, e.g. java.net.SocketTimeoutException
+ERROR_CLASS_PATTERN = r'\b(?:[a-z_][\w$]*\.)*([A-Z][\w$]*(?:Exception|Error))\b'
+
+NUMBER_TYPES = ("number", "count", "int", "integer")
+MAX_EVIDENCE_LINES = 5
+# An exception counts as related to a template when it is logged within this many lines
+# of a line naming one of the template's components (stack traces span a few lines)
+ERROR_CONTEXT_LINES = 5
+
+
+class LogIndex:
+    """
+    Regex search over preprocessed log shards, returning matching line numbers.
+
+    Each pattern runs once over the memory-mapped shard data and results are memoized,
+    so many blanks (and templates) sharing a pattern cost one scan.
+    """
+
+    def __init__(self, shards: List[Dict[str, Any]]):
+        self.shards = shards
+        self._results: Dict[str, Tuple[int, Counter, List[str]]] = {}
+        self._lines: Dict[str, List[array]] = {}
+        self._near: Dict[Tuple[str, str], Tuple[Counter, List[str]]] = {}
+
+    def search(self, pattern: str) -> Tuple[int, Counter, List[str]]:
+        """
+        Find the log lines matching a regex.
+
+        Args:
+            pattern: Regex applied to each log line; group 1 (or the whole match) is the value
+
+        Returns:
+            Tuple[int, Counter, List[str]]: Number of matching lines, count per matched value,
+                and "file:line" locations of the first matching lines.
+        """
+        if pattern in self._results:
+            return self._results[pattern]
+
+        regex = re.compile(pattern.encode("utf-8"), re.MULTILINE)
+        line_count = 0
+        values: Counter = Counter()
+        evidence: List[str] = []
+        for shard in self.shards:
+            last_line = -1
+            for line, match in iter_line_matches(shard, regex):
+                value = match.group(1) if regex.groups else match.group(0)
+                values[value.decode("utf-8", errors="replace").strip()] += 1
+                if line != last_line:
+                    line_count += 1
+                    last_line = line
+                    if len(evidence) < MAX_EVIDENCE_LINES:
+                        evidence.append(f"{os.path.basename(shard['path'])}:{line}")
+
+        self._results[pattern] = (line_count, values, evidence)
+        return self._results[pattern]
+
+    def matching_lines(self, pattern: str) -> List[array]:
+        """Sorted numbers of the lines matching a regex, one array per shard."""
+        if pattern not in self._lines:
+            regex = re.compile(pattern.encode("utf-8"), re.MULTILINE)
+            per_shard = []
+            for shard in self.shards:
+                lines = array("I")
+                for line, _ in iter_line_matches(shard, regex):
+                    if not lines or lines[-1] != line:
+                        lines.append(line)
+                per_shard.append(lines)
+            self._lines[pattern] = per_shard
+        return self._lines[pattern]
+
+    def search_near(self, pattern: str, context_pattern: str,
+                    window: int = ERROR_CONTEXT_LINES) -> Tuple[Counter, List[str]]:
+        """
+        Like search(), but only counting matches within `window` lines of a line matching
+        `context_pattern` in the same file.
+
+        Returns:
+            Tuple[Counter, List[str]]: Count per matched value and "file:line" locations of
+                the first counted lines.
+        """
+        key = (pattern, context_pattern)
+        if key in self._near:
+            return self._near[key]
+
+        regex = re.compile(pattern.encode("utf-8"), re.MULTILINE)
+        values: Counter = Counter()
+        evidence: List[str] = []
+        for shard, context_lines in zip(self.shards, self.matching_lines(context_pattern)):
+            last_line = -1
+            for line, match in iter_line_matches(shard, regex):
+                position = bisect_left(context_lines, line - window)
+                if position == len(context_lines) or context_lines[position] > line + window:
+                    continue
+                value = match.group(1) if regex.groups else match.group(0)
+                values[value.decode("utf-8", errors="replace").strip()] += 1
+                if line != last_line:
+                    last_line = line
+                    if len(evidence) < MAX_EVIDENCE_LINES:
+                        evidence.append(f"{os.path.basename(shard['path'])}:{line}")
+
+        self._near[key] = (values, evidence)
+        return self._near[key]
+
+
+def _blank_pattern(blank: Dict[str, Optional[str]], hints: Dict[str, str]) -> Optional[str]:
+    """The regex used to fill a blank: its extraction hint, or a built-in class for component and error blanks."""
+    name = blank["name"]
+    if name in hints:
+        return hints[name]
+    blank_type = (blank["type"] or "").lower()
+    lowered = name.lower()
+    if blank_type in NUMBER_TYPES:
+        # Counts need to know what to count
+        return None
+    if blank_type == "component":
+        return r'(?i)' + COMPONENT_PATTERN
+    if blank_type in ("error", "exception") or "error" in lowered or "exception" in lowered:
+        return ERROR_CLASS_PATTERN
+    return None
+
+
+def _template_components(template: Template, filled: Dict[str, Dict[str, Any]]) -> List[str]:
+    """
+    Components named in the template's rule pattern, plus the values its component blanks were
+    filled with. Examples in the blank definitions ("e.g., Hive, Spark") do not count.
+    """
+    components = {match.lower() for match in re.findall(COMPONENT_PATTERN, template.rule_pattern, re.IGNORECASE)}
+    for blank in template.blanks:
+        fill = filled.get(blank["name"])
+        if fill is not None and (blank["type"] or "").lower() == "component":
+            components.add(fill["value"].lower())
+    return sorted(components)
+
+
+def extract_blanks(template: Template, index: LogIndex) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+    """
+    Fill the blanks of a template that can be resolved deterministically from the logs.
+
+    Number blanks with an extraction hint get the number of matching lines, when some line
+    matches; a hint matching nothing is more likely wrong than evidence of zero, so the
+    blank is left to the LLM. Other blanks get the matched value (group 1 of the hint, or
+    the component/error class found) only when exactly one distinct value occurs, so an
+    ambiguous blank is left to the LLM too. Error blanks without a hint only consider
+    exceptions logged near a line naming one of the template's components, so an
+    unrelated stack trace is never taken as the answer.
+
+    Returns:
+        Tuple[Dict[str, Dict[str, Any]], List[str]]: Filled blanks (name -> value, pattern,
+            evidence lines) and the names of unresolved blanks.
+    """
+    filled = {}
+    unresolved = []
+    error_blanks = []
+    for blank in template.blanks:
+        pattern = _blank_pattern(blank, template.extraction_hints)
+        if pattern is None:
+            unresolved.append(blank["name"])
+            continue
+        if pattern == ERROR_CLASS_PATTERN and blank["name"] not in template.extraction_hints:
+            # Resolved once the component blanks are known
+            error_blanks.append(blank)
+            continue
+        try:
+            line_count, values, evidence = index.search(pattern)
+        except re.error as e:
+            logger.warning("Invalid extraction hint for [%s] in %s: %s", blank["name"], template.template_id, e)
+            unresolved.append(blank["name"])
+            continue
+
+        if (blank["type"] or "").lower() in NUMBER_TYPES and line_count:
+            value = str(line_count)
+        elif len(values) == 1:
+            value = next(iter(values))
+        else:
+            unresolved.append(blank["name"])
+            continue
+        filled[blank["name"]] = {"value": value, "pattern": pattern, "evidence": evidence}
+
+    components = _template_components(template, filled)
+    for blank in error_blanks:
+        if not components:
+            unresolved.append(blank["name"])
+            continue
+        context_pattern = r'(?i)\b(?:' + '|'.join(re.escape(component) for component in components) + r')\b'
+        values, evidence = index.search_near(ERROR_CLASS_PATTERN, context_pattern)
+        if len(values) != 1:
+            unresolved.append(blank["name"])
+            continue
+        filled[blank["name"]] = {"value": next(iter(values)), "pattern": ERROR_CLASS_PATTERN, "evidence": evidence}
+
+    # Keep the template's blank order
+    order = {blank["name"]: position for position, blank in enumerate(template.blanks)}
+    filled = dict(sorted(filled.items(), key=lambda item: order[item[0]]))
+    unresolved.sort(key=order.__getitem__)
+    return filled, unresolved
+
+
+def format_local_result(template: Template, filled: Dict[str, Dict[str, Any]]) -> str:
+    """
+    Render a fully resolved template like an LLM answer, so result parsing and display are unchanged.
+    """
+    completed = template.rule_pattern or template.content
+    for name, fill in filled.items():
+        completed = re.sub(r'\[' + re.escape(name) + r'(?:\s*:\s*[\w ]+?)?\s*\]', lambda _: fill["value"], completed)
+
+    parts = ["### Completed Template", completed, ""]
+    parts.extend(f"- [{name}]: {fill['value']}" for name, fill in filled.items())
+    parts.extend(["", "### Reasoning"])
+    for name, fill in filled.items():
+        evidence = ", ".join(fill["evidence"]) or "no matching lines"
+        parts.append(f"- [{name}] was extracted from the logs with the regex `{fill['pattern']}` (evidence: {evidence})")
+    return "\n".join(parts)
+
+
+def format_prefilled_blanks(filled: Dict[str, Dict[str, Any]]) -> str:
+    """Describe pre-filled blanks for the LLM prompt of a partly resolved template."""
+    lines = []
+    for name, fill in filled.items():
+        evidence = ", ".join(fill["evidence"]) or "no matching lines"
+        lines.append(f"- [{name}]: {fill['value']} (regex `{fill['pattern']}`, evidence lines: {evidence})")
+    return "\n".join(lines)
@@ -0,0 +1,25 @@
+import os
+import sqlite3
+
+
+def connect_sqlite(db_path: str, timeout: float = 30.0) -> sqlite3.Connection:
+    """
+    Open a SQLite connection that can be shared safely by several processes.
+
+    Args:
+        db_path (str): Path of the database file. Parent directories are created.
+        timeout (float): Seconds to wait for a lock held by another writer.
+
+    Returns:
+        sqlite3.Connection: Connection in WAL mode with rows returned as sqlite3.Row.
+    """
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(timeout * 1000)}")
+    return conn
@@ -0,0 +1,105 @@
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+# Bytes of log text per token; GPT-4o's tokenizer averages about 4 on English log lines
+DEFAULT_BYTES_PER_TOKEN = 4.0
+# Tokens the pipeline's own instructions add to each call, per stage
+PROMPT_OVERHEAD_TOKENS = {
+    "system": 120,
+    "block_feed": 40,
+    "interaction": 250,
+    "dispatch": 450,
+    "template": 300,
+    "memory_compress": 200
+}
+# Completion tokens per call when the ledger has no history for a stage
+DEFAULT_COMPLETION_TOKENS = {
+    "block_feed": 30,
+    "interaction": 800,
+    "dispatch": 1000,
+    "template": 700,
+    "memory_compress": 1500
+}
+
+
+def text_tokens(size_bytes: int, bytes_per_token: float = DEFAULT_BYTES_PER_TOKEN) -> int:
+    return int(math.ceil(size_bytes / bytes_per_token))
+
+
+def project_conversation(calls: List[Tuple[str, int]], completion_tokens: Dict[str, float],
+                         memory_strategy: str = "buffer", max_tokens: int = 60000,
+                         keep_recent_messages: int = 4, max_summary_tokens: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Replay the conversation a pipeline run would have, without calling the model.
+
+    Every call sends the whole history, so prompt tokens grow with each call. With the
+    "rolling_summary" strategy the oldest messages are folded into a summary once the
+    history passes `max_tokens`, a whole prompt/reply exchange at a time, as
+    RollingSummaryChatHistory does, which adds a "memory_compress" call each time whose
+    reply is capped at `max_summary_tokens`.
+
+    Args:
+        calls (List[Tuple[str, int]]): (stage, prompt tokens) of each call in order.
+        completion_tokens (Dict[str, float]): Expected reply size per stage.
+
+    Returns:
+        Dict[str, Any]: Calls, prompt and completion tokens (in total and per stage) and
+        the largest context sent.
+    """
+    def reply_tokens(stage: str) -> int:
+        return int(completion_tokens.get(stage, DEFAULT_COMPLETION_TOKENS.get(stage, 500)))
+
+    summary_cap = max_summary_tokens or max(256, max_tokens // 8)
+    system = PROMPT_OVERHEAD_TOKENS["system"]
+    summary = 0
+    recent: List[int] = []
+    by_stage: Dict[str, Dict[str, int]] = {}
+    peak = 0
+
+    def count(stage: str, prompt: int, completion: int) -> None:
+        totals = by_stage.setdefault(stage, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+        totals["calls"] += 1
+        totals["prompt_tokens"] += prompt
+        totals["completion_tokens"] += completion
+
+    for stage, prompt in calls:
+        recent.append(prompt)
+        if memory_strategy == "rolling_summary":
+            pruned = 0
+            # recent alternates prompt, reply, ..., prompt, so pairs from the front are whole exchanges
+            while system + summary + sum(recent) > max_tokens and len(recent) - 2 >= keep_recent_messages:
+                pruned += recent[0] + recent[1]
+                recent = recent[2:]
+            if pruned:
+                summary_reply = min(reply_tokens("memory_compress"), summary_cap)
+                count("memory_compress", PROMPT_OVERHEAD_TOKENS["memory_compress"] + summary + pruned, summary_reply)
+                summary = summary_reply
+        context = system + summary + sum(recent)
+        peak = max(peak, context)
+        reply = reply_tokens(stage)
+        count(stage, context, reply)
+        recent.append(reply)
+
+    return {
+        "calls": sum(totals["calls"] for totals in by_stage.values()),
+        "prompt_tokens": sum(totals["prompt_tokens"] for totals in by_stage.values()),
+        "completion_tokens": sum(totals["completion_tokens"] for totals in by_stage.values()),
+        "peak_context_tokens": peak,
+        "by_stage": by_stage
+    }
+
+
+def latency_range(by_stage: Dict[str, Dict[str, int]],
+                  stage_stats: Dict[str, Dict[str, float]]) -> Optional[Tuple[float, float]]:
+    """
+    Expected LLM time in seconds as (low, high): the sum of the p10 and p90 latencies of
+    past calls of each stage, or of all stages for one without history. None without history.
+    """
+    if "all" not in stage_stats:
+        return None
+    low = high = 0.0
+    for stage, totals in by_stage.items():
+        stats = stage_stats.get(stage, stage_stats["all"])
+        low += totals["calls"] * stats["p10_ms"]
+        high += totals["calls"] * stats["p90_ms"]
+    return round(low / 1000, 1), round(high / 1000, 1)
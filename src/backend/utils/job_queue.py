@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import os
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List
+
+from utils.async_utils import run_in_thread
+from utils.job_store import JobStore, LeaseLost
+from utils.structured_logging import log_context
+
+logger = logging.getLogger(__name__)
+
+
+# handler(request, progress) -> JSON-serializable result
+JobHandler = Callable[[Dict[str, Any], Callable[..., Awaitable[None]]], Awaitable[Dict[str, Any]]]
+
+
+class JobWorkerPool:
+    """
+    Bounded pool of asyncio workers that run jobs from a JobStore.
+
+    Each worker claims one job at a time, so at most `concurrency` jobs run in
+    this process. Workers in other uvicorn processes share the same store.
+    """
+
+    def __init__(self, store: JobStore, handlers: Dict[str, JobHandler], concurrency: int = 2,
+                 poll_interval: float = 1.0, heartbeat_interval: float = 5.0):
+        self.store = store
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.worker_prefix = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        for index in range(self.concurrency):
+            worker_id = f"{self.worker_prefix}-{index}"
+            self._tasks.append(asyncio.create_task(self._worker(worker_id)))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        # Cancelled jobs keep their lease and are retried by the next worker to start
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self) -> None:
+        """Wake idle workers after a job was enqueued in this process."""
+        self._wakeup.set()
+
+    async def _wait_for_work(self) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _worker(self, worker_id: str) -> None:
+        while True:
+            try:
+                job = await run_in_thread(self.store.claim, worker_id)
+            except Exception as e:
+                logger.warning("Job worker %s failed to claim a job: %s", worker_id, e)
+                job = None
+            if job is None:
+                await self._wait_for_work()
+                continue
+            # Records logged while the job runs, by the handler too, carry its ID
+            with log_context(job_id=job["id"], job_kind=job["kind"]):
+                await self._run_job(worker_id, job)
+
+    async def _run_job(self, worker_id: str, job: Dict[str, Any]) -> None:
+        job_id = job["id"]
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            await run_in_thread(self.store.finish, job_id, worker_id, "failed", None, f"Unknown job kind: {job['kind']}")
+            return
+
+        async def progress(stage: str, done: int, total: int) -> None:
+            fraction = min(done / total, 1.0) if total else 0.0
+            await run_in_thread(self.store.update_progress, job_id, worker_id, fraction, stage)
+
+        logger.info("Worker %s running job %s (%s)", worker_id, job_id, job["kind"])
+        task = asyncio.create_task(handler(job["request"], progress))
+        cancelled = False
+        try:
+            while not task.done():
+                done, _ = await asyncio.wait({task}, timeout=self.heartbeat_interval)
+                if done:
+                    break
+                try:
+                    cancelled = await run_in_thread(self.store.heartbeat, job_id, worker_id)
+                except LeaseLost:
+                    # Another worker reclaimed the job and runs it now; running it here as well
+                    # would only repeat (and pay for) its LLM calls
+                    logger.warning("Job %s lost its lease to another worker; stopping it here", job_id)
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    return
+                except Exception as e:
+                    logger.warning("Job %s heartbeat failed: %s", job_id, e)
+                if cancelled:
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    break
+        except asyncio.CancelledError:
+            # Worker shutdown: stop the job and leave it to be reclaimed after its lease expires
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            raise
+
+        if cancelled or task.cancelled():
+            status, result, error = "cancelled", None, None
+        elif task.exception() is not None:
+            status, result, error = "failed", None, task.exception()
+        else:
+            status, result, error = "succeeded", task.result(), None
+        applied = await run_in_thread(self.store.finish, job_id, worker_id, status, result,
+                                      str(error) if error is not None else None)
+        if not applied:
+            logger.warning("Job %s lost its lease to another worker; its %s outcome was discarded", job_id, status)
+        elif error is not None:
+            logger.error("Job %s failed: %s", job_id, error, exc_info=error)
+        else:
+            logger.info("Job %s %s", job_id, status)
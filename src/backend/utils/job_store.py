@@ -0,0 +1,187 @@
+import json
+import time
+import uuid
+from contextlib import closing
+from typing import Any, Dict, Optional
+
+from utils.db import connect_sqlite
+
+
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+
+class LeaseLost(Exception):
+    """Raised when a worker no longer holds a job, e.g. its lease expired and another worker reclaimed it."""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    stage TEXT,
+    request TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_expires_at REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+"""
+
+
+class JobStore:
+    """
+    SQLite-backed job table shared by every backend worker process.
+
+    Running jobs hold a lease that their worker renews. If a worker dies, the
+    lease expires and another worker picks the job up again, so queued work
+    survives restarts.
+    """
+
+    def __init__(self, db_path: str, lease_seconds: float = 60.0, max_attempts: int = 3):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        with closing(connect_sqlite(self.db_path)) as conn:
+            conn.executescript(SCHEMA)
+
+    def _row_to_job(self, row) -> Dict[str, Any]:
+        job = dict(row)
+        job["request"] = json.loads(job["request"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def create(self, kind: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with closing(connect_sqlite(self.db_path)) as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, request, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, json.dumps(request), now, now)
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with closing(connect_sqlite(self.db_path)) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Atomically take the oldest queued job, or a running job whose lease expired.
+
+        Returns:
+            Optional[Dict[str, Any]]: The claimed job, or None if there is nothing to do.
+        """
+        now = time.time()
+        with closing(connect_sqlite(self.db_path)) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs abandoned by a dead worker too many times are given up on
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'Job abandoned by workers too many times', updated_at = ? "
+                    "WHERE status = 'running' AND lease_expires_at < ? AND attempts >= ?",
+                    (now, now, self.max_attempts)
+                )
+                conn.execute(
+                    "UPDATE jobs SET status = 'cancelled', updated_at = ? "
+                    "WHERE status = 'running' AND lease_expires_at < ? AND cancel_requested = 1",
+                    (now, now)
+                )
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE cancel_requested = 0 AND "
+                    "(status = 'queued' OR (status = 'running' AND lease_expires_at < ?)) "
+                    "ORDER BY created_at LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', worker_id = ?, attempts = attempts + 1, "
+                    "lease_expires_at = ?, updated_at = ? WHERE id = ?",
+                    (worker_id, now + self.lease_seconds, now, row["id"])
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self.get(row["id"])
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """
+        Renew the lease of a running job.
+
+        Returns:
+            bool: True if cancellation was requested for the job.
+
+        Raises:
+            LeaseLost: If `worker_id` no longer holds the job.
+        """
+        now = time.time()
+        with closing(connect_sqlite(self.db_path)) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (now + self.lease_seconds, job_id, worker_id)
+            )
+            if cursor.rowcount == 0:
+                raise LeaseLost(f"Worker {worker_id} no longer holds job {job_id}")
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def update_progress(self, job_id: str, worker_id: str, progress: float, stage: Optional[str] = None) -> None:
+        with closing(connect_sqlite(self.db_path)) as conn:
+            conn.execute(
+                "UPDATE jobs SET progress = ?, stage = ?, updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (progress, stage, time.time(), job_id, worker_id)
+            )
+
+    def finish(self, job_id: str, worker_id: str, status: str, result: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None) -> bool:
+        """
+        Record the outcome of a job run by `worker_id`.
+
+        Returns:
+            bool: False if the worker no longer held the job (its lease expired and the job
+            was reclaimed or given up on), in which case nothing is written.
+        """
+        if status not in FINISHED_STATUSES:
+            raise ValueError(f"Invalid final job status: {status}")
+        with closing(connect_sqlite(self.db_path)) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, lease_expires_at = NULL, updated_at = ?, "
+                "progress = CASE WHEN ? = 'succeeded' THEN 1 ELSE progress END "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), status,
+                 job_id, worker_id)
+            )
+        return cursor.rowcount > 0
+
+    def request_cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Cancel a job. Queued jobs are cancelled immediately, running jobs are
+        flagged and stopped by their worker on the next heartbeat.
+        """
+        now = time.time()
+        with closing(connect_sqlite(self.db_path)) as conn:
+            conn.execute(
+                "UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ? AND status IN ('queued', 'running')",
+                (now, job_id)
+            )
+            conn.execute(
+                "UPDATE jobs SET status = 'cancelled', updated_at = ? WHERE id = ? AND status = 'queued'",
+                (now, job_id)
+            )
+        return self.get(job_id)
+
+    def count(self, status: str) -> int:
+        with closing(connect_sqlite(self.db_path)) as conn:
+            row = conn.execute("SELECT COUNT(*) AS n FROM jobs WHERE status = ?", (status,)).fetchone()
+        return row["n"]
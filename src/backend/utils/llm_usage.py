@@ -0,0 +1,20 @@
+from typing import Any
+
+from langchain.callbacks.base import AsyncCallbackHandler
+from langchain.schema import LLMResult
+
+
+class TokenUsageHandler(AsyncCallbackHandler):
+    """
+    Collect the token usage an OpenAI-compatible chat model reports for the calls it is passed to.
+    `invoke` drops the usage from its result, so it is read from the callback instead.
+    """
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    async def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        self.prompt_tokens += usage.get("prompt_tokens", 0) or 0
+        self.completion_tokens += usage.get("completion_tokens", 0) or 0
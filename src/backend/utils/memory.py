@@ -0,0 +1,159 @@
+from typing import Callable, List, Optional
+
+from langchain.schema import AIMessage, BaseChatMessageHistory, BaseMessage, HumanMessage, SystemMessage
+
+
+SUMMARY_PROMPT = (
+    "You are compressing an ongoing cross-component log analysis conversation so it fits in a fixed context budget.\n"
+    "Extend the current summary with the new conversation lines below. Keep it as a compact list of:\n"
+    "- Components: every framework/component seen (Hive, Spark, Flink, Hadoop, HDFS, YARN, ...) and the hosts/daemons involved\n"
+    "- Resources: files, paths, connections, sockets, memory, containers, locks and other resources the components touch\n"
+    "- Anomalies: errors, exceptions, warnings, retries, timeouts and unusual counts, with timestamps and the log file they came from\n"
+    "Never drop facts already in the current summary unless the new lines contradict them. Do not add commentary.\n"
+    "Keep the whole summary under {max_words} words; merge or shorten the least important entries to stay under it.\n\n"
+    "Current summary:\n{summary}\n\n"
+    "New conversation lines:\n{new_lines}\n\n"
+    "Updated summary:"
+)
+
+
+class RollingSummaryChatHistory(BaseChatMessageHistory):
+    """
+    Chat history with a token ceiling.
+
+    Leading system messages are always kept. Once the conversation grows past
+    `max_token_limit`, the oldest user/AI exchanges are folded into an incremental
+    summary of extracted components, resources and anomalies, and only the
+    most recent messages are kept verbatim. The summary call is capped at
+    `max_summary_tokens`, so the summary cannot outgrow the ceiling by itself.
+
+    Token counts are cached per message, so pruning does not re-tokenize the history.
+    """
+
+    def __init__(
+        self,
+        llm,
+        max_token_limit: int = 60000,
+        keep_recent_messages: int = 4,
+        summary_llm=None,
+        token_counter: Optional[Callable[[List[BaseMessage]], int]] = None,
+        max_summary_tokens: Optional[int] = None,
+    ):
+        self.llm = llm
+        self.summary_llm = summary_llm or llm
+        self.max_token_limit = max_token_limit
+        self.keep_recent_messages = keep_recent_messages
+        self.max_summary_tokens = max_summary_tokens or max(256, max_token_limit // 8)
+        self.token_counter = token_counter or llm.get_num_tokens_from_messages
+        self.system_messages: List[BaseMessage] = []
+        self.recent_messages: List[BaseMessage] = []
+        self.summary: str = ""
+        self.summarized_count = 0
+        # Token counts of system_messages, recent_messages and the summary message, counted once each
+        self._system_tokens = 0
+        self._recent_tokens: List[int] = []
+        self._summary_tokens = 0
+
+    def _summary_message(self) -> SystemMessage:
+        return SystemMessage(content=f"Summary of the earlier part of this conversation:\n{self.summary}")
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        """Messages to send to the model: system prompt, running summary, recent turns."""
+        messages = list(self.system_messages)
+        if self.summary:
+            messages.append(self._summary_message())
+        messages.extend(self.recent_messages)
+        return messages
+
+    def add_message(self, message: BaseMessage) -> None:
+        tokens = self.token_counter([message])
+        # System messages sent before the conversation starts are pinned
+        if isinstance(message, SystemMessage) and not self.recent_messages and not self.summary:
+            self.system_messages.append(message)
+            self._system_tokens += tokens
+        else:
+            self.recent_messages.append(message)
+            self._recent_tokens.append(tokens)
+
+    def clear(self) -> None:
+        self.recent_messages = []
+        self._recent_tokens = []
+        self._set_summary("")
+        self.summarized_count = 0
+
+    def num_tokens(self) -> int:
+        """Tokens of the messages sent to the model, from the per-message counts."""
+        return self._system_tokens + self._summary_tokens + sum(self._recent_tokens)
+
+    def _set_summary(self, summary: str) -> None:
+        self.summary = summary
+        self._summary_tokens = self.token_counter([self._summary_message()]) if summary else 0
+
+    def _oldest_exchange(self, start: int) -> int:
+        """
+        Number of messages from `start` that form the oldest whole exchange: everything up
+        to and including the next AI reply. 0 if there is none or taking it would leave
+        fewer than keep_recent_messages, so the kept history always starts a new exchange.
+        """
+        for index in range(start, len(self.recent_messages)):
+            if isinstance(self.recent_messages[index], AIMessage):
+                count = index + 1 - start
+                return count if len(self.recent_messages) - index - 1 >= self.keep_recent_messages else 0
+        return 0
+
+    def _summary_prompt(self, new_messages: List[BaseMessage]) -> str:
+        lines = []
+        for message in new_messages:
+            role = "Human" if isinstance(message, HumanMessage) else "AI" if isinstance(message, AIMessage) else "System"
+            lines.append(f"{role}: {message.content}")
+        # About 0.75 words per token, with room for the list markup
+        return SUMMARY_PROMPT.format(summary=self.summary or "(empty)", new_lines="\n".join(lines),
+                                     max_words=int(self.max_summary_tokens * 0.6))
+
+    def _pending(self) -> int:
+        """Count the messages in whole exchanges, oldest first, to fold away until the history fits under the ceiling."""
+        total = self.num_tokens()
+        taken = 0
+        while total > self.max_token_limit:
+            count = self._oldest_exchange(taken)
+            if not count:
+                break
+            total -= sum(self._recent_tokens[taken:taken + count])
+            taken += count
+        return taken
+
+    def _fold(self, taken: int, summary: str) -> None:
+        # Only called once the summary exists, so a failed summary call loses no messages
+        self.recent_messages = self.recent_messages[taken:]
+        self._recent_tokens = self._recent_tokens[taken:]
+        self._set_summary(summary)
+        self.summarized_count += taken
+
+    def compress(self) -> bool:
+        """
+        Summarize the oldest messages while the history is over the token ceiling.
+
+        Returns:
+            bool: True if a new summary was produced.
+        """
+        taken = self._pending()
+        if not taken:
+            return False
+        response = self.summary_llm.invoke([HumanMessage(content=self._summary_prompt(self.recent_messages[:taken]))],
+                                           max_tokens=self.max_summary_tokens)
+        self._fold(taken, response.content.strip())
+        return True
+
+    async def acompress(self, callbacks: Optional[list] = None) -> bool:
+        """Async version of compress() for use inside the event loop. `callbacks` are passed to the summary call."""
+        taken = self._pending()
+        if not taken:
+            return False
+        response = await self.summary_llm.ainvoke(
+            [HumanMessage(content=self._summary_prompt(self.recent_messages[:taken]))],
+            config={"callbacks": callbacks} if callbacks else None,
+            max_tokens=self.max_summary_tokens
+        )
+        self._fold(taken, response.content.strip())
+        return True
@@ -0,0 +1,334 @@
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import itertools
+import re
+import time
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Set, Tuple
+
+from utils.async_utils import run_in_thread
+
+# Line offsets buffered in memory before they are written to the index file
+OFFSET_BATCH = 1 << 16
+
+
+def _sidecar_key(path: str, stat: os.stat_result) -> str:
+    return hashlib.sha1(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8")).hexdigest()
+
+
+def _split_lines(source: BinaryIO, digest: "hashlib._Hash") -> Iterator[bytes]:
+    """
+    UTF-8 encoded lines of a binary file, split as str.splitlines() splits the decoded
+    text. A newline byte never occurs inside a multi-byte character, so each newline-
+    terminated chunk is decoded and split on its own. Feeds the raw bytes to `digest`.
+    """
+    for chunk in source:
+        digest.update(chunk)
+        for line in chunk.decode("utf-8").splitlines():
+            yield line.encode("utf-8")
+
+
+def preprocess_file(path: str, cache_dir: str) -> Optional[Dict[str, Any]]:
+    """
+    Preprocess one log file into memory-mapped sidecar files. Runs in a worker process.
+
+    The sidecar `.lines` file holds the normalized text (a "# Content from:" header line
+    followed by the log lines, joined by newlines) and the `.idx` file holds the byte
+    offset of every line, so the parent can slice blocks without the lines being pickled.
+    Sidecars are keyed by path, size and mtime and reused while the file is unchanged.
+
+    Args:
+        path (str): Path of the log file.
+        cache_dir (str): Directory for sidecar files.
+
+    Returns:
+        Optional[Dict[str, Any]]: Shard metadata, or None if the file does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    key = _sidecar_key(path, stat)
+    base = os.path.join(cache_dir, key)
+    meta_path = base + ".json"
+    if os.path.exists(meta_path):
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            # Mark as recently used for cache pruning
+            os.utime(meta_path)
+            return meta
+        except (OSError, ValueError):
+            pass
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_suffix = f".{os.getpid()}.tmp"
+    digest = hashlib.sha256()
+    # offsets[i] is where line i starts; the last entry is one past the end of the data
+    offsets = array("Q", [0])
+    line_count = 0
+    position = 0
+    # The file is streamed line by line, so memory use is bounded by the longest line
+    # rather than the file size; offsets are flushed to the index file in batches
+    try:
+        with open(path, "rb") as source, open(base + ".lines" + tmp_suffix, "wb") as data, \
+                open(base + ".idx" + tmp_suffix, "wb") as index:
+            for line in itertools.chain([f"# Content from: {path}".encode("utf-8")], _split_lines(source, digest)):
+                if line_count:
+                    data.write(b"\n")
+                data.write(line)
+                position += len(line) + 1
+                offsets.append(position)
+                line_count += 1
+                if len(offsets) >= OFFSET_BATCH:
+                    offsets.tofile(index)
+                    offsets = array("Q")
+            offsets.tofile(index)
+    except BaseException:
+        for suffix in (".lines", ".idx"):
+            try:
+                os.remove(base + suffix + tmp_suffix)
+            except OSError:
+                pass
+        raise
+    sha256 = digest.hexdigest()
+
+    meta = {
+        "path": path,
+        "sha256": sha256,
+        "size": stat.st_size,
+        "line_count": line_count,
+        "data_path": base + ".lines",
+        "index_path": base + ".idx"
+    }
+    with open(meta_path + tmp_suffix, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    # Atomic renames so concurrent workers never see partial sidecars
+    os.replace(base + ".lines" + tmp_suffix, base + ".lines")
+    os.replace(base + ".idx" + tmp_suffix, base + ".idx")
+    os.replace(meta_path + tmp_suffix, meta_path)
+    return meta
+
+
+class _ShardReader:
+    """Random access to the lines of one preprocessed shard through mmap."""
+
+    def __init__(self, meta: Dict[str, Any]):
+        self.line_count = meta["line_count"]
+        self.offsets = array("Q")
+        with open(meta["index_path"], "rb") as f:
+            self.offsets.fromfile(f, self.line_count + 1)
+        self._file = open(meta["data_path"], "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def lines(self, start: int, end: int) -> str:
+        """Return lines [start, end) joined by newlines."""
+        return self._mmap[self.offsets[start]:self.offsets[end] - 1].decode("utf-8")
+
+    def close(self) -> None:
+        self._mmap.close()
+        self._file.close()
+
+
+def block_byte_sizes(shards: List[Dict[str, Any]], block_size: int) -> List[int]:
+    """
+    Size in bytes of each block build_blocks would produce, read from the line offsets
+    only, so estimating a run never touches the log text.
+    """
+    sizes = []
+    current = 0
+    remaining = block_size
+    for meta in shards:
+        line_count = meta["line_count"]
+        offsets = array("Q")
+        with open(meta["index_path"], "rb") as f:
+            offsets.fromfile(f, line_count + 1)
+        position = 0
+        while position < line_count:
+            take = min(remaining, line_count - position)
+            current += offsets[position + take] - offsets[position]
+            position += take
+            remaining -= take
+            if remaining == 0:
+                sizes.append(current)
+                current = 0
+                remaining = block_size
+    if current:
+        sizes.append(current)
+    return sizes
+
+
+def iter_line_matches(shard: Dict[str, Any], regex: "re.Pattern[bytes]") -> Iterator[Tuple[int, "re.Match[bytes]"]]:
+    """
+    Run a bytes regex over the lines of a shard. The regex scans the memory-mapped data
+    as a whole; when a match would span lines (e.g. through `\\s` or `[^...]`), the lines
+    it covers are matched again one at a time, so no match ever crosses a line boundary.
+    Yields (line number in the log file, match); the header line is never matched.
+    """
+    reader = _ShardReader(shard)
+    data = reader._mmap
+    offsets = reader.offsets
+    try:
+        position = 0
+        # position may step past the end (the last line has no newline); stop there, as
+        # search() would clamp it and find the same empty match again
+        while position <= len(data):
+            match = regex.search(data, position)
+            if match is None:
+                return
+            # Line 0 is the "# Content from:" header, so the index is the 1-based log line
+            first = bisect_right(offsets, match.start()) - 1
+            if data.find(b"\n", match.start(), match.end()) == -1:
+                if first > 0:
+                    yield first, match
+                position = match.end() if match.end() > match.start() else match.end() + 1
+                continue
+            last = bisect_right(offsets, match.end() - 1) - 1
+            for line in range(max(first, 1), last + 1):
+                # Earlier matches on the first line were already yielded
+                start = match.start() if line == first else offsets[line]
+                for line_match in regex.finditer(data, start, offsets[line + 1] - 1):
+                    yield line, line_match
+            position = offsets[last + 1]
+    finally:
+        reader.close()
+
+
+def build_blocks(shards: List[Dict[str, Any]], block_size: int) -> List[str]:
+    """
+    Split the concatenated lines of all shards into blocks of `block_size` lines.
+    Produces the same blocks as log_handler.partition_log_into_blocks.
+    """
+    readers = [_ShardReader(meta) for meta in shards]
+    try:
+        log_blocks = []
+        parts = []
+        remaining = block_size
+        for reader in readers:
+            position = 0
+            while position < reader.line_count:
+                take = min(remaining, reader.line_count - position)
+                parts.append(reader.lines(position, position + take))
+                position += take
+                remaining -= take
+                if remaining == 0:
+                    log_blocks.append("\n".join(parts))
+                    parts = []
+                    remaining = block_size
+        if parts:
+            log_blocks.append("\n".join(parts))
+        return log_blocks
+    finally:
+        for reader in readers:
+            reader.close()
+
+
+def prune_cache(cache_dir: str, max_bytes: int, keep: Optional[Set[str]] = None,
+                min_age_seconds: float = 3600.0) -> int:
+    """
+    Delete the least recently used sidecars until the cache fits in `max_bytes`.
+    Shards used in the last `min_age_seconds` are never deleted, since concurrent
+    requests and other worker processes may still be reading them, nor are shards
+    whose data path is in `keep`. The cache can stay over `max_bytes` until they age.
+
+    Returns:
+        int: Number of shards removed.
+    """
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    entries = []
+    total = 0
+    cutoff = time.time() - min_age_seconds
+    for entry in os.scandir(cache_dir):
+        if not entry.name.endswith(".json"):
+            continue
+        base = entry.path[:-len(".json")]
+        size = 0
+        for suffix in (".lines", ".idx", ".json"):
+            try:
+                size += os.path.getsize(base + suffix)
+            except OSError:
+                pass
+        total += size
+        try:
+            last_used = entry.stat().st_mtime
+        except OSError:
+            continue
+        if last_used >= cutoff or (keep and base + ".lines" in keep):
+            continue
+        entries.append((last_used, base, size))
+
+    removed = 0
+    for _, base, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        # Remove the metadata first so readers never find a half-deleted shard
+        for suffix in (".json", ".lines", ".idx"):
+            try:
+                os.remove(base + suffix)
+            except OSError:
+                pass
+        total -= size
+        removed += 1
+    return removed
+
+
+class PreprocessService:
+    """
+    Process pool that preprocesses log files off the event loop, one task per file.
+
+    Results come back as small shard descriptors pointing at memory-mapped sidecar
+    files, so large line lists are never pickled between processes.
+    """
+
+    def __init__(self, cache_dir: str = "preprocess_cache", max_workers: Optional[int] = None,
+                 max_cache_bytes: int = 2 * 1024 ** 3, min_cache_age_seconds: float = 3600.0):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.max_cache_bytes = max_cache_bytes
+        self.min_cache_age_seconds = min_cache_age_seconds
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def preprocess(self, log_paths: List[str]) -> List[Dict[str, Any]]:
+        """
+        Preprocess log files in parallel worker processes.
+
+        Returns:
+            List[Dict[str, Any]]: Shard metadata in input order; missing files are skipped.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        shards = await asyncio.gather(*[
+            loop.run_in_executor(executor, preprocess_file, path, self.cache_dir)
+            for path in log_paths
+        ])
+        shards = [shard for shard in shards if shard is not None]
+        keep = {shard["data_path"] for shard in shards}
+        await run_in_thread(prune_cache, self.cache_dir, self.max_cache_bytes, keep, self.min_cache_age_seconds)
+        return shards
+
+
+def combined_content_hash(shards: List[Dict[str, Any]]) -> str:
+    """Hash of the content of all shards, in order. Identical log inputs give identical hashes."""
+    digest = hashlib.sha256()
+    for shard in shards:
+        digest.update(shard["sha256"].encode("ascii"))
+    return digest.hexdigest()
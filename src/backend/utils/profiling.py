@@ -0,0 +1,216 @@
+import cProfile
+import json
+import os
+import pstats
+import shutil
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+# Frames where a thread sits idle: the event loop waiting for I/O, pool threads waiting for work
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+}
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+PROFILE_ID_LENGTH = 32
+
+
+class ProfilerBusy(Exception):
+    """Raised when another request is already being profiled."""
+
+
+def _frame_label(filename: str, lineno: int, name: str) -> str:
+    return f"{name} ({os.path.basename(filename)}:{lineno})"
+
+
+class StackSampler:
+    """
+    Samples the Python stacks of all threads from a background thread.
+
+    Each sample adds the time since the previous one to the functions on every
+    non-idle stack, which estimates wall-clock time per function, including time
+    spent in worker threads that cProfile on the event loop thread cannot see.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.self_seconds: Counter = Counter()
+        self.total_seconds: Counter = Counter()
+        self.folded: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        thread_names = {}
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight, last = now - last, now
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack: List[Tuple[str, int, str]] = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                if not stack or (os.path.basename(stack[0][0]), stack[0][2]) in IDLE_FRAMES:
+                    continue
+                self.samples += 1
+                self.self_seconds[stack[0]] += weight
+                for function in set(stack):
+                    self.total_seconds[function] += weight
+                if thread_id not in thread_names:
+                    thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+                root = thread_names.get(thread_id, str(thread_id))
+                self.folded[";".join([root] + [_frame_label(*function) for function in reversed(stack)])] += weight
+
+    def summary(self) -> List[Dict[str, Any]]:
+        return [
+            {"function": _frame_label(*function), "wall_seconds": round(seconds, 4),
+             "self_wall_seconds": round(self.self_seconds.get(function, 0.0), 4)}
+            for function, seconds in self.total_seconds.most_common(TOP_FUNCTIONS)
+        ]
+
+    def folded_stacks(self) -> str:
+        """Collapsed stacks ("a;b;c <microseconds>") for flamegraph.pl or speedscope."""
+        return "".join(f"{stack} {int(seconds * 1e6)}\n" for stack, seconds in self.folded.items() if seconds > 0)
+
+
+class ProfileSession:
+    """The profilers attached to one request."""
+
+    def __init__(self, label: str, sample_interval: float, trace_memory: bool):
+        self.profile_id = uuid.uuid4().hex
+        self.label = label
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        # CPU time of the event loop thread, per function
+        self.cpu_profile = cProfile.Profile(time.thread_time)
+        self.sampler = StackSampler(sample_interval)
+        # Another tool may already be tracing; its trace is left alone
+        self.trace_memory = trace_memory and not tracemalloc.is_tracing()
+        self.wall_seconds = 0.0
+        self.memory: Dict[str, Any] = {}
+
+    def start(self) -> None:
+        if self.trace_memory:
+            tracemalloc.start()
+        self.sampler.start()
+        self.cpu_profile.enable()
+
+    def stop(self) -> None:
+        self.cpu_profile.disable()
+        self.sampler.stop()
+        self.wall_seconds = time.perf_counter() - self._start
+        if self.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            self.memory = {
+                "peak_bytes": peak,
+                "top_allocations": [
+                    {"location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                     "bytes": stat.size, "count": stat.count}
+                    for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+                ]
+            }
+
+    def cpu_summary(self) -> List[Dict[str, Any]]:
+        stats = pstats.Stats(self.cpu_profile).stats
+        rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+        return [
+            {"function": _frame_label(*function), "calls": calls,
+             "cpu_seconds": round(cumulative, 4), "self_cpu_seconds": round(own, 4)}
+            for function, (_, calls, own, cumulative, _) in rows
+        ]
+
+
+class RequestProfiler:
+    """
+    Profiles one request at a time and stores the result under `profile_dir/<profile_id>/`:
+    summary.json (CPU and wall time per function, memory peak and top allocations),
+    cpu.prof (pstats, for snakeviz or pstats) and stacks.folded (for a flame graph).
+
+    cProfile and the sampler see everything the process runs meanwhile, so a profile
+    taken while other requests are active includes their work too.
+    """
+
+    def __init__(self, profile_dir: str = "profiles", sample_interval: float = 0.005,
+                 trace_memory: bool = True, max_profiles: int = 50):
+        self.profile_dir = profile_dir
+        self.sample_interval = sample_interval
+        self.trace_memory = trace_memory
+        self.max_profiles = max_profiles
+        self._active: Optional[ProfileSession] = None
+        self._lock = threading.Lock()
+
+    def start(self, label: str) -> ProfileSession:
+        """
+        Raises:
+            ProfilerBusy: If another request is being profiled.
+        """
+        with self._lock:
+            if self._active is not None:
+                raise ProfilerBusy(f"Request profile {self._active.profile_id} is still running")
+            self._active = ProfileSession(label, self.sample_interval, self.trace_memory)
+        self._active.start()
+        return self._active
+
+    def stop(self, session: ProfileSession) -> None:
+        session.stop()
+        with self._lock:
+            self._active = None
+
+    def save(self, session: ProfileSession) -> str:
+        """Write the profile files of a stopped session. Returns the profile directory."""
+        path = os.path.join(self.profile_dir, session.profile_id)
+        os.makedirs(path, exist_ok=True)
+        session.cpu_profile.dump_stats(os.path.join(path, "cpu.prof"))
+        with open(os.path.join(path, "stacks.folded"), "w", encoding="utf-8") as f:
+            f.write(session.sampler.folded_stacks())
+        summary = {
+            "profile_id": session.profile_id,
+            "label": session.label,
+            "started_at": session.started_at,
+            "wall_seconds": round(session.wall_seconds, 4),
+            "samples": session.sampler.samples,
+            "cpu_by_function": session.cpu_summary(),
+            "wall_by_function": session.sampler.summary(),
+            "memory": session.memory
+        }
+        with open(os.path.join(path, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        self._prune()
+        return path
+
+    def path(self, profile_id: str, artifact: str = "summary.json") -> Optional[str]:
+        if len(profile_id) != PROFILE_ID_LENGTH or not all(c in "0123456789abcdef" for c in profile_id):
+            return None
+        path = os.path.join(self.profile_dir, profile_id, artifact)
+        return path if os.path.exists(path) else None
+
+    def _prune(self) -> None:
+        entries = sorted(
+            (entry for entry in os.scandir(self.profile_dir) if entry.is_dir()),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in entries[:max(0, len(entries) - self.max_profiles)]:
+            shutil.rmtree(entry.path, ignore_errors=True)
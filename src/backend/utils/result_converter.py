@@ -0,0 +1,294 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Patterns are compiled once per process instead of on every call
+TEMPLATE_ID_PATTERN = re.compile(r'^(\S+)\s+Results\s+===')
+COMPLETED_TEMPLATE_PATTERN = re.compile(r'###?\s*Completed Template\s*\n(.*?)(?=###|\Z)', re.DOTALL | re.IGNORECASE)
+# ___content___ or __content__, with optional parentheses in the content
+FILLED_BLANK_PATTERN = re.compile(r'_{2,}([^_]+(?:\([^)]*\))?)_{2,}')
+NAMED_VALUE_PATTERN = re.compile(r'^([a-zA-Z_]+)\s*\((.*)\)$')
+# "[component_A]: Hive" or "[apply_count: number]: 3" lines of a filled template
+BRACKET_BLANK_PATTERN = re.compile(r'^\s*[-*]?\s*\[([A-Za-z_][\w ]*?)(?::\s*[\w ]+)?\]\s*:\s*(.+?)\s*$', re.MULTILINE)
+
+CONVERTIBLE_EXTENSIONS = (".log", ".txt", ".json")
+
+
+def format_results(results: Dict[str, List[str]]) -> str:
+    """Render grouped results (by template_id) in the text format read by parse_results_text."""
+    parts = []
+    for template_id, result_list in results.items():
+        parts.append(f"\n=== {template_id} Results ===\n")
+        for idx, result in enumerate(result_list):
+            if len(result_list) > 1:
+                parts.append(f"\n--- Response {idx + 1} ---\n")
+            parts.append(result.strip() + "\n\n")
+    return "".join(parts)
+
+
+def parse_results_text(content: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Extract the filled blanks of every template from a results text.
+
+    Args:
+        content: Text with "=== <template_id> Results ===" sections
+
+    Returns:
+        Dict[str, Dict[str, Any]]: template_id -> template_lines, filled_blanks, raw_filled_values
+    """
+    all_templates = {}
+
+    # Split content by template sections
+    for section in content.split('=== ')[1:]:
+        template_id_match = TEMPLATE_ID_PATTERN.match(section)
+        if not template_id_match:
+            continue
+        template_id = template_id_match.group(1)
+
+        completed_template_match = COMPLETED_TEMPLATE_PATTERN.search(section)
+        if not completed_template_match:
+            continue
+        completed_content = completed_template_match.group(1)
+
+        filled_blanks = FILLED_BLANK_PATTERN.findall(completed_content)
+
+        # Also extract template structure lines
+        template_lines = []
+        for line in completed_content.split('\n'):
+            line = line.strip()
+            if line.startswith('-') and ('___' in line or '__' in line or '{{' in line):
+                template_lines.append(line)
+
+        # Parse each filled blank to extract variable name and value
+        parsed_blanks = {}
+        for blank in filled_blanks:
+            match = NAMED_VALUE_PATTERN.match(blank.strip())
+            if match:
+                parsed_blanks[match.group(1)] = match.group(2).strip()
+            else:
+                # If no variable name, use the position as key
+                parsed_blanks[f"blank_{len(parsed_blanks) + 1}"] = blank.strip()
+
+        # Templates filled in place keep their [blank] names
+        for name, value in BRACKET_BLANK_PATTERN.findall(completed_content):
+            parsed_blanks.setdefault(name.strip(), value)
+            filled_blanks.append(value)
+
+        all_templates[template_id] = {
+            "template_lines": template_lines,
+            "filled_blanks": parsed_blanks,
+            "raw_filled_values": filled_blanks
+        }
+
+    return all_templates
+
+
+def _read_results_file(file_path: str) -> Tuple[str, bytes]:
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    if file_path.endswith(".json"):
+        # Stored diagnosis results: {"results": {template_id: [responses]}}
+        data = json.loads(raw)
+        content = format_results(data.get("results", {})) if isinstance(data, dict) else ""
+    else:
+        content = raw.decode('utf-8')
+    return content, raw
+
+
+def convert_to_json(file_path: str, output_dir: str = "chat_history") -> str:
+    """
+    Convert the filled templates from a results file to JSON format.
+
+    Args:
+        file_path: Path to the file containing template results
+        output_dir: Directory for the extracted JSON file
+
+    Returns:
+        str: Path to the saved JSON file
+    """
+    content, _ = _read_results_file(file_path)
+    all_templates = parse_results_text(content)
+
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    json_filename = os.path.join(output_dir, f"{base_name}_extracted.json")
+    os.makedirs(output_dir, exist_ok=True)
+
+    with open(json_filename, 'w', encoding='utf-8') as f:
+        json.dump(all_templates, f, indent=2, ensure_ascii=False)
+
+    logger.info("Extracted templates saved to: %s", json_filename)
+    return json_filename
+
+
+def save_results_to_file(results: Dict[str, List[str]], output_dir: str = "chat_history") -> str:
+    """
+    Save grouped results (by template_id) into a timestamped log file and convert it to JSON.
+
+    Args:
+        results (Dict[str, List[str]]): Mapping from template_id to list of result strings.
+        output_dir (str): Directory for the log file and the extracted JSON.
+
+    Returns:
+        str: Full path of the saved log file.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    os.makedirs(output_dir, exist_ok=True)
+    log_filename = os.path.join(output_dir, f"{timestamp}.log")
+
+    with open(log_filename, "w", encoding="utf-8") as f:
+        f.write(format_results(results))
+
+    logger.info("Results written to: %s", log_filename)
+    json_path = convert_to_json(log_filename, output_dir)
+    logger.info("Convert Results to json file: %s", json_path)
+    return log_filename
+
+
+def _convert_file(task: Tuple[str, Optional[str]]) -> Tuple[str, Optional[str], Optional[Dict[str, Any]]]:
+    """
+    Worker: hash and parse one file. Returns (path, sha256, templates); templates is
+    None when the content hash equals the previously converted one, and sha256 is
+    None when the file could not be read.
+    """
+    file_path, known_sha256 = task
+    try:
+        content, raw = _read_results_file(file_path)
+    except (OSError, ValueError) as e:
+        logger.warning("Could not read %s: %s", file_path, e)
+        return file_path, None, None
+    sha256 = hashlib.sha256(raw).hexdigest()
+    if sha256 == known_sha256:
+        return file_path, sha256, None
+    return file_path, sha256, parse_results_text(content)
+
+
+def _load_manifest(manifest_path: str) -> Dict[str, Dict[str, Any]]:
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _load_records(output_path: str) -> Dict[str, str]:
+    """Current output records as source -> JSON line; the last record for a source wins."""
+    records = {}
+    if os.path.exists(output_path):
+        with open(output_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    records[json.loads(line)["source"]] = line.rstrip("\n")
+    return records
+
+
+def _replace_file(path: str, write) -> None:
+    """Write a file through a temporary file and rename it into place."""
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        write(f)
+    os.replace(path + ".tmp", path)
+
+
+def convert_directory(results_dir: str, output_path: str, workers: Optional[int] = None) -> Dict[str, int]:
+    """
+    Convert every results file in a directory tree into one JSONL file, in parallel.
+
+    Conversion is incremental: a manifest next to the output records the mtime, size and
+    SHA-256 of each converted file. Files with unchanged mtime and size are skipped without
+    being read, and files whose content hash is unchanged are skipped without being parsed.
+    The output is rewritten atomically with one record per source: a changed file replaces
+    its record and a deleted file loses it. The output and manifest are never converted,
+    even when they sit inside `results_dir`.
+
+    Args:
+        results_dir: Directory with .log/.txt results files or stored diagnosis .json files
+        output_path: JSONL file, one {"source", "sha256", "converted_at", "templates"} record per file
+        workers: Number of worker processes (default: CPU count)
+
+    Returns:
+        Dict[str, int]: Counts of converted, unchanged, skipped, removed and failed files.
+    """
+    manifest_path = output_path + ".manifest.json"
+    manifest = _load_manifest(manifest_path)
+    own_files = {os.path.abspath(path) for path in (output_path, output_path + ".tmp",
+                                                    manifest_path, manifest_path + ".tmp")}
+
+    tasks = []
+    stats: Dict[str, Dict[str, int]] = {}
+    seen = set()
+    skipped = 0
+    for root, _, files in os.walk(results_dir):
+        for name in sorted(files):
+            if not name.endswith(CONVERTIBLE_EXTENSIONS) or name.endswith("_extracted.json"):
+                continue
+            file_path = os.path.join(root, name)
+            if os.path.abspath(file_path) in own_files:
+                continue
+            seen.add(file_path)
+            stat = os.stat(file_path)
+            entry = manifest.get(file_path)
+            if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                skipped += 1
+                continue
+            stats[file_path] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+            tasks.append((file_path, entry["sha256"] if entry else None))
+
+    deleted = [file_path for file_path in manifest if file_path not in seen]
+    for file_path in deleted:
+        del manifest[file_path]
+
+    converted = unchanged = failed = 0
+    new_records: Dict[str, str] = {}
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(tasks) // ((workers or os.cpu_count() or 1) * 4))
+            for file_path, sha256, templates in executor.map(_convert_file, tasks, chunksize=chunksize):
+                if sha256 is None:
+                    failed += 1
+                    continue
+                manifest[file_path] = dict(stats[file_path], sha256=sha256)
+                if templates is None:
+                    unchanged += 1
+                    continue
+                new_records[file_path] = json.dumps({
+                    "source": file_path,
+                    "sha256": sha256,
+                    "converted_at": datetime.now().isoformat(),
+                    "templates": templates
+                }, ensure_ascii=False)
+                converted += 1
+
+    if new_records or deleted:
+        records = _load_records(output_path)
+        for file_path in deleted:
+            records.pop(file_path, None)
+        records.update(new_records)
+        out_dir = os.path.dirname(output_path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        _replace_file(output_path, lambda f: f.writelines(line + "\n" for line in records.values()))
+    if tasks or deleted:
+        # Written after the output, so a crash in between only causes files to be converted again
+        _replace_file(manifest_path, lambda f: json.dump(manifest, f))
+
+    logger.info("Converted %d files, %d unchanged, %d skipped, %d removed, %d failed -> %s",
+                converted, unchanged, skipped, len(deleted), failed, output_path)
+    return {"converted": converted, "unchanged": unchanged, "skipped": skipped,
+            "removed": len(deleted), "failed": failed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a directory of template results into one JSONL file")
+    parser.add_argument("results_dir", help="Directory with results files")
+    parser.add_argument("output", help="Output JSONL file")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    convert_directory(args.results_dir, args.output, args.workers)
@@ -0,0 +1,305 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+import zlib
+from contextlib import closing
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils.db import connect_sqlite
+
+logger = logging.getLogger(__name__)
+
+
+# seq numbers runs in commit order (SQLite has one writer at a time) and is never reused,
+# so readers can follow new runs without missing one saved late by another process
+RUNS_TABLE = """
+CREATE TABLE IF NOT EXISTS {name} (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    session_id TEXT,
+    log_hash TEXT,
+    templates_path TEXT,
+    created_at REAL NOT NULL,
+    size INTEGER NOT NULL,
+    payload BLOB NOT NULL
+);
+"""
+
+SCHEMA = RUNS_TABLE.format(name="runs") + """
+CREATE INDEX IF NOT EXISTS idx_runs_created ON runs (created_at);
+CREATE INDEX IF NOT EXISTS idx_runs_kind_created ON runs (kind, created_at);
+CREATE INDEX IF NOT EXISTS idx_runs_session_created ON runs (session_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_runs_log_hash ON runs (log_hash);
+
+CREATE TABLE IF NOT EXISTS run_templates (
+    run_id TEXT NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    template_id TEXT NOT NULL,
+    PRIMARY KEY (run_id, template_id)
+);
+CREATE INDEX IF NOT EXISTS idx_run_templates_template ON run_templates (template_id);
+
+CREATE TABLE IF NOT EXISTS legacy_imports (
+    path TEXT PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    imported_at REAL NOT NULL
+);
+"""
+
+SUMMARY_COLUMNS = "run_id, kind, session_id, log_hash, templates_path, created_at, size"
+
+# Result files written before runs were stored here: "20250101-120000_diagnosis.json"
+LEGACY_FILE_PATTERN = re.compile(r'^(\d{8}-\d{6})_(analysis|diagnosis)\.json$')
+
+
+class ResultsStore:
+    """
+    Analysis and diagnosis results keyed by a unique run ID.
+
+    Payloads are stored as zlib-compressed JSON. Runs are indexed by kind,
+    session, log-content hash, template and creation time, and old runs are
+    evicted by age or total stored size every `retention_every` saves.
+    """
+
+    def __init__(self, db_path: str, max_age_days: Optional[float] = None,
+                 max_total_bytes: Optional[int] = None, retention_every: int = 1):
+        self.db_path = db_path
+        self.max_age_days = max_age_days
+        self.max_total_bytes = max_total_bytes
+        self.retention_every = max(1, retention_every)
+        self._saves = 0
+        self._saves_lock = threading.Lock()
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+        self._add_seq_column()
+
+    def _add_seq_column(self) -> None:
+        """Rebuild a runs table created before runs had a seq column, numbering runs by creation time."""
+        with closing(connect_sqlite(self.db_path)) as conn:
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(runs)")}
+            if "seq" in columns:
+                return
+            # Off, so dropping the old table does not cascade to run_templates
+            conn.execute("PRAGMA foreign_keys=OFF")
+            conn.execute("BEGIN IMMEDIATE")
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(runs)")}
+            if "seq" in columns:
+                conn.execute("ROLLBACK")
+                return
+            conn.execute(RUNS_TABLE.format(name="runs_new"))
+            conn.execute(
+                f"INSERT INTO runs_new ({SUMMARY_COLUMNS}, payload) "
+                f"SELECT {SUMMARY_COLUMNS}, payload FROM runs ORDER BY created_at, run_id"
+            )
+            conn.execute("DROP TABLE runs")
+            conn.execute("ALTER TABLE runs_new RENAME TO runs")
+            conn.execute("COMMIT")
+            # The indexes went with the old table
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = connect_sqlite(self.db_path)
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    @staticmethod
+    def _insert_run(conn, kind: str, payload: Dict[str, Any], session_id: Optional[str],
+                    log_hash: Optional[str], templates_path: Optional[str],
+                    template_ids: Iterable[str], created_at: float) -> str:
+        run_id = uuid.uuid4().hex
+        blob = zlib.compress(json.dumps(payload).encode("utf-8"))
+        conn.execute(
+            "INSERT INTO runs (run_id, kind, session_id, log_hash, templates_path, created_at, size, payload) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (run_id, kind, session_id, log_hash, templates_path, created_at, len(blob), blob)
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO run_templates (run_id, template_id) VALUES (?, ?)",
+            [(run_id, template_id) for template_id in template_ids]
+        )
+        return run_id
+
+    def save_run(self, kind: str, payload: Dict[str, Any], session_id: Optional[str] = None,
+                 log_hash: Optional[str] = None, templates_path: Optional[str] = None,
+                 template_ids: Iterable[str] = ()) -> str:
+        """
+        Store one run, applying the retention policy every `retention_every` saves.
+
+        Returns:
+            str: The new run ID.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN")
+            run_id = self._insert_run(conn, kind, payload, session_id, log_hash, templates_path,
+                                      template_ids, time.time())
+            conn.execute("COMMIT")
+        # Retention scans the whole table, so it is not worth paying on every save
+        with self._saves_lock:
+            self._saves += 1
+            due = self._saves >= self.retention_every
+            if due:
+                self._saves = 0
+        if due:
+            self.enforce_retention()
+        return run_id
+
+    def import_legacy(self, directories: Dict[str, str]) -> int:
+        """
+        Import the timestamped JSON result files written before runs were stored here,
+        each file once (imported files are recorded, not deleted), then apply retention.
+
+        Args:
+            directories: Run kind ("analysis" or "diagnosis") -> directory of its result files
+
+        Returns:
+            int: Number of runs imported.
+        """
+        imported = 0
+        for kind, directory in directories.items():
+            if not os.path.isdir(directory):
+                continue
+            for name in sorted(os.listdir(directory)):
+                match = LEGACY_FILE_PATTERN.match(name)
+                if match is None or match.group(2) != kind:
+                    continue
+                path = os.path.abspath(os.path.join(directory, name))
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        payload = json.load(f)
+                    created_at = time.mktime(time.strptime(match.group(1), "%Y%m%d-%H%M%S"))
+                except (OSError, ValueError) as e:
+                    logger.warning("Skipping legacy result file %s: %s", path, e)
+                    continue
+                if not isinstance(payload, dict):
+                    continue
+                with closing(self._connect()) as conn:
+                    # Serializes worker processes importing at startup, so each file is imported once
+                    conn.execute("BEGIN IMMEDIATE")
+                    if conn.execute("SELECT 1 FROM legacy_imports WHERE path = ?", (path,)).fetchone():
+                        conn.execute("ROLLBACK")
+                        continue
+                    # The logs may have changed since, so legacy runs get no log hash
+                    run_id = self._insert_run(
+                        conn, kind, payload, None, None, payload.get("templates_path"),
+                        list(payload.get("results", {})) if kind == "diagnosis" else (), created_at
+                    )
+                    conn.execute("INSERT INTO legacy_imports (path, run_id, imported_at) VALUES (?, ?, ?)",
+                                 (path, run_id, time.time()))
+                    conn.execute("COMMIT")
+                imported += 1
+        if imported:
+            logger.info("Imported %d legacy result files", imported)
+        self.enforce_retention()
+        return imported
+
+    def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(f"SELECT {SUMMARY_COLUMNS}, payload FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if row is None:
+                return None
+            templates = conn.execute(
+                "SELECT template_id FROM run_templates WHERE run_id = ? ORDER BY template_id", (run_id,)
+            ).fetchall()
+        run = dict(row)
+        run["payload"] = json.loads(zlib.decompress(run["payload"]).decode("utf-8"))
+        run["template_ids"] = [template["template_id"] for template in templates]
+        return run
+
+    def list_runs(self, kind: Optional[str] = None, session_id: Optional[str] = None,
+                  log_hash: Optional[str] = None, template_id: Optional[str] = None,
+                  since: Optional[float] = None, until: Optional[float] = None,
+                  limit: int = 20, offset: int = 0) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        List run summaries (without payloads), newest first.
+
+        Returns:
+            Tuple[int, List[Dict[str, Any]]]: Total number of matching runs and the requested page.
+        """
+        conditions = []
+        params: List[Any] = []
+        if kind:
+            conditions.append("kind = ?")
+            params.append(kind)
+        if session_id:
+            conditions.append("session_id = ?")
+            params.append(session_id)
+        if log_hash:
+            conditions.append("log_hash = ?")
+            params.append(log_hash)
+        if template_id:
+            conditions.append("run_id IN (SELECT run_id FROM run_templates WHERE template_id = ?)")
+            params.append(template_id)
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("created_at < ?")
+            params.append(until)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with closing(self._connect()) as conn:
+            total = conn.execute(f"SELECT COUNT(*) AS n FROM runs{where}", params).fetchone()["n"]
+            rows = conn.execute(
+                f"SELECT {SUMMARY_COLUMNS} FROM runs{where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return total, [dict(row) for row in rows]
+
+    def iter_runs_after(self, after_seq: int = 0, batch_size: int = 200) -> Iterator[Dict[str, Any]]:
+        """
+        Yield full runs (with their `seq`) saved after run number `after_seq`, in the
+        order they were saved, loading `batch_size` at a time.
+        """
+        last_seq = after_seq
+        while True:
+            with closing(self._connect()) as conn:
+                rows = conn.execute(
+                    f"SELECT seq, {SUMMARY_COLUMNS}, payload FROM runs WHERE seq > ? ORDER BY seq LIMIT ?",
+                    (last_seq, batch_size)
+                ).fetchall()
+            for row in rows:
+                run = dict(row)
+                run["payload"] = json.loads(zlib.decompress(run["payload"]).decode("utf-8"))
+                yield run
+            if len(rows) < batch_size:
+                return
+            last_seq = rows[-1]["seq"]
+
+    def oldest_created_at(self) -> Optional[float]:
+        """Creation time of the oldest stored run. Retention always evicts the oldest runs first."""
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT MIN(created_at) AS oldest FROM runs").fetchone()["oldest"]
+
+    def enforce_retention(self) -> int:
+        """
+        Evict runs older than max_age_days, then the oldest runs until the
+        total payload size is under max_total_bytes.
+
+        Returns:
+            int: Number of runs removed.
+        """
+        removed = 0
+        with closing(self._connect()) as conn:
+            if self.max_age_days is not None:
+                cutoff = time.time() - self.max_age_days * 86400
+                removed += conn.execute("DELETE FROM runs WHERE created_at < ?", (cutoff,)).rowcount
+
+            if self.max_total_bytes is not None:
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) AS total FROM runs").fetchone()["total"]
+                if total > self.max_total_bytes:
+                    excess = total - self.max_total_bytes
+                    # Oldest runs whose cumulative size covers the excess
+                    rows = conn.execute("SELECT run_id, size FROM runs ORDER BY created_at").fetchall()
+                    evict = []
+                    for row in rows:
+                        if excess <= 0:
+                            break
+                        evict.append((row["run_id"],))
+                        excess -= row["size"]
+                    conn.executemany("DELETE FROM runs WHERE run_id = ?", evict)
+                    removed += len(evict)
+        return removed
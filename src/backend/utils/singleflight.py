@@ -0,0 +1,40 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls.
+
+    The first caller for a key starts the computation; callers that arrive
+    while it is still running attach to it and receive the same result (or
+    exception). A caller giving up does not cancel the shared computation.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run `func` once per key at a time.
+
+        Returns:
+            Tuple[Any, bool]: The result and whether it was shared with an earlier caller.
+        """
+        future = self._inflight.get(key)
+        shared = future is not None
+        if future is None:
+            future = asyncio.ensure_future(func())
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(future), shared
+
+    def _forget(self, key: str, future: asyncio.Future) -> None:
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        # Retrieve the exception so an unawaited failure is not reported as never retrieved
+        if not future.cancelled():
+            future.exception()
@@ -0,0 +1,165 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+# Request-scoped fields added to every record logged while they are bound
+_log_context: ContextVar[Dict[str, Any]] = ContextVar("log_context", default={})
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+@contextmanager
+def log_context(**fields: Any):
+    """Add fields (e.g. request_id, session_id) to all records logged in the body, including from tasks it starts."""
+    token = _log_context.set({**_log_context.get(), **{key: value for key, value in fields.items() if value is not None}})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+def current_log_context() -> Dict[str, Any]:
+    """Fields bound with log_context where this is called."""
+    return _log_context.get()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line. A `payload` field (e.g. an LLM response) is cut to
+    `payload_max_chars`, except for a `payload_sample_rate` fraction of records that
+    keep it whole, so large texts are still inspectable without flooding the log.
+    """
+
+    def __init__(self, payload_max_chars: int = 500, payload_sample_rate: float = 0.0):
+        super().__init__()
+        self.payload_max_chars = payload_max_chars
+        self.payload_sample_rate = payload_sample_rate
+
+    def fields(self, record: logging.LogRecord) -> Dict[str, Any]:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        payload = entry.get("payload")
+        if isinstance(payload, str):
+            entry["payload_chars"] = len(payload)
+            if len(payload) > self.payload_max_chars and random.random() >= self.payload_sample_rate:
+                entry["payload"] = payload[:self.payload_max_chars]
+                entry["payload_truncated"] = True
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return entry
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(self.fields(record), default=str, ensure_ascii=False)
+
+
+class TextFormatter(JsonFormatter):
+    """Human-readable variant for local development: message followed by key=value fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = self.fields(record)
+        ts, level, message = entry.pop("ts"), entry.pop("level"), entry.pop("message")
+        entry.pop("logger", None)
+        exception = entry.pop("exception", None)
+        payload = entry.pop("payload", None)
+        fields = " ".join(f"{key}={value}" for key, value in entry.items())
+        stamp = time.strftime("%H:%M:%S", time.localtime(ts))
+        text = f"{stamp} {level:<7} {message}" + (f"  [{fields}]" if fields else "")
+        if payload:
+            text += "\n" + str(payload)
+        if exception:
+            text += "\n" + exception
+        return text
+
+
+class _ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues records without formatting them. Only the cheap parts run in the caller:
+    merging the message arguments, capturing the bound context and the traceback text.
+    When the queue is full, records are dropped instead of blocking.
+    """
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]"):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        for key, value in _log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(level: str = "INFO", log_format: str = "json", payload_max_chars: int = 500,
+                  payload_sample_rate: float = 0.0, queue_size: int = 10000) -> None:
+    """
+    Route all logging through a bounded queue to a stdout writer thread, so logging
+    calls on the event loop never wait for the terminal or a log collector.
+    Calling it again replaces the previous setup.
+    """
+    global _listener
+    shutdown_logging()
+
+    formatter_class = TextFormatter if log_format == "text" else JsonFormatter
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter_class(payload_max_chars, payload_sample_rate))
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=queue_size)
+    queue_handler = _ContextQueueHandler(log_queue)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, _ContextQueueHandler):
+            root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Write the records still queued and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_records() -> int:
+    return sum(handler.dropped for handler in logging.getLogger().handlers
+               if isinstance(handler, _ContextQueueHandler))
+
+
+atexit.register(shutdown_logging)
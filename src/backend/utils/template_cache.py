@@ -0,0 +1,115 @@
+import hashlib
+import threading
+import time
+import zlib
+from contextlib import closing
+from typing import Dict, Iterable, Optional
+
+from utils.db import connect_sqlite
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS template_results (
+    cache_key TEXT PRIMARY KEY,
+    log_hash TEXT NOT NULL,
+    template_id TEXT NOT NULL,
+    template_hash TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    response BLOB NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_template_results_log ON template_results (log_hash);
+CREATE INDEX IF NOT EXISTS idx_template_results_created ON template_results (created_at);
+"""
+
+# Keys looked up per query; stays under SQLite's limit on bound variables (999 before 3.32)
+LOOKUP_CHUNK_SIZE = 500
+
+
+def template_result_key(log_hash: str, template_hash: str, model: str, prompt_version: str) -> str:
+    """Memoization key of one template answer."""
+    return hashlib.sha256(f"{log_hash}:{template_hash}:{model}:{prompt_version}".encode("utf-8")).hexdigest()
+
+
+class TemplateResultCache:
+    """
+    Memoized template answers keyed by (log-content hash, template-content hash,
+    model, prompt version), so re-diagnosis only asks the LLM about templates or
+    logs that changed. Every `retention_every` puts, answers older than
+    max_age_days are evicted, then the oldest ones until at most max_entries remain.
+    """
+
+    def __init__(self, db_path: str, max_age_days: Optional[float] = None, max_entries: Optional[int] = None,
+                 retention_every: int = 1):
+        self.db_path = db_path
+        self.max_age_days = max_age_days
+        self.max_entries = max_entries
+        self.retention_every = max(1, retention_every)
+        self._puts = 0
+        self._puts_lock = threading.Lock()
+        with closing(connect_sqlite(self.db_path)) as conn:
+            conn.executescript(SCHEMA)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """
+        Returns:
+            Dict[str, str]: Cached responses for the keys that were found.
+        """
+        keys = list(keys)
+        if not keys:
+            return {}
+        min_created = time.time() - self.max_age_days * 86400 if self.max_age_days is not None else 0
+        results = {}
+        with closing(connect_sqlite(self.db_path)) as conn:
+            for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+                chunk = keys[start:start + LOOKUP_CHUNK_SIZE]
+                placeholders = ", ".join("?" for _ in chunk)
+                rows = conn.execute(
+                    f"SELECT cache_key, response FROM template_results WHERE cache_key IN ({placeholders}) AND created_at >= ?",
+                    chunk + [min_created]
+                ).fetchall()
+                for row in rows:
+                    results[row["cache_key"]] = zlib.decompress(row["response"]).decode("utf-8")
+        return results
+
+    def put(self, cache_key: str, log_hash: str, template_id: str, template_hash: str,
+            model: str, prompt_version: str, response: str) -> None:
+        with closing(connect_sqlite(self.db_path)) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO template_results "
+                "(cache_key, log_hash, template_id, template_hash, model, prompt_version, response, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (cache_key, log_hash, template_id, template_hash, model, prompt_version,
+                 zlib.compress(response.encode("utf-8")), time.time())
+            )
+        # A diagnosis puts one answer per template, and retention sorts the whole table
+        with self._puts_lock:
+            self._puts += 1
+            due = self._puts >= self.retention_every
+            if due:
+                self._puts = 0
+        if due:
+            self.enforce_retention()
+
+    def enforce_retention(self) -> int:
+        """
+        Evict answers older than max_age_days, then the oldest answers until at
+        most max_entries remain.
+
+        Returns:
+            int: Number of answers removed.
+        """
+        removed = 0
+        with closing(connect_sqlite(self.db_path)) as conn:
+            if self.max_age_days is not None:
+                cutoff = time.time() - self.max_age_days * 86400
+                removed += conn.execute("DELETE FROM template_results WHERE created_at < ?", (cutoff,)).rowcount
+
+            if self.max_entries is not None:
+                removed += conn.execute(
+                    "DELETE FROM template_results WHERE cache_key IN ("
+                    "SELECT cache_key FROM template_results ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                ).rowcount
+        return removed
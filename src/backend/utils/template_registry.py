@@ -0,0 +1,243 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.async_utils import run_in_thread
+
+logger = logging.getLogger(__name__)
+
+
+TEMPLATE_EXTENSIONS = ('.txt', '.template')
+
+# "[connection_count: number]" or "[component_A]"
+BLANK_PATTERN = re.compile(r'\[([A-Za-z_][\w ]*?)(?:\s*:\s*([\w ]+?))?\s*\]')
+RULE_PATTERN_SECTION = re.compile(r'^#+\s*Rule Pattern:?\s*$\n(.*?)(?=^#|\Z)', re.MULTILINE | re.DOTALL | re.IGNORECASE)
+BLANK_DEFINITIONS_SECTION = re.compile(r'^#+\s*Blank Definitions:?\s*$\n(.*?)(?=^#|\Z)', re.MULTILINE | re.DOTALL | re.IGNORECASE)
+EXTRACTION_HINTS_SECTION = re.compile(r'^#+\s*Extraction Hints:?\s*$\n(.*?)(?=^#|\Z)', re.MULTILINE | re.DOTALL | re.IGNORECASE)
+# "- [connection_count: number]: Number of connections created"
+BLANK_DEFINITION_LINE = re.compile(r'^\s*[-*]\s*\[([A-Za-z_][\w ]*?)(?:\s*:\s*[\w ]+?)?\s*\]\s*:\s*(.+?)\s*$', re.MULTILINE)
+
+
+class TemplatePathNotAllowed(ValueError):
+    """Raised when a templates path is outside every allowed templates root."""
+
+
+class Template:
+    """A template file parsed once: rule pattern, typed blanks, extraction hints and content hash."""
+
+    def __init__(self, template_id: str, path: str, content: str):
+        self.template_id = template_id
+        self.path = path
+        self.content = content
+        self.content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+        rule_match = RULE_PATTERN_SECTION.search(content)
+        self.rule_pattern = rule_match.group(1).strip() if rule_match else ""
+
+        definitions_match = BLANK_DEFINITIONS_SECTION.search(content)
+        descriptions = dict(BLANK_DEFINITION_LINE.findall(definitions_match.group(1))) if definitions_match else {}
+
+        # "- [connection_count]: `Opening connection to`" -> regex used to fill the blank from the logs
+        hints_match = EXTRACTION_HINTS_SECTION.search(content)
+        self.extraction_hints: Dict[str, str] = {
+            name.strip(): hint.strip('`')
+            for name, hint in (BLANK_DEFINITION_LINE.findall(hints_match.group(1)) if hints_match else [])
+        }
+
+        # Blanks in rule pattern order; templates without a rule pattern section use the whole text
+        self.blanks: List[Dict[str, Optional[str]]] = []
+        seen = set()
+        for name, blank_type in BLANK_PATTERN.findall(self.rule_pattern or content):
+            name = name.strip()
+            if name in seen:
+                continue
+            seen.add(name)
+            self.blanks.append({
+                "name": name,
+                "type": blank_type.strip() or None,
+                "description": descriptions.get(name)
+            })
+
+
+def _template_files(templates_path: str) -> Dict[str, str]:
+    """Map template ID -> file path, using the same IDs as the original directory loader."""
+    if os.path.isfile(templates_path):
+        template_id = os.path.basename(templates_path).replace('.txt', '').replace('.template', '')
+        return {template_id: templates_path}
+
+    files = {}
+    for root, dirs, names in os.walk(templates_path):
+        for name in names:
+            if name.endswith(TEMPLATE_EXTENSIONS):
+                file_path = os.path.join(root, name)
+                relative_path = os.path.relpath(file_path, templates_path)
+                template_id = relative_path.replace(os.sep, '_').replace('.txt', '').replace('.template', '')
+                files[template_id] = file_path
+    return files
+
+
+class _TemplateSet:
+    """The parsed templates under one templates path, with the file stats they were read at."""
+
+    def __init__(self, templates_path: str):
+        self.templates_path = templates_path
+        self.templates: Dict[str, Template] = {}
+        self.stats: Dict[str, Tuple[int, int]] = {}
+        self.last_used = time.monotonic()
+
+    def scan(self) -> bool:
+        """
+        Re-stat the template files and re-read only new or modified ones.
+
+        Returns:
+            bool: Whether any template was added, changed or removed.
+        """
+        if not os.path.exists(self.templates_path):
+            changed = bool(self.templates)
+            self.templates, self.stats = {}, {}
+            return changed
+
+        templates = {}
+        stats = {}
+        changed = False
+        for template_id, file_path in _template_files(self.templates_path).items():
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            signature = (stat.st_mtime_ns, stat.st_size)
+            previous = self.templates.get(template_id)
+            if previous is not None and previous.path == file_path and self.stats.get(template_id) == signature:
+                templates[template_id] = previous
+                stats[template_id] = signature
+                continue
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    templates[template_id] = Template(template_id, file_path, f.read().strip())
+            except Exception as e:
+                logger.error("Error loading template file %s: %s", file_path, e)
+                continue
+            stats[template_id] = signature
+            changed = True
+
+        changed = changed or templates.keys() != self.templates.keys()
+        # Swap in a new dict so readers always see a complete snapshot
+        self.templates, self.stats = templates, stats
+        return changed
+
+
+class TemplateRegistry:
+    """
+    In-process cache of parsed templates, keyed by templates path.
+
+    A path is loaded the first time it is requested and then kept up to date by a
+    background poll that stats the files and re-parses only those whose mtime or
+    size changed, so requests read templates from memory.
+
+    Templates paths come from clients, so only paths under one of `roots` are served.
+    At most `max_sets` paths are kept (least recently used first out), and a path no
+    request has used for `idle_seconds` is no longer polled and is dropped.
+    """
+
+    def __init__(self, poll_interval: float = 2.0, roots: Optional[Iterable[str]] = None,
+                 max_sets: int = 32, idle_seconds: float = 600.0):
+        self.poll_interval = poll_interval
+        # None allows any path, e.g. for scripts that load templates directly
+        self.roots = None if roots is None else [os.path.realpath(root) for root in roots]
+        self.max_sets = max_sets
+        self.idle_seconds = idle_seconds
+        self._sets: "OrderedDict[str, _TemplateSet]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def resolve(self, templates_path: str) -> str:
+        """
+        Resolve a templates path (following symlinks) and check it is under an allowed root.
+
+        Raises:
+            TemplatePathNotAllowed: If the path is outside every templates root.
+        """
+        resolved = os.path.realpath(templates_path)
+        if self.roots is not None and not any(
+                os.path.commonpath([resolved, root]) == root for root in self.roots):
+            raise TemplatePathNotAllowed(f"Templates path {templates_path} is outside the allowed templates roots")
+        return resolved
+
+    def get(self, templates_path: str) -> Dict[str, Template]:
+        """
+        Return the parsed templates of a file or directory, loading it on first use.
+
+        Raises:
+            TemplatePathNotAllowed: If the path is outside every templates root.
+        """
+        key = self.resolve(templates_path)
+        with self._lock:
+            template_set = self._sets.get(key)
+            if template_set is not None:
+                template_set.last_used = time.monotonic()
+                self._sets.move_to_end(key)
+                return template_set.templates
+
+        if not os.path.exists(key):
+            # Not kept, so requests for missing paths cannot grow the registry
+            logger.warning("%s is neither a file nor a directory", templates_path)
+            return {}
+
+        with self._lock:
+            template_set = self._sets.get(key)
+            if template_set is None:
+                template_set = _TemplateSet(key)
+                template_set.scan()
+                logger.info("Loaded %d templates from %s", len(template_set.templates), templates_path)
+                self._sets[key] = template_set
+                while len(self._sets) > self.max_sets:
+                    evicted, _ = self._sets.popitem(last=False)
+                    logger.info("Dropped templates of %s from the registry", evicted)
+            template_set.last_used = time.monotonic()
+            self._sets.move_to_end(key)
+        return template_set.templates
+
+    def reload_changed(self) -> int:
+        """
+        Rescan every templates path used within idle_seconds and drop the others.
+
+        Returns:
+            int: Number of templates paths whose templates changed.
+        """
+        changed = 0
+        with self._lock:
+            now = time.monotonic()
+            for key, template_set in list(self._sets.items()):
+                if now - template_set.last_used > self.idle_seconds:
+                    del self._sets[key]
+                    logger.info("Dropped idle templates of %s from the registry", key)
+                    continue
+                if template_set.scan():
+                    changed += 1
+                    logger.info("Reloaded templates from %s: %d templates",
+                                template_set.templates_path, len(template_set.templates))
+        return changed
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._poll())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await run_in_thread(self.reload_changed)
+            except Exception as e:
+                logger.exception("Template reload failed: %s", e)
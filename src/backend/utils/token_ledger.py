@@ -0,0 +1,261 @@
+import time
+from contextlib import closing, contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.db import connect_sqlite
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    request_id TEXT NOT NULL,
+    session_id TEXT,
+    user_id TEXT,
+    kind TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    latency_ms REAL NOT NULL,
+    cost_usd REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_calls_user ON llm_calls (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_llm_calls_session ON llm_calls (session_id);
+CREATE INDEX IF NOT EXISTS idx_llm_calls_request ON llm_calls (request_id);
+"""
+
+# Columns usage can be grouped by
+GROUP_COLUMNS = ("stage", "model", "kind", "user_id", "session_id", "request_id")
+
+# Stage of the zero-cost entry of a request served by another request's identical run;
+# it made no LLM call, so it is not counted in `calls` or in latency statistics
+COALESCED_STAGE = "coalesced"
+
+_TOTALS_SQL = (
+    f"COALESCE(SUM(stage != '{COALESCED_STAGE}'), 0) AS calls, COALESCE(SUM(prompt_tokens), 0) AS prompt_tokens, "
+    "COALESCE(SUM(completion_tokens), 0) AS completion_tokens, COALESCE(SUM(cost_usd), 0) AS cost_usd"
+)
+
+_current_recorder: ContextVar[Optional["UsageRecorder"]] = ContextVar("usage_recorder", default=None)
+
+
+class BudgetExceeded(Exception):
+    """Raised when a user has spent their budget for the current window."""
+
+    def __init__(self, user_id: str, spent_usd: float, budget_usd: float, retry_after: Optional[int] = None):
+        super().__init__(f"User {user_id} has spent ${spent_usd:.2f} of their ${budget_usd:.2f} LLM budget")
+        self.user_id = user_id
+        self.spent_usd = spent_usd
+        self.budget_usd = budget_usd
+        # Seconds until enough spending leaves the budget window, if known
+        self.retry_after = retry_after
+
+
+def call_cost(prices: Dict[str, Dict[str, float]], model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """
+    Cost in USD of one call from per-1K-token prices ({model: {"prompt": .., "completion": ..}}).
+    Models without a price cost nothing, so their usage is still counted in tokens.
+    """
+    price = prices.get(model) or {}
+    return (prompt_tokens * price.get("prompt", 0.0) + completion_tokens * price.get("completion", 0.0)) / 1000
+
+
+def _totals(calls: int = 0, prompt_tokens: int = 0, completion_tokens: int = 0, cost_usd: float = 0.0) -> Dict[str, Any]:
+    return {"calls": calls, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "cost_usd": round(cost_usd, 6)}
+
+
+class UsageRecorder:
+    """
+    Collects the LLM calls of one pipeline run. Calls are recorded by `ask_llm` into
+    the recorder bound with `recording`, and written to the ledger when the run ends.
+    """
+
+    def __init__(self, request_id: str, kind: str, model: str, prices: Dict[str, Dict[str, float]],
+                 session_id: Optional[str] = None, user_id: Optional[str] = None):
+        self.request_id = request_id
+        self.kind = kind
+        self.model = model
+        self.prices = prices
+        self.session_id = session_id
+        self.user_id = user_id
+        self.calls: List[Dict[str, Any]] = []
+
+    def add(self, stage: str, model: str, prompt_tokens: int, completion_tokens: int, latency_ms: float) -> None:
+        self.calls.append({
+            "created_at": time.time(),
+            "request_id": self.request_id,
+            "session_id": self.session_id,
+            "user_id": self.user_id,
+            "kind": self.kind,
+            "stage": stage,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "latency_ms": round(latency_ms, 1),
+            "cost_usd": call_cost(self.prices, model, prompt_tokens, completion_tokens)
+        })
+
+    def add_coalesced(self) -> None:
+        """Record that the request was served by another request's run, at no cost."""
+        self.add(COALESCED_STAGE, self.model, 0, 0, 0.0)
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals of the run, overall and per stage, plus the summed LLM latency."""
+        calls = [call for call in self.calls if call["stage"] != COALESCED_STAGE]
+        by_stage: Dict[str, Dict[str, Any]] = {}
+        for call in calls:
+            stage = by_stage.setdefault(call["stage"], _totals())
+            stage["calls"] += 1
+            stage["prompt_tokens"] += call["prompt_tokens"]
+            stage["completion_tokens"] += call["completion_tokens"]
+            stage["cost_usd"] = round(stage["cost_usd"] + call["cost_usd"], 6)
+        return dict(
+            _totals(
+                len(calls),
+                sum(call["prompt_tokens"] for call in calls),
+                sum(call["completion_tokens"] for call in calls),
+                sum(call["cost_usd"] for call in calls)
+            ),
+            request_id=self.request_id,
+            model=self.model,
+            latency_ms=round(sum(call["latency_ms"] for call in calls), 1),
+            by_stage=by_stage,
+            coalesced=len(calls) < len(self.calls)
+        )
+
+
+@contextmanager
+def recording(recorder: UsageRecorder):
+    """Record the LLM calls made in the body, including in tasks it starts, into `recorder`."""
+    token = _current_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current_recorder.reset(token)
+
+
+def current_recorder() -> Optional[UsageRecorder]:
+    return _current_recorder.get()
+
+
+class TokenLedger:
+    """
+    Append-only record of every LLM call: tokens, model, latency, stage and cost,
+    attributed to the request, session and user that caused it.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        with closing(connect_sqlite(self.db_path)) as conn:
+            conn.executescript(SCHEMA)
+
+    def record(self, calls: List[Dict[str, Any]]) -> None:
+        if not calls:
+            return
+        with closing(connect_sqlite(self.db_path)) as conn:
+            conn.executemany(
+                "INSERT INTO llm_calls (created_at, request_id, session_id, user_id, kind, stage, model, "
+                "prompt_tokens, completion_tokens, latency_ms, cost_usd) "
+                "VALUES (:created_at, :request_id, :session_id, :user_id, :kind, :stage, :model, "
+                ":prompt_tokens, :completion_tokens, :latency_ms, :cost_usd)",
+                calls
+            )
+
+    @staticmethod
+    def _where(filters: Dict[str, Any], since: Optional[float]) -> Tuple[str, List[Any]]:
+        clauses = [f"{column} = ?" for column in filters]
+        params = list(filters.values())
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def totals(self, session_id: Optional[str] = None, user_id: Optional[str] = None,
+               request_id: Optional[str] = None, since: Optional[float] = None) -> Dict[str, Any]:
+        """Calls, tokens and cost of the matching ledger entries."""
+        filters = {column: value for column, value in (
+            ("session_id", session_id), ("user_id", user_id), ("request_id", request_id)
+        ) if value is not None}
+        where, params = self._where(filters, since)
+        with closing(connect_sqlite(self.db_path)) as conn:
+            row = conn.execute(f"SELECT {_TOTALS_SQL} FROM llm_calls{where}", params).fetchone()
+        return _totals(row["calls"], row["prompt_tokens"], row["completion_tokens"], row["cost_usd"])
+
+    def budget_frees_at(self, user_id: str, since: float, budget_usd: float) -> Optional[float]:
+        """
+        Time of the ledger entry after which a user's spending since `since` drops under
+        `budget_usd` once that entry leaves the window, or None if it never does.
+        """
+        with closing(connect_sqlite(self.db_path)) as conn:
+            rows = conn.execute(
+                "SELECT created_at, cost_usd FROM llm_calls WHERE user_id = ? AND created_at >= ? "
+                "AND cost_usd > 0 ORDER BY created_at",
+                (user_id, since)
+            ).fetchall()
+        remaining = sum(row["cost_usd"] for row in rows)
+        for row in rows:
+            remaining -= row["cost_usd"]
+            if remaining < budget_usd:
+                return row["created_at"]
+        return None
+
+    def stage_stats(self, since: Optional[float] = None, sample: int = 2000) -> Dict[str, Dict[str, float]]:
+        """
+        Latency quantiles (p10, p50, p90 in ms) and mean completion tokens per stage over
+        the most recent `sample` calls, plus the same over all stages under "all".
+        """
+        where, params = self._where({}, since)
+        where = (where + " AND" if where else " WHERE") + " stage != ?"
+        with closing(connect_sqlite(self.db_path)) as conn:
+            rows = conn.execute(
+                f"SELECT stage, latency_ms, completion_tokens FROM llm_calls{where} ORDER BY id DESC LIMIT ?",
+                params + [COALESCED_STAGE, sample]
+            ).fetchall()
+        calls: Dict[str, List[Tuple[float, int]]] = {}
+        for row in rows:
+            calls.setdefault(row["stage"], []).append((row["latency_ms"], row["completion_tokens"]))
+            calls.setdefault("all", []).append((row["latency_ms"], row["completion_tokens"]))
+        stats = {}
+        for stage, values in calls.items():
+            latencies = sorted(latency for latency, _ in values)
+            stats[stage] = {
+                "calls": len(values),
+                "p10_ms": latencies[int(0.1 * (len(latencies) - 1))],
+                "p50_ms": latencies[int(0.5 * (len(latencies) - 1))],
+                "p90_ms": latencies[int(0.9 * (len(latencies) - 1))],
+                "mean_completion_tokens": sum(tokens for _, tokens in values) / len(values)
+            }
+        return stats
+
+    def usage_by(self, group_by: List[str], filters: Optional[Dict[str, Any]] = None,
+                 since: Optional[float] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Totals grouped by ledger columns, most expensive first.
+
+        Raises:
+            ValueError: If a group-by or filter column is unknown.
+        """
+        filters = filters or {}
+        unknown = [column for column in list(group_by) + list(filters) if column not in GROUP_COLUMNS]
+        if unknown or not group_by:
+            raise ValueError(f"Usage can be grouped and filtered by {', '.join(GROUP_COLUMNS)}")
+        where, params = self._where(filters, since)
+        columns = ", ".join(group_by)
+        with closing(connect_sqlite(self.db_path)) as conn:
+            rows = conn.execute(
+                f"SELECT {columns}, {_TOTALS_SQL}, "
+                f"AVG(CASE WHEN stage != '{COALESCED_STAGE}' THEN latency_ms END) AS mean_latency_ms "
+                f"FROM llm_calls{where} "
+                f"GROUP BY {columns} ORDER BY cost_usd DESC, prompt_tokens DESC LIMIT ?",
+                params + [limit]
+            ).fetchall()
+        return [
+            dict(_totals(row["calls"], row["prompt_tokens"], row["completion_tokens"], row["cost_usd"]),
+                 key={column: row[column] for column in group_by},
+                 # Groups of coalesced entries only made no LLM calls to average
+                 mean_latency_ms=round(row["mean_latency_ms"] or 0.0, 1))
+            for row in rows
+        ]
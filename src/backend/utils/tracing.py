@@ -0,0 +1,255 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Trace file formats written by TraceExporter
+TRACE_FORMATS = ("chrome", "otlp")
+# Trace files kept in the trace directory; older ones are deleted
+DEFAULT_MAX_TRACE_FILES = 1000
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class _Trace:
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.spans: List["Span"] = []
+
+
+class Span:
+    """One timed operation of a trace. Attributes are exported with the span."""
+
+    def __init__(self, name: str, trace: _Trace, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.error: Optional[str] = None
+        self.start_ns = time.time_ns()
+        self.end_ns = self.start_ns
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+
+class _NoopSpan:
+    trace_id = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, **attributes: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def _assign_lanes(spans: List[Span]) -> Dict[str, int]:
+    """
+    Thread IDs for the Chrome trace format, which requires spans on one thread to nest.
+    A span goes on its parent's lane when it fits, so sequential pipelines stay on one lane
+    and only concurrent work opens new ones.
+    """
+    lanes: List[List[int]] = []  # per lane, the end times of the spans still open
+    lane_of: Dict[str, int] = {}
+    for span in sorted(spans, key=lambda s: (s.start_ns, -s.end_ns)):
+        preferred = lane_of.get(span.parent_id, 0)
+        for index in [preferred] + [i for i in range(len(lanes)) if i != preferred]:
+            if index >= len(lanes):
+                continue
+            open_ends = lanes[index]
+            while open_ends and open_ends[-1] <= span.start_ns:
+                open_ends.pop()
+            if not open_ends or span.end_ns <= open_ends[-1]:
+                open_ends.append(span.end_ns)
+                lane_of[span.span_id] = index
+                break
+        else:
+            lanes.append([span.end_ns])
+            lane_of[span.span_id] = len(lanes) - 1
+    return lane_of
+
+
+def to_chrome_trace(trace: _Trace) -> Dict[str, Any]:
+    """Chrome trace event format, viewable as a timeline in Perfetto, chrome://tracing or speedscope."""
+    lanes = _assign_lanes(trace.spans)
+    events = []
+    for span in trace.spans:
+        args = dict(span.attributes)
+        if span.error:
+            args["error"] = span.error
+        events.append({
+            "name": span.name,
+            "cat": "pipeline",
+            "ph": "X",
+            "ts": span.start_ns / 1000,
+            "dur": (span.end_ns - span.start_ns) / 1000,
+            "pid": 1,
+            "tid": lanes[span.span_id] + 1,
+            "args": args
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"trace_id": trace.trace_id}}
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(trace: _Trace, service_name: str) -> Dict[str, Any]:
+    """OTLP/JSON export request, as read by the OpenTelemetry Collector's file receiver."""
+    spans = []
+    for span in trace.spans:
+        otlp_span = {
+            "traceId": trace.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1 if span.parent_id else 2,  # INTERNAL, or SERVER for the root
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1}
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        spans.append(otlp_span)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+        "scopeSpans": [{"scope": {"name": "log_analysis"}, "spans": spans}]
+    }]}
+
+
+class TraceExporter:
+    """
+    Writes finished traces from a background thread, so exporting never blocks the event loop.
+
+    "chrome" writes one `<trace_id>.json` file per trace; "otlp" appends one OTLP/JSON
+    line per trace to `traces.otlp.jsonl`.
+    """
+
+    def __init__(self, trace_dir: str, trace_format: str = "chrome", service_name: str = "log-analysis-backend",
+                 max_files: int = DEFAULT_MAX_TRACE_FILES):
+        if trace_format not in TRACE_FORMATS:
+            raise ValueError(f"Unknown trace format {trace_format!r}, expected one of {', '.join(TRACE_FORMATS)}")
+        self.trace_dir = trace_dir
+        self.trace_format = trace_format
+        self.service_name = service_name
+        self.max_files = max_files
+        self._queue: "queue.Queue[Optional[_Trace]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._exported = 0
+        os.makedirs(trace_dir, exist_ok=True)
+
+    def trace_path(self, trace_id: str) -> str:
+        return os.path.join(self.trace_dir, f"{trace_id}.json")
+
+    def export(self, trace: _Trace) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+            self._thread.start()
+        self._queue.put(trace)
+
+    def close(self) -> None:
+        """Write the queued traces and stop the writer thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            trace = self._queue.get()
+            if trace is None:
+                return
+            try:
+                self._write(trace)
+            except Exception as e:
+                logger.warning("Failed to export trace %s: %s", trace.trace_id, e)
+
+    def _write(self, trace: _Trace) -> None:
+        if self.trace_format == "otlp":
+            with open(os.path.join(self.trace_dir, "traces.otlp.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps(to_otlp(trace, self.service_name)) + "\n")
+            return
+
+        with open(self.trace_path(trace.trace_id), "w", encoding="utf-8") as f:
+            json.dump(to_chrome_trace(trace), f)
+        self._exported += 1
+        # Listing the directory on every trace would cost more than writing it
+        if self._exported % 100 == 0:
+            self._prune()
+
+    def _prune(self) -> None:
+        entries = [entry for entry in os.scandir(self.trace_dir) if entry.name.endswith(".json")]
+        if len(entries) <= self.max_files:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_files]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+class Tracer:
+    """
+    Creates nested spans. The current span is tracked in a context variable, so spans
+    opened in tasks started from a span (gather, ensure_future) become its children.
+    A trace is exported when its root span ends. Functions run in worker threads are
+    not traced; wrap the awaiting call instead.
+    """
+
+    def __init__(self, exporter: Optional[TraceExporter] = None):
+        self.exporter = exporter
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def current_span(self):
+        return _current_span.get() or _NOOP_SPAN
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any):
+        if self.exporter is None:
+            yield _NOOP_SPAN
+            return
+
+        parent = _current_span.get()
+        trace = parent.trace if parent is not None else _Trace()
+        span = Span(name, trace, parent.span_id if parent is not None else None, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            trace.spans.append(span)
+            if parent is None:
+                self.exporter.export(trace)
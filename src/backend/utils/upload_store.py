@@ -0,0 +1,268 @@
+import hashlib
+import os
+import re
+import shutil
+import time
+import uuid
+from contextlib import closing
+from typing import Any, Dict, List, Optional
+
+from utils.db import connect_sqlite
+
+
+UNSAFE_FILENAME_CHARS = re.compile(r'[^\w.\-]+')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_blobs_last_used ON blobs (last_used_at);
+
+CREATE TABLE IF NOT EXISTS refs (
+    upload_id TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL REFERENCES blobs (sha256),
+    session_id TEXT,
+    filename TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_refs_sha256 ON refs (sha256);
+CREATE INDEX IF NOT EXISTS idx_refs_session ON refs (session_id);
+"""
+
+# Run after SCHEMA, once refs is known to have last_used_at
+REFS_LAST_USED_INDEX = "CREATE INDEX IF NOT EXISTS idx_refs_last_used ON refs (last_used_at)"
+
+
+class UploadNotFound(Exception):
+    """Raised when an upload ID does not refer to a stored upload."""
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds the configured maximum size."""
+
+
+def safe_filename(filename: str) -> str:
+    name = UNSAFE_FILENAME_CHARS.sub("_", os.path.basename(filename or "")).strip("._")
+    return name or "upload.log"
+
+
+class PendingUpload:
+    """An upload being written to a temporary file chunk by chunk; stored only on commit()."""
+
+    def __init__(self, store: "UploadStore", filename: str, session_id: Optional[str]):
+        self.store = store
+        self.filename = filename
+        self.session_id = session_id
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._tmp_path = os.path.join(store.tmp_dir, f"{uuid.uuid4().hex}.partial")
+        self._file = open(self._tmp_path, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.store.max_upload_bytes is not None and self.size > self.store.max_upload_bytes:
+            raise UploadTooLarge(f"Upload exceeds the maximum size of {self.store.max_upload_bytes} bytes")
+        self._digest.update(chunk)
+        self._file.write(chunk)
+
+    def commit(self) -> Dict[str, Any]:
+        self._file.close()
+        return self.store._add_blob(self._tmp_path, self._digest.hexdigest(), self.size,
+                                    self.filename, self.session_id)
+
+    def abort(self) -> None:
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+
+class UploadStore:
+    """
+    Content-addressed store of uploaded log files.
+
+    Each distinct file content is stored once, as a blob named by its SHA-256.
+    Every upload creates a reference (the upload ID) to a blob, owned by a session.
+    A blob's path never changes, so preprocessing sidecars and template results
+    computed for it are reused when the same content is uploaded again.
+    Blobs without references are evicted least recently used first once the store
+    exceeds `max_total_bytes`; references not used for `ref_ttl_seconds` are dropped,
+    so sessions that never release their uploads do not pin blobs forever.
+    """
+
+    def __init__(self, upload_dir: str, max_upload_bytes: Optional[int] = None,
+                 max_total_bytes: Optional[int] = None, ref_ttl_seconds: Optional[float] = None):
+        self.upload_dir = upload_dir
+        self.blob_dir = os.path.join(upload_dir, "blobs")
+        self.tmp_dir = os.path.join(upload_dir, "tmp")
+        self.max_upload_bytes = max_upload_bytes
+        self.max_total_bytes = max_total_bytes
+        self.ref_ttl_seconds = ref_ttl_seconds
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        # Partial files left by interrupted uploads of a previous run
+        for entry in os.scandir(self.tmp_dir):
+            if entry.name.endswith(".partial") and entry.stat().st_mtime < time.time() - 3600:
+                os.remove(entry.path)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+            # Stores created before references tracked their last use
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(refs)")}
+            if "last_used_at" not in columns:
+                conn.execute("ALTER TABLE refs ADD COLUMN last_used_at REAL NOT NULL DEFAULT 0")
+                conn.execute("UPDATE refs SET last_used_at = created_at")
+                conn.execute("DROP INDEX IF EXISTS idx_refs_created")
+            conn.execute(REFS_LAST_USED_INDEX)
+
+    def _connect(self):
+        return connect_sqlite(os.path.join(self.upload_dir, "uploads.db"))
+
+    def _blob_path(self, sha256: str, filename: str) -> str:
+        # The original name is kept so log headers and evidence lines stay readable
+        return os.path.join(self.blob_dir, sha256, filename)
+
+    def _add_ref(self, conn, sha256: str, filename: str, session_id: Optional[str]) -> str:
+        upload_id = uuid.uuid4().hex
+        now = time.time()
+        conn.execute(
+            "INSERT INTO refs (upload_id, sha256, session_id, filename, created_at, last_used_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (upload_id, sha256, session_id, filename, now, now)
+        )
+        conn.execute("UPDATE blobs SET last_used_at = ? WHERE sha256 = ?", (now, sha256))
+        return upload_id
+
+    def create(self, filename: str, session_id: Optional[str] = None) -> PendingUpload:
+        return PendingUpload(self, safe_filename(filename), session_id)
+
+    def _add_blob(self, tmp_path: str, sha256: str, size: int, filename: str,
+                  session_id: Optional[str]) -> Dict[str, Any]:
+        with closing(self._connect()) as conn:
+            # Serializes concurrent uploads of the same content across processes
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = conn.execute("SELECT size FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+                if existing is None:
+                    blob_path = self._blob_path(sha256, filename)
+                    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                    os.replace(tmp_path, blob_path)
+                    now = time.time()
+                    conn.execute(
+                        "INSERT INTO blobs (sha256, filename, size, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)",
+                        (sha256, filename, size, now, now)
+                    )
+                else:
+                    os.remove(tmp_path)
+                upload_id = self._add_ref(conn, sha256, filename, session_id)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        self.enforce_quota()
+        return {"upload_id": upload_id, "filename": filename, "size": size, "sha256": sha256,
+                "deduplicated": existing is not None}
+
+    def add_existing(self, sha256: str, filename: str, session_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Reference an already stored blob by content hash, without transferring the file.
+
+        Returns:
+            Optional[Dict[str, Any]]: Upload info, or None if no blob has this hash.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            blob = conn.execute("SELECT size FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+            if blob is None:
+                conn.execute("ROLLBACK")
+                return None
+            filename = safe_filename(filename)
+            upload_id = self._add_ref(conn, sha256, filename, session_id)
+            conn.execute("COMMIT")
+        return {"upload_id": upload_id, "filename": filename, "size": blob["size"], "sha256": sha256,
+                "deduplicated": True}
+
+    def path(self, upload_id: str) -> str:
+        """
+        Return the file path of an upload and mark it and its blob as recently used.
+
+        Raises:
+            UploadNotFound: If the upload does not exist.
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT blobs.sha256, blobs.filename FROM refs JOIN blobs ON blobs.sha256 = refs.sha256 "
+                "WHERE refs.upload_id = ?", (upload_id,)
+            ).fetchone()
+            if row is None:
+                raise UploadNotFound(f"Upload {upload_id} not found")
+            now = time.time()
+            conn.execute("UPDATE refs SET last_used_at = ? WHERE upload_id = ?", (now, upload_id))
+            conn.execute("UPDATE blobs SET last_used_at = ? WHERE sha256 = ?", (now, row["sha256"]))
+        return self._blob_path(row["sha256"], row["filename"])
+
+    def paths(self, upload_ids: List[str]) -> List[str]:
+        return [self.path(upload_id) for upload_id in upload_ids]
+
+    def delete(self, upload_id: str) -> None:
+        """
+        Release one upload reference. The blob stays until evicted, so uploading
+        the same content again is still free.
+
+        Raises:
+            UploadNotFound: If the upload does not exist.
+        """
+        with closing(self._connect()) as conn:
+            if conn.execute("DELETE FROM refs WHERE upload_id = ?", (upload_id,)).rowcount == 0:
+                raise UploadNotFound(f"Upload {upload_id} not found")
+
+    def release_session(self, session_id: str) -> int:
+        """
+        Release every upload reference of a session.
+
+        Returns:
+            int: Number of references released.
+        """
+        with closing(self._connect()) as conn:
+            return conn.execute("DELETE FROM refs WHERE session_id = ?", (session_id,)).rowcount
+
+    def enforce_quota(self) -> int:
+        """
+        Drop references unused for ref_ttl_seconds, then delete unreferenced blobs, least recently used
+        first, until the stored size is under max_total_bytes.
+
+        Returns:
+            int: Number of blobs removed.
+        """
+        with closing(self._connect()) as conn:
+            if self.ref_ttl_seconds is not None:
+                conn.execute("DELETE FROM refs WHERE last_used_at < ?", (time.time() - self.ref_ttl_seconds,))
+            if self.max_total_bytes is None:
+                return 0
+            # Blocks new references while choosing blobs, so a blob cannot be reused and evicted at once
+            conn.execute("BEGIN IMMEDIATE")
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) AS total FROM blobs").fetchone()["total"]
+            if total <= self.max_total_bytes:
+                conn.execute("COMMIT")
+                return 0
+            candidates = conn.execute(
+                "SELECT sha256, size FROM blobs WHERE sha256 NOT IN (SELECT sha256 FROM refs) "
+                "ORDER BY last_used_at"
+            ).fetchall()
+            removed = []
+            for blob in candidates:
+                if total <= self.max_total_bytes:
+                    break
+                removed.append(blob["sha256"])
+                total -= blob["size"]
+            # Forget the blobs first, so nothing resolves to a file being deleted
+            conn.executemany("DELETE FROM blobs WHERE sha256 = ?", [(sha256,) for sha256 in removed])
+            conn.execute("COMMIT")
+        for sha256 in removed:
+            shutil.rmtree(os.path.join(self.blob_dir, sha256), ignore_errors=True)
+        return len(removed)
@@ -0,0 +1,360 @@
+"""
+Microbenchmarks for the log processing hot paths.
+
+Each case is timed over several runs (min and median wall time), then run once
+more under tracemalloc to record its peak Python heap allocation. Log-size
+dependent cases run once per --sizes entry on synthetic logs from
+log_generator.py, cached under data/. Results are compared against the
+stored baselines, and the exit status is 1 when a case regressed by more than
+--tolerance.
+
+Cases that need packages which are not installed (the FastAPI app for
+process_log_inputs/load_templates_recursive, chainlit for
+extract_json_from_text) are reported as skipped.
+
+Usage:
+    python bench.py --sizes 1MB 10MB 100MB
+    python bench.py --sizes 1MB 1GB --save-baseline
+    python bench.py --cases partition_log_into_blocks --repeat 3
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from log_generator import generate_logs, parse_size
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.abspath(os.path.join(BENCH_DIR, "..", "backend"))
+FRONTEND_DIR = os.path.abspath(os.path.join(BENCH_DIR, "..", "frontend"))
+DATA_DIR = os.path.join(BENCH_DIR, "data")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baselines.json")
+
+TEMPLATE_COUNT = 200
+LLM_RESPONSE_INTERACTIONS = 2000
+
+sys.path.insert(0, BACKEND_DIR)
+
+
+class SkipBenchmark(Exception):
+    """Raised by a case setup when the case cannot run in this environment."""
+
+
+class BenchContext:
+    """Inputs shared by the cases of one log size."""
+
+    def __init__(self, size_label: str, log_dir: str, work_dir: str):
+        self.size_label = size_label
+        self.log_dir = log_dir
+        self.log_files = sorted(
+            os.path.join(log_dir, name) for name in os.listdir(log_dir) if name.endswith(".log")
+        )
+        self.work_dir = work_dir
+        self.templates_dir = os.path.join(DATA_DIR, "templates")
+        self.results_file = os.path.join(DATA_DIR, "results.txt")
+        self.llm_response_path = os.path.join(DATA_DIR, "llm_response.txt")
+        with open(os.path.join(BACKEND_DIR, "config.json"), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+
+
+# --- Input preparation ---
+
+def prepare_logs(size_label: str, seed: int) -> str:
+    """Generate the synthetic logs for a size once; later runs reuse them."""
+    log_dir = os.path.join(DATA_DIR, f"logs_{size_label}_seed{seed}")
+    marker = os.path.join(log_dir, ".complete")
+    if not os.path.exists(marker):
+        print(f"Generating {size_label} of synthetic logs in {log_dir} ...")
+        generate_logs(log_dir, parse_size(size_label), seed)
+        open(marker, "w").close()
+    return log_dir
+
+
+def prepare_templates(templates_dir: str = os.path.join(DATA_DIR, "templates"),
+                      count: int = TEMPLATE_COUNT) -> str:
+    """Write `count` variants of the example template."""
+    if os.path.isdir(templates_dir) and len(os.listdir(templates_dir)) == count:
+        return templates_dir
+    with open(os.path.join(BACKEND_DIR, "example_template.txt"), "r", encoding="utf-8") as f:
+        example = f.read()
+    shutil.rmtree(templates_dir, ignore_errors=True)
+    os.makedirs(templates_dir)
+    for i in range(count):
+        with open(os.path.join(templates_dir, f"template_{i:04d}.txt"), "w", encoding="utf-8") as f:
+            f.write(example.replace("Connection Pool Exhaustion", f"Connection Pool Exhaustion {i}"))
+    return templates_dir
+
+
+def prepare_results_file() -> None:
+    """Write a diagnosis results file with TEMPLATE_COUNT filled templates."""
+    from utils.result_converter import format_results
+
+    results = {}
+    for i in range(TEMPLATE_COUNT):
+        results[f"template_{i:04d}"] = [
+            "### Completed Template\n"
+            f"- ___component_A (Hive)___ created ___connection_count ({100 + i})___ connections to "
+            f"___resource_name (HDFS)___ but only closed ___closed_count ({i})___ connections\n"
+            f"- [component_B]: Spark\n- [error_type]: SocketTimeoutException\n\n"
+            "### Reasoning\n" + "The namenode log shows repeated allocation failures. " * 20
+        ]
+    with open(os.path.join(DATA_DIR, "results.txt"), "w", encoding="utf-8") as f:
+        f.write(format_results(results))
+
+
+def prepare_llm_response() -> None:
+    """Write an interaction analysis answer: reasoning text followed by a large JSON block."""
+    interactions = [
+        {"component_a": "Hive", "component_b": "HDFS", "type": "data_dependency",
+         "evidence": f"hive_log.log:{i} INSERT OVERWRITE TABLE web_logs", "confidence": 0.9}
+        for i in range(LLM_RESPONSE_INTERACTIONS)
+    ]
+    text = ("Step 1: read the Hive and HDFS logs. " * 200
+            + "\n```json\n" + json.dumps({"interactions": interactions}, indent=2) + "\n```\n")
+    with open(os.path.join(DATA_DIR, "llm_response.txt"), "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+# --- Cases ---
+# A case setup returns the function to measure, plus an optional reset run
+# (untimed) before every measured call.
+
+def case_partition_log_into_blocks(ctx: BenchContext):
+    from utils.log_handler import partition_log_into_blocks
+    return lambda: partition_log_into_blocks(ctx.log_files), None
+
+
+def case_preprocess_cold(ctx: BenchContext):
+    from utils.preprocess import build_blocks, preprocess_file
+    cache_dir = os.path.join(ctx.work_dir, "preprocess_cold")
+    block_size = ctx.config["log_block_size"]
+
+    def run():
+        shards = [preprocess_file(path, cache_dir) for path in ctx.log_files]
+        return build_blocks(shards, block_size)
+
+    return run, lambda: shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def case_preprocess_warm(ctx: BenchContext):
+    from utils.preprocess import build_blocks, preprocess_file
+    cache_dir = os.path.join(ctx.work_dir, "preprocess_warm")
+    block_size = ctx.config["log_block_size"]
+    for path in ctx.log_files:
+        preprocess_file(path, cache_dir)
+
+    def run():
+        shards = [preprocess_file(path, cache_dir) for path in ctx.log_files]
+        return build_blocks(shards, block_size)
+
+    return run, None
+
+
+def _import_app():
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            import app
+    except ImportError as e:
+        raise SkipBenchmark(f"backend app cannot be imported ({e})")
+    return app
+
+
+def case_process_log_inputs(ctx: BenchContext):
+    app = _import_app()
+    return lambda: app.process_log_inputs([ctx.log_dir]), None
+
+
+def case_load_templates_recursive(ctx: BenchContext):
+    app = _import_app()
+    app.load_templates_recursive(ctx.templates_dir)
+    return lambda: app.load_templates_recursive(ctx.templates_dir), None
+
+
+def case_template_registry_cold(ctx: BenchContext):
+    from utils.template_registry import TemplateRegistry
+    return lambda: TemplateRegistry().get(ctx.templates_dir), None
+
+
+def case_convert_to_json(ctx: BenchContext):
+    from utils.result_converter import convert_to_json
+    output_dir = os.path.join(ctx.work_dir, "converted")
+    return lambda: convert_to_json(ctx.results_file, output_dir), None
+
+
+def case_extract_json_from_text(ctx: BenchContext):
+    sys.path.insert(0, FRONTEND_DIR)
+    try:
+        from chainlit_app import extract_json_from_text
+    except ImportError as e:
+        raise SkipBenchmark(f"frontend app cannot be imported ({e})")
+    with open(ctx.llm_response_path, "r", encoding="utf-8") as f:
+        text = f.read()
+    return lambda: extract_json_from_text(text), None
+
+
+# Cases run once per log size
+SIZED_CASES = {
+    "partition_log_into_blocks": case_partition_log_into_blocks,
+    "preprocess_cold": case_preprocess_cold,
+    "preprocess_warm": case_preprocess_warm,
+    "process_log_inputs": case_process_log_inputs,
+}
+# Cases whose inputs do not depend on the log size
+FIXED_CASES = {
+    "load_templates_recursive": case_load_templates_recursive,
+    "template_registry_cold": case_template_registry_cold,
+    "convert_to_json": case_convert_to_json,
+    "extract_json_from_text": case_extract_json_from_text,
+}
+
+
+def measure(func: Callable[[], Any], reset: Optional[Callable[[], Any]], repeat: int) -> Dict[str, float]:
+    """
+    Time func over `repeat` runs, then record its peak allocation in a separate run,
+    since tracemalloc slows down the code it traces.
+    """
+    timings = []
+    # The code under test prints progress; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            if reset:
+                reset()
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+
+        if reset:
+            reset()
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "seconds_min": min(timings),
+        "seconds_median": statistics.median(timings),
+        "peak_bytes": peak,
+    }
+
+
+def run_benchmarks(sizes: List[str], selected: Optional[List[str]], repeat: int, seed: int) -> Dict[str, Any]:
+    os.makedirs(DATA_DIR, exist_ok=True)
+    prepare_templates()
+    prepare_results_file()
+    prepare_llm_response()
+
+    results: Dict[str, Any] = {}
+    skipped: Dict[str, str] = {}
+    work_dir = tempfile.mkdtemp(prefix="bench_", dir=DATA_DIR)
+    try:
+        plan = [(size, SIZED_CASES) for size in sizes] + [(sizes[0], FIXED_CASES)]
+        for size_label, cases in plan:
+            ctx = BenchContext(size_label, prepare_logs(size_label, seed), work_dir)
+            for name, setup in cases.items():
+                if selected and name not in selected:
+                    continue
+                key = f"{name}@{size_label}" if cases is SIZED_CASES else name
+                try:
+                    func, reset = setup(ctx)
+                except SkipBenchmark as e:
+                    skipped[name] = str(e)
+                    continue
+                results[key] = measure(func, reset, repeat)
+                print(f"{key:<40} median {results[key]['seconds_median'] * 1000:10.1f} ms   "
+                      f"peak {results[key]['peak_bytes'] / 1024 ** 2:9.1f} MiB")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    for name, reason in skipped.items():
+        print(f"{name:<40} skipped: {reason}")
+    return {
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cases": results,
+    }
+
+
+def compare_to_baseline(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Returns:
+        List[str]: One message per case whose median time or peak memory grew
+            by more than `tolerance` (a fraction) over the baseline.
+    """
+    regressions = []
+    for key, current in report["cases"].items():
+        previous = baseline.get("cases", {}).get(key)
+        if previous is None:
+            continue
+        for metric in ("seconds_median", "peak_bytes"):
+            if previous[metric] > 0 and current[metric] > previous[metric] * (1 + tolerance):
+                change = current[metric] / previous[metric] - 1
+                regressions.append(f"{key}: {metric} {previous[metric]:.4g} -> {current[metric]:.4g} (+{change:.0%})")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the log processing hot paths")
+    parser.add_argument("--sizes", nargs="+", default=["1MB", "10MB"],
+                        help="Synthetic log sizes, e.g. 1MB 100MB 10GB")
+    parser.add_argument("--cases", nargs="+", choices=sorted({**SIZED_CASES, **FIXED_CASES}),
+                        help="Only run these cases")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the log generator")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown or memory growth over the baseline, as a fraction")
+    parser.add_argument("--output", help="Write the full report as JSON to this file")
+    args = parser.parse_args()
+
+    # partition_log_into_blocks reads ./config.json
+    os.chdir(BACKEND_DIR)
+    report = run_benchmarks(args.sizes, args.cases, args.repeat, args.seed)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+
+    if args.save_baseline:
+        baseline = {"cases": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        # Cases not run this time keep their previous baseline
+        baseline["cases"].update(report["cases"])
+        baseline.update({key: report[key] for key in ("python", "machine", "created_at")})
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=4)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("machine") != report["machine"]:
+        print(f"Warning: baseline was recorded on {baseline.get('machine')}, timings may not be comparable")
+    regressions = compare_to_baseline(report, baseline, args.tolerance)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    if not regressions:
+        print(f"No regressions beyond {args.tolerance:.0%} of the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Local OpenAI-compatible chat completions server for load tests.
+
+Answers POST /v1/chat/completions after a simulated delay:
+
+    latency + prompt_tokens / prefill_tokens_per_second + completion_tokens / tokens_per_second
+
+Answers are shaped like the pipeline expects (an acknowledgement for log
+blocks, a JSON block for interaction and dispatch steps, a completed template
+for diagnosis), so the backend parses them as it would real model output.
+Tokens are estimated as 4 characters each.
+
+Usage:
+    python fake_llm.py --port 9100 --latency 0.3 --tokens-per-second 80
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+import uuid
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+class FakeLLMSettings:
+    def __init__(self, latency: float = 0.2, tokens_per_second: float = 100.0,
+                 prefill_tokens_per_second: float = 5000.0, completion_tokens: int = 300,
+                 ack_tokens: int = 5):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.prefill_tokens_per_second = prefill_tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.ack_tokens = ack_tokens
+
+
+class FakeLLMStats:
+    """Counters read by the load test from another thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = 0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+
+    def record(self, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {"calls": self.calls, "prompt_tokens": self.prompt_tokens,
+                    "completion_tokens": self.completion_tokens}
+
+
+def _padding(tokens: int) -> str:
+    sentence = "The logs show repeated block allocation and task retries across components. "
+    return sentence * max(0, tokens * CHARS_PER_TOKEN // len(sentence))
+
+
+def fake_answer(messages: List[Dict[str, Any]], settings: FakeLLMSettings) -> str:
+    """An answer shaped like the one the pipeline expects for the last user message."""
+    prompt = messages[-1].get("content", "") if messages else ""
+    if "fill blanks in the template" in prompt:
+        return ("### Completed Template\n"
+                "Hive created [connection_count]: 120 connections to HDFS but only closed 20 connections, "
+                "causing Spark to fail with SocketTimeoutException error.\n\n"
+                "- [component_A]: Hive\n- [resource_name]: HDFS\n- [component_B]: Spark\n"
+                "- [error_type]: SocketTimeoutException\n\n"
+                "### Reasoning\n" + _padding(settings.completion_tokens))
+    if "interaction relationship graph" in prompt or "interaction patterns" in prompt:
+        body = {"resource_invocation": ["Hive", "HDFS", "socket"], "shared_object": ["Spark", "Hive", "table"]}
+        return _padding(settings.completion_tokens) + "\n```json\n" + json.dumps(body, indent=2) + "\n```"
+    if "summar" in prompt.lower():
+        return "Summary: " + _padding(settings.completion_tokens)
+    # Log blocks only need an acknowledgement
+    return "Received. " + _padding(settings.ack_tokens)
+
+
+def create_app(settings: FakeLLMSettings, stats: FakeLLMStats) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        prompt_tokens = sum(estimate_tokens(str(message.get("content", ""))) for message in messages)
+        content = fake_answer(messages, settings)
+        completion_tokens = estimate_tokens(content)
+
+        delay = settings.latency
+        if settings.prefill_tokens_per_second > 0:
+            delay += prompt_tokens / settings.prefill_tokens_per_second
+        if settings.tokens_per_second > 0:
+            delay += completion_tokens / settings.tokens_per_second
+        await asyncio.sleep(delay)
+        stats.record(prompt_tokens, completion_tokens)
+
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.2, help="Fixed seconds per call")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0, help="Completion token rate")
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=5000.0, help="Prompt token rate")
+    parser.add_argument("--completion-tokens", type=int, default=300, help="Tokens per analysis answer")
+    args = parser.parse_args()
+
+    settings = FakeLLMSettings(args.latency, args.tokens_per_second, args.prefill_tokens_per_second,
+                               args.completion_tokens)
+    uvicorn.run(create_app(settings, FakeLLMStats()), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,312 @@
+"""
+End-to-end load test of the backend against a local fake LLM.
+
+Starts the fake OpenAI-compatible server (fake_llm.py) and the FastAPI backend
+in-process, each on its own thread and event loop, then drives concurrent
+/analyze_interaction and /diagnose requests for every combination of log
+size, template count and concurrency. For each scenario it reports throughput,
+p50/p95/p99 latency, the backend's event-loop lag and LLM calls and tokens
+per request.
+
+Every request adds a unique one-line log file, so identical requests are not
+coalesced and diagnosis template results are not reused; the preprocessed
+sidecars of the shared synthetic logs are reused after the first request.
+The backend runs in a temporary working directory, so results, uploads and
+caches of a real deployment are never touched.
+
+Usage:
+    python load_test.py --endpoints diagnose --log-sizes 1MB 10MB --templates 5 20 \\
+        --concurrency 1 4 16 --requests 32 --llm-latency 0.5 --llm-tokens-per-second 60
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import httpx
+import uvicorn
+
+from bench import BACKEND_DIR, DATA_DIR, prepare_logs, prepare_templates
+from fake_llm import FakeLLMSettings, FakeLLMStats, create_app
+
+
+LAG_INTERVAL = 0.05
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class ServerThread:
+    """Runs a uvicorn server on its own thread and event loop."""
+
+    def __init__(self, app, port: int):
+        self.port = port
+        self.loop = asyncio.new_event_loop()
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.server.serve())
+
+    def start(self, timeout: float = 60.0) -> None:
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if not self.thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError(f"Server on port {self.port} did not start")
+            time.sleep(0.05)
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+
+
+class LoopLagMonitor:
+    """Samples how late a periodic timer fires on an event loop, i.e. how long the loop was blocked."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, interval: float = LAG_INTERVAL):
+        self.loop = loop
+        self.interval = interval
+        self.samples: List[float] = []
+        self._future = None
+
+    async def _sample(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(time.perf_counter() - start - self.interval)
+
+    def start(self) -> None:
+        self._future = asyncio.run_coroutine_threadsafe(self._sample(), self.loop)
+
+    def take(self) -> List[float]:
+        samples, self.samples = self.samples, []
+        return samples
+
+    def stop(self) -> None:
+        if self._future is not None:
+            self._future.cancel()
+
+
+def start_backend(work_dir: str, llm_port: int, config_overrides: Dict[str, Any]):
+    """Import the backend with its working directory, config and LLM endpoint redirected."""
+    with open(os.path.join(BACKEND_DIR, "config.json"), "r", encoding="utf-8") as f:
+        config = json.load(f)
+    config.update(config_overrides)
+    with open(os.path.join(work_dir, "config.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=4)
+
+    os.environ["OPENAI_API_BASE"] = f"http://127.0.0.1:{llm_port}/v1"
+    os.environ["OPENAI_API_KEY"] = "load-test"
+    os.chdir(work_dir)
+    sys.path.insert(0, BACKEND_DIR)
+    import app as backend
+    return backend.app
+
+
+async def run_scenario(client: httpx.AsyncClient, endpoint: str, log_dir: str, templates_dir: str,
+                       concurrency: int, total_requests: int, markers_dir: str) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    next_request = 0
+
+    def build_body() -> Dict[str, Any]:
+        marker = os.path.join(markers_dir, f"{uuid.uuid4().hex}.log")
+        with open(marker, "w", encoding="utf-8") as f:
+            f.write(f"2024-03-12 10:00:00,000 INFO load test request {marker}\n")
+        body: Dict[str, Any] = {"log_files": [log_dir, marker], "session_id": uuid.uuid4().hex}
+        if endpoint == "diagnose":
+            body.update(templates_path=templates_dir, force_refresh=True)
+        return body
+
+    async def worker() -> None:
+        nonlocal next_request
+        while next_request < total_requests:
+            next_request += 1
+            body = build_body()
+            start = time.perf_counter()
+            try:
+                response = await client.post(f"/{endpoint}", json=body)
+                statuses[str(response.status_code)] += 1
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - start)
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return {"latencies": latencies, "statuses": statuses, "duration": time.perf_counter() - start}
+
+
+def summarize(scenario: Dict[str, Any], result: Dict[str, Any], lag: List[float],
+              llm: Dict[str, int]) -> Dict[str, Any]:
+    completed = len(result["latencies"])
+    per_request = (lambda value: value / completed) if completed else (lambda value: None)
+    return dict(
+        scenario,
+        completed=completed,
+        statuses=dict(result["statuses"]),
+        duration_s=result["duration"],
+        throughput_rps=completed / result["duration"] if result["duration"] else 0.0,
+        latency_p50_s=percentile(result["latencies"], 50),
+        latency_p95_s=percentile(result["latencies"], 95),
+        latency_p99_s=percentile(result["latencies"], 99),
+        loop_lag_p50_ms=(percentile(lag, 50) or 0.0) * 1000,
+        loop_lag_p99_ms=(percentile(lag, 99) or 0.0) * 1000,
+        loop_lag_max_ms=max(lag, default=0.0) * 1000,
+        llm_calls_per_request=per_request(llm["calls"]),
+        prompt_tokens_per_request=per_request(llm["prompt_tokens"]),
+        completion_tokens_per_request=per_request(llm["completion_tokens"]),
+    )
+
+
+REPORT_HEADER = (f"{'endpoint':<20} {'logs':>6} {'tmpl':>5} {'conc':>5} {'ok':>5} {'req/s':>8} "
+                 f"{'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'lag p99':>9} {'lag max':>9} "
+                 f"{'prompt tk':>10} {'compl tk':>9}  statuses")
+
+
+def print_row(row: Dict[str, Any], report) -> None:
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else "-"
+    print(f"{row['endpoint']:<20} {row['log_size']:>6} {row['templates']:>5} {row['concurrency']:>5} "
+          f"{row['completed']:>5} {row['throughput_rps']:>8.2f} "
+          f"{fmt(row['latency_p50_s'], '8.2f')} {fmt(row['latency_p95_s'], '8.2f')} {fmt(row['latency_p99_s'], '8.2f')} "
+          f"{row['loop_lag_p99_ms']:>9.1f} {row['loop_lag_max_ms']:>9.1f} "
+          f"{fmt(row['prompt_tokens_per_request'], '10.0f')} {fmt(row['completion_tokens_per_request'], '9.0f')}  "
+          f"{row['statuses']}", file=report, flush=True)
+
+
+def parse_overrides(pairs: List[str]) -> Dict[str, Any]:
+    """KEY=VALUE pairs; values are parsed as JSON when possible."""
+    overrides = {}
+    for pair in pairs:
+        key, _, value = pair.partition("=")
+        try:
+            overrides[key] = json.loads(value)
+        except ValueError:
+            overrides[key] = value
+    return overrides
+
+
+async def drive(args, backend_port: int, log_dirs: Dict[str, str], template_dirs: Dict[int, str],
+                llm_stats: FakeLLMStats, lag_monitor: LoopLagMonitor, markers_dir: str, report) -> List[Dict[str, Any]]:
+    rows = []
+    timeout = httpx.Timeout(10.0, read=args.request_timeout)
+    limits = httpx.Limits(max_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{backend_port}", timeout=timeout, limits=limits) as client:
+        for log_size in args.log_sizes:
+            for templates in args.templates:
+                for endpoint in args.endpoints:
+                    # Template count does not affect interaction analysis
+                    if endpoint == "analyze_interaction" and templates != args.templates[0]:
+                        continue
+                    for concurrency in args.concurrency:
+                        llm_stats.reset()
+                        lag_monitor.take()
+                        result = await run_scenario(client, endpoint, log_dirs[log_size], template_dirs[templates],
+                                                    concurrency, args.requests, markers_dir)
+                        scenario = {"endpoint": endpoint, "log_size": log_size,
+                                    "templates": templates if endpoint == "diagnose" else 0,
+                                    "concurrency": concurrency, "requests": args.requests}
+                        row = summarize(scenario, result, lag_monitor.take(), llm_stats.snapshot())
+                        print_row(row, report)
+                        rows.append(row)
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load test the backend against a fake LLM server")
+    parser.add_argument("--endpoints", nargs="+", choices=["analyze_interaction", "diagnose"],
+                        default=["analyze_interaction", "diagnose"])
+    parser.add_argument("--log-sizes", nargs="+", default=["1MB"], help="Synthetic log sizes, e.g. 1MB 50MB")
+    parser.add_argument("--templates", nargs="+", type=int, default=[5], help="Template counts for /diagnose")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 8], help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=16, help="Requests per scenario")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the log generator")
+    parser.add_argument("--request-timeout", type=float, default=3600.0, help="Read timeout per request")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Fixed seconds per LLM call")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=100.0, help="Completion token rate")
+    parser.add_argument("--llm-prefill-tokens-per-second", type=float, default=5000.0, help="Prompt token rate")
+    parser.add_argument("--llm-completion-tokens", type=int, default=300, help="Tokens per analysis answer")
+    parser.add_argument("--config", nargs="*", default=[], metavar="KEY=VALUE",
+                        help="Backend config overrides, e.g. max_concurrent_analyses=8")
+    parser.add_argument("--output", help="Write the report rows as JSON to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the backend's console output")
+    args = parser.parse_args()
+    args.output = os.path.abspath(args.output) if args.output else None
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    log_dirs = {log_size: prepare_logs(log_size, args.seed) for log_size in args.log_sizes}
+    template_dirs = {
+        count: prepare_templates(os.path.join(DATA_DIR, f"templates_{count}"), count)
+        for count in args.templates
+    }
+    work_dir = tempfile.mkdtemp(prefix="load_test_", dir=DATA_DIR)
+    markers_dir = os.path.join(work_dir, "markers")
+    os.makedirs(markers_dir)
+
+    llm_stats = FakeLLMStats()
+    llm_settings = FakeLLMSettings(args.llm_latency, args.llm_tokens_per_second,
+                                   args.llm_prefill_tokens_per_second, args.llm_completion_tokens)
+    llm_server = ServerThread(create_app(llm_settings, llm_stats), free_port())
+    backend_server = None
+    lag_monitor = None
+    report = sys.stdout
+    config_overrides = parse_overrides(args.config)
+    if not args.verbose:
+        # The backend logs every request and LLM answer to stdout; log only warnings and
+        # discard the console output, so the report stays readable and nothing piles up in memory
+        config_overrides.setdefault("log_level", "WARNING")
+    try:
+        with open(os.devnull, "w") as devnull, \
+                (contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull)):
+            llm_server.start()
+            backend_app = start_backend(work_dir, llm_server.port, config_overrides)
+            backend_server = ServerThread(backend_app, free_port())
+            backend_server.start()
+            lag_monitor = LoopLagMonitor(backend_server.loop)
+            lag_monitor.start()
+
+            print(REPORT_HEADER, file=report, flush=True)
+            rows = asyncio.run(drive(args, backend_server.port, log_dirs, template_dirs, llm_stats,
+                                     lag_monitor, markers_dir, report))
+    finally:
+        if lag_monitor is not None:
+            lag_monitor.stop()
+        if backend_server is not None:
+            backend_server.stop()
+        llm_server.stop()
+        os.chdir(DATA_DIR)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=4)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""
+Synthetic multi-component log generator for benchmarks.
+
+Writes Hadoop NameNode/DataNode, Hive, Hive job and Spark driver logs with
+realistic line formats, interleaved timestamps and occasional Java stack
+traces. Output is written in batches, so sizes from 1 MB to tens of GB need
+constant memory. The same seed and size always produce the same files.
+
+Usage:
+    python log_generator.py OUTPUT_DIR --size 100MB [--seed 42]
+"""
+import argparse
+import os
+import random
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+
+# Share of the total size written to each file
+COMPONENT_SHARES = {
+    "hadoop_namenode.log": 0.25,
+    "hadoop_datanode.log": 0.25,
+    "hive_log.log": 0.2,
+    "hive_job_log.log": 0.05,
+    "spark_driver.log": 0.25,
+}
+
+EXCEPTIONS = [
+    ("java.net.SocketTimeoutException", "60000 millis timeout while waiting for channel to be ready for read"),
+    ("java.io.IOException", "Connection reset by peer"),
+    ("org.apache.hadoop.ipc.RemoteException", "File /tmp/hive/_tmp.000000_0 could only be replicated to 0 nodes"),
+    ("java.lang.OutOfMemoryError", "GC overhead limit exceeded"),
+    ("org.apache.hadoop.hive.ql.metadata.HiveException", "Unable to rename output from: hdfs://nn:8020/tmp/hive"),
+]
+STACK_FRAMES = [
+    "org.apache.hadoop.hdfs.DFSOutputStream$DataStreamer.run(DFSOutputStream.java:{})",
+    "org.apache.hadoop.ipc.Client.call(Client.java:{})",
+    "org.apache.hadoop.hive.ql.exec.FileSinkOperator.closeOp(FileSinkOperator.java:{})",
+    "org.apache.hadoop.hive.ql.Driver.execute(Driver.java:{})",
+    "org.apache.spark.scheduler.DAGScheduler.handleTaskCompletion(DAGScheduler.scala:{})",
+    "org.apache.spark.executor.Executor$TaskRunner.run(Executor.scala:{})",
+    "java.util.concurrent.ThreadPoolExecutor.runWorker(ThreadPoolExecutor.java:{})",
+]
+TABLES = ["web_logs", "orders", "clicks", "sessions", "inventory"]
+BATCH_BYTES = 1024 * 1024
+
+
+class _Clock:
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.now = datetime(2024, 3, 12, 10, 0, 0)
+
+    def tick(self) -> datetime:
+        self.now += timedelta(milliseconds=self.rng.randint(1, 250))
+        return self.now
+
+
+def _hadoop_time(t: datetime) -> str:
+    return t.strftime("%Y-%m-%d %H:%M:%S,") + f"{t.microsecond // 1000:03d}"
+
+
+def _stack_trace(rng: random.Random) -> List[str]:
+    name, message = rng.choice(EXCEPTIONS)
+    lines = [f"{name}: {message}"]
+    for frame in rng.sample(STACK_FRAMES, rng.randint(3, len(STACK_FRAMES))):
+        lines.append("\tat " + frame.format(rng.randint(100, 2500)))
+    return lines
+
+
+def _namenode_lines(rng: random.Random, clock: _Clock) -> List[str]:
+    t = _hadoop_time(clock.tick())
+    block = rng.randint(1073741825, 1073999999)
+    table = rng.choice(TABLES)
+    roll = rng.random()
+    if roll < 0.6:
+        return [f"{t} INFO org.apache.hadoop.hdfs.StateChange: BLOCK* allocate blk_{block}_{block - 1073740824}, "
+                f"replicas=10.0.0.{rng.randint(2, 40)}:50010 for /user/hive/warehouse/{table}/00000{rng.randint(0, 9)}_0"]
+    if roll < 0.9:
+        return [f"{t} INFO org.apache.hadoop.hdfs.server.namenode.FSNamesystem: completeFile: "
+                f"/tmp/hive/hive_{rng.randint(1000, 9999)}/_tmp.-ext-10000/000000_0 is closed by DFSClient_NONMAPREDUCE_{rng.randint(1, 99999)}_1"]
+    if roll < 0.98:
+        return [f"{t} WARN org.apache.hadoop.hdfs.server.blockmanagement.BlockPlacementPolicy: Failed to place enough replicas, "
+                f"still in need of {rng.randint(1, 2)} to reach 3"]
+    return [f"{t} ERROR org.apache.hadoop.hdfs.server.namenode.NameNode: RPC call failed"] + _stack_trace(rng)
+
+
+def _datanode_lines(rng: random.Random, clock: _Clock) -> List[str]:
+    t = _hadoop_time(clock.tick())
+    block = rng.randint(1073741825, 1073999999)
+    roll = rng.random()
+    if roll < 0.5:
+        return [f"{t} INFO org.apache.hadoop.hdfs.server.datanode.DataNode: Receiving BP-1915213571-10.0.0.1-1710230000000:blk_{block}_{block - 1073740824} "
+                f"src: /10.0.0.{rng.randint(2, 40)}:{rng.randint(30000, 60000)} dest: /10.0.0.{rng.randint(2, 40)}:50010"]
+    if roll < 0.9:
+        return [f"{t} INFO org.apache.hadoop.hdfs.server.datanode.DataNode.clienttrace: src: /10.0.0.{rng.randint(2, 40)}:50010, "
+                f"bytes: {rng.randint(1000, 134217728)}, op: HDFS_WRITE, duration: {rng.randint(100000, 99999999)}"]
+    if roll < 0.98:
+        return [f"{t} WARN org.apache.hadoop.hdfs.server.datanode.DataNode: Slow BlockReceiver write packet to mirror took {rng.randint(300, 9000)}ms"]
+    return [f"{t} ERROR org.apache.hadoop.hdfs.server.datanode.DataNode: DataXceiver error processing WRITE_BLOCK operation"] + _stack_trace(rng)
+
+
+def _hive_lines(rng: random.Random, clock: _Clock) -> List[str]:
+    t = _hadoop_time(clock.tick())
+    table = rng.choice(TABLES)
+    roll = rng.random()
+    if roll < 0.4:
+        return [f"{t} INFO  ql.Driver (Driver.java:execute({rng.randint(1000, 2000)})) - Starting command: "
+                f"INSERT OVERWRITE TABLE {table} SELECT * FROM staging_{table} WHERE dt='2024-03-{rng.randint(1, 28):02d}'"]
+    if roll < 0.8:
+        return [f"{t} INFO  exec.Task (SessionState.java:printInfo({rng.randint(900, 1000)})) - Hadoop job information for Stage-{rng.randint(1, 9)}: "
+                f"number of mappers: {rng.randint(1, 500)}; number of reducers: {rng.randint(0, 100)}"]
+    if roll < 0.97:
+        return [f"{t} INFO  metastore.HiveMetaStore (HiveMetaStore.java:logInfo({rng.randint(600, 800)})) - {rng.randint(0, 64)}: get_table : db=default tbl={table}"]
+    return [f"{t} ERROR exec.Task (SessionState.java:printError({rng.randint(900, 1000)})) - Failed with exception"] + _stack_trace(rng)
+
+
+def _hive_job_lines(rng: random.Random, clock: _Clock) -> List[str]:
+    millis = int(clock.tick().timestamp() * 1000)
+    query_id = f"hive_{rng.randint(20240312000000, 20240312235959)}_{rng.randint(1000, 9999)}"
+    if rng.random() < 0.5:
+        return [f'QueryStart QUERY_STRING="INSERT OVERWRITE TABLE {rng.choice(TABLES)} SELECT ..." QUERY_ID="{query_id}" TIME="{millis}"']
+    return [f'TaskEnd TASK_RET_CODE="{rng.choice([0, 0, 0, 1, 2])}" TASK_HADOOP_PROGRESS="map = 100%,  reduce = 100%" '
+            f'TASK_NAME="org.apache.hadoop.hive.ql.exec.MapRedTask" QUERY_ID="{query_id}" TIME="{millis}"']
+
+
+def _spark_lines(rng: random.Random, clock: _Clock) -> List[str]:
+    t = clock.tick().strftime("%y/%m/%d %H:%M:%S")
+    stage = rng.randint(0, 40)
+    task = rng.randint(0, 2000)
+    roll = rng.random()
+    if roll < 0.45:
+        return [f"{t} INFO scheduler.TaskSetManager: Starting task {task % 200}.0 in stage {stage}.0 (TID {task}, worker-{rng.randint(1, 12)}, "
+                f"executor {rng.randint(1, 24)}, partition {task % 200}, NODE_LOCAL, {rng.randint(4000, 9000)} bytes)"]
+    if roll < 0.85:
+        return [f"{t} INFO scheduler.TaskSetManager: Finished task {task % 200}.0 in stage {stage}.0 (TID {task}) in {rng.randint(20, 90000)} ms "
+                f"on worker-{rng.randint(1, 12)} (executor {rng.randint(1, 24)}) ({rng.randint(1, 200)}/200)"]
+    if roll < 0.97:
+        return [f"{t} INFO hive.HiveExternalCatalog: Reading table default.{rng.choice(TABLES)} from hdfs://nn:8020/user/hive/warehouse"]
+    return [f"{t} WARN scheduler.TaskSetManager: Lost task {task % 200}.0 in stage {stage}.0 (TID {task}, worker-{rng.randint(1, 12)}): "] + _stack_trace(rng)
+
+
+LINE_GENERATORS = {
+    "hadoop_namenode.log": _namenode_lines,
+    "hadoop_datanode.log": _datanode_lines,
+    "hive_log.log": _hive_lines,
+    "hive_job_log.log": _hive_job_lines,
+    "spark_driver.log": _spark_lines,
+}
+
+
+def parse_size(size: str) -> int:
+    """Parse sizes like "1MB", "512KB" or "20GB" (powers of 1024) into bytes."""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGT]?B?)\s*', size.upper())
+    if not match:
+        raise ValueError(f"Invalid size: {size}")
+    units = {"": 1, "B": 1, "K": 1024, "KB": 1024, "M": 1024 ** 2, "MB": 1024 ** 2,
+             "G": 1024 ** 3, "GB": 1024 ** 3, "T": 1024 ** 4, "TB": 1024 ** 4}
+    return int(float(match.group(1)) * units[match.group(2)])
+
+
+def generate_logs(output_dir: str, total_bytes: int, seed: int = 42) -> Dict[str, int]:
+    """
+    Write one log file per component into output_dir, about total_bytes in total.
+
+    Returns:
+        Dict[str, int]: File path -> bytes written.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    written = {}
+    for index, (name, share) in enumerate(COMPONENT_SHARES.items()):
+        rng = random.Random(seed * 100 + index)
+        clock = _Clock(rng)
+        generator = LINE_GENERATORS[name]
+        target = int(total_bytes * share)
+        path = os.path.join(output_dir, name)
+        size = 0
+        with open(path, "w", encoding="utf-8") as f:
+            while size < target:
+                batch = []
+                batch_size = 0
+                while batch_size < BATCH_BYTES and size + batch_size < target:
+                    for line in generator(rng, clock):
+                        batch.append(line)
+                        batch_size += len(line) + 1
+                text = "\n".join(batch) + "\n"
+                f.write(text)
+                size += len(text)
+        written[path] = size
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic Hadoop/Hive/Spark logs")
+    parser.add_argument("output_dir", help="Directory for the generated log files")
+    parser.add_argument("--size", default="10MB", help="Total size, e.g. 1MB, 500MB, 20GB")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    args = parser.parse_args()
+    files = generate_logs(args.output_dir, parse_size(args.size), args.seed)
+    for path, size in files.items():
+        print(f"{path}: {size} bytes")
@@ -0,0 +1,170 @@
+"""
+Cold-start benchmark of the backend.
+
+Imports the backend app in fresh interpreters, as a new uvicorn worker or a
+--reload restart does, and compares the median import time against a budget.
+One extra run under `python -X importtime` breaks the time down by the app's
+direct imports and by top-level package. Every run also checks that the LLM
+dependencies (LangChain, the OpenAI client) are still imported lazily.
+
+The exit status is 1 when the median import time is over --budget-ms or a
+lazy dependency was imported at startup.
+
+Usage:
+    python startup.py
+    python startup.py --repeat 10 --budget-ms 1500
+    python startup.py --output startup_report.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.abspath(os.path.join(BENCH_DIR, "..", "backend"))
+
+# Target wall time of `import app` in a fresh interpreter, milliseconds
+STARTUP_BUDGET_MS = 1500
+# Deferred until the first analysis or the startup warm-up; importing them eagerly is a regression
+LAZY_MODULES = ("langchain", "langchain_core", "langchain_openai", "openai", "tiktoken")
+TOP_IMPORTS = 15
+
+RESULT_PREFIX = "STARTUP_RESULT "
+IMPORT_SCRIPT = f"""
+import json, sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+eager = sorted(name for name in {LAZY_MODULES!r} if name in sys.modules)
+print({RESULT_PREFIX!r} + json.dumps({{"seconds": elapsed, "eager": eager}}), flush=True)
+"""
+
+
+def run_import(work_dir: str, importtime: bool = False) -> Tuple[Dict[str, Any], str]:
+    """Import the app in a new interpreter. Returns its result line and stderr."""
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", IMPORT_SCRIPT]
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, PYTHONDONTWRITEBYTECODE="1")
+    completed = subprocess.run(command, cwd=work_dir, env=env, capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):]), completed.stderr
+    tail = "\n".join(completed.stderr.splitlines()[-15:])
+    raise RuntimeError(f"Importing the app failed (exit status {completed.returncode}):\n{tail}")
+
+
+def parse_importtime(stderr: str) -> List[Tuple[int, int, int, str]]:
+    """(level, self us, cumulative us, module) of each line of `-X importtime` output, in print order."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        level = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        entries.append((level, int(self_us), int(cumulative_us), name.strip()))
+    return entries
+
+
+def import_breakdown(entries: List[Tuple[int, int, int, str]]) -> Dict[str, Any]:
+    """
+    The app's direct imports by cumulative time, and self time summed per top-level package.
+    Children are printed before their parent, so the app's direct imports are the level 1
+    entries between the previous top-level import and `app`.
+    """
+    app_index = next((index for index, entry in enumerate(entries) if entry[0] == 0 and entry[3] == "app"), None)
+    if app_index is None:
+        return {"app_ms": None, "direct_imports": [], "packages": []}
+    start = app_index
+    while start > 0 and entries[start - 1][0] > 0:
+        start -= 1
+    app_entries = entries[start:app_index + 1]
+    direct = sorted((entry for entry in app_entries if entry[0] == 1), key=lambda entry: entry[2], reverse=True)
+    packages: Counter = Counter()
+    for _, self_us, _, name in app_entries:
+        packages[name.split(".")[0]] += self_us
+    return {
+        "app_ms": round(entries[app_index][2] / 1000, 1),
+        "direct_imports": [{"module": name, "ms": round(cumulative / 1000, 1)}
+                           for _, _, cumulative, name in direct[:TOP_IMPORTS]],
+        "packages": [{"package": name, "ms": round(self_us / 1000, 1)}
+                     for name, self_us in packages.most_common(TOP_IMPORTS)]
+    }
+
+
+def prepare_work_dir() -> str:
+    """Working directory with a copy of the config; importing the app creates its stores there."""
+    work_dir = tempfile.mkdtemp(prefix="startup_bench_")
+    shutil.copy(os.path.join(BACKEND_DIR, "config.json"), os.path.join(work_dir, "config.json"))
+    return work_dir
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the cold-start import time of the backend")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed imports, each in a new interpreter")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS,
+                        help="Fail when the median import time is above this")
+    parser.add_argument("--output", help="Write the full report as JSON to this file")
+    args = parser.parse_args()
+
+    work_dir = prepare_work_dir()
+    try:
+        # The first import also compiles bytecode and fills the OS file cache; it is not counted
+        run_import(work_dir)
+        runs = [run_import(work_dir)[0] for _ in range(args.repeat)]
+        _, stderr = run_import(work_dir, importtime=True)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    timings = [run["seconds"] * 1000 for run in runs]
+    eager = sorted({name for run in runs for name in run["eager"]})
+    breakdown = import_breakdown(parse_importtime(stderr))
+    report = {
+        "python": platform.python_version(),
+        "python_implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "repeat": args.repeat,
+        "import_ms": {"median": round(statistics.median(timings), 1), "min": round(min(timings), 1),
+                      "max": round(max(timings), 1)},
+        "budget_ms": args.budget_ms,
+        "eager_lazy_modules": eager,
+        **breakdown
+    }
+
+    print(f"import app: median {report['import_ms']['median']:.1f} ms, min {report['import_ms']['min']:.1f} ms "
+          f"(budget {args.budget_ms:.0f} ms)")
+    print("\nSlowest direct imports (cumulative):")
+    for entry in report["direct_imports"]:
+        print(f"  {entry['ms']:>8.1f} ms  {entry['module']}")
+    print("\nSelf time by package:")
+    for entry in report["packages"]:
+        print(f"  {entry['ms']:>8.1f} ms  {entry['package']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    failures = []
+    if report["import_ms"]["median"] > args.budget_ms:
+        failures.append(f"median import time {report['import_ms']['median']:.1f} ms is over the "
+                        f"{args.budget_ms:.0f} ms budget")
+    if eager:
+        failures.append(f"imported at startup instead of on first use: {', '.join(eager)}")
+    for failure in failures:
+        print(f"\nFAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+import asyncio
+from typing import Optional
+
+import httpx
+
+# Backend API URL
+BACKEND_URL = "http://localhost:8000"
+
+# One connection pool shared by all chat sessions
+POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60.0)
+
+# Per-endpoint timeouts and retries. Analyses hold the connection open while the
+# LLM runs, so only their read timeout is long; connecting should always be fast.
+ENDPOINT_POLICIES = {
+    "analyze_interaction": {"timeout": httpx.Timeout(10.0, read=600.0), "retries": 3},
+    "diagnose": {"timeout": httpx.Timeout(10.0, read=600.0), "retries": 3},
+    # Estimates preprocess the logs, which takes a while for large uploads the first time
+    "estimate": {"timeout": httpx.Timeout(10.0, read=120.0), "retries": 1},
+    # Streamed bodies cannot be replayed, so uploads are not retried
+    "uploads": {"timeout": httpx.Timeout(30.0, write=300.0), "retries": 0},
+    "default": {"timeout": httpx.Timeout(10.0, read=30.0), "retries": 2},
+}
+
+# Responses worth retrying: the backend is busy or restarting. An exhausted LLM budget
+# (402) is not retried, since it cannot succeed until the budget window frees spending
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+# Longest Retry-After we wait for; beyond this the user is told to try again later
+MAX_RETRY_WAIT = 30.0
+BACKOFF_BASE = 0.5
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the app-wide client, creating it on first use"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(base_url=BACKEND_URL, limits=POOL_LIMITS)
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _retry_delay(response: Optional[httpx.Response], attempt: int) -> Optional[float]:
+    """Seconds to wait before the next attempt, or None if the wait would be too long"""
+    delay = BACKOFF_BASE * (2 ** attempt)
+    if response is not None:
+        try:
+            delay = max(delay, float(response.headers.get("Retry-After", 0)))
+        except ValueError:
+            pass
+    return delay if delay <= MAX_RETRY_WAIT else None
+
+
+async def backend_request(method: str, endpoint: str, path: Optional[str] = None, **kwargs) -> httpx.Response:
+    """
+    Send a request to the backend with the endpoint's timeout and retry policy.
+
+    Connection failures and busy responses (429/5xx gateway errors) are retried with
+    exponential backoff, honoring the backend's Retry-After header. The final
+    response is returned without raise_for_status so callers can inspect errors.
+    """
+    policy = ENDPOINT_POLICIES.get(endpoint, ENDPOINT_POLICIES["default"])
+    kwargs.setdefault("timeout", policy["timeout"])
+    client = get_client()
+
+    attempt = 0
+    while True:
+        try:
+            response = await client.request(method, path or f"/{endpoint}", **kwargs)
+        except (httpx.ConnectError, httpx.ConnectTimeout):
+            # The request never reached the backend, so it is safe to send again
+            delay = _retry_delay(None, attempt)
+            if attempt >= policy["retries"] or delay is None:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= policy["retries"]:
+                return response
+            delay = _retry_delay(response, attempt)
+            if delay is None:
+                return response
+            print(f"Backend returned {response.status_code} for {endpoint}, retrying in {delay:.1f}s")
+        attempt += 1
+        await asyncio.sleep(delay)
@@ -1,5 +1,5 @@
 import chainlit as cl
-from typing import Optional, List
+from typing import Optional, List, Tuple
 import os
 from datetime import datetime
 import uuid
@@ -7,13 +7,20 @@ from dotenv import load_dotenv
 import json
 import httpx
 import re
-import tempfile
-import shutil
+import asyncio
+import hashlib
+
+from backend_client import backend_request, close_client, get_client
 
 load_dotenv()
 
-# Backend API URL
-BACKEND_URL = "http://localhost:8000"
+# Uploads are streamed to the backend in chunks of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Result messages stay small whatever the result size: long lists and texts are cut
+# here, and full results are sent as elements the browser loads when opened
+MAX_LISTED_ITEMS = 20
+MAX_PREVIEW_CHARS = 500
 
 def extract_json_from_text(text: str) -> Optional[str]:
     """Extract JSON content from a text that contains markdown code blocks"""
@@ -40,69 +47,81 @@ def extract_json_from_text(text: str) -> Optional[str]:
     
     return None
 
-async def handle_uploaded_files(files: List[cl.File]) -> List[str]:
+async def iter_file_chunks(path: str):
+    """Read a file in chunks without blocking the event loop"""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+async def upload_file(file: cl.File, session_id: Optional[str]) -> dict:
     """
-    Handle uploaded files and return their paths
+    Send one uploaded file to the backend and return its upload info.
+    Content the backend already stores is referenced by hash instead of being sent again.
     """
-    uploaded_paths = []
+    # Chainlit stores uploads on disk; stream from there instead of reading the file into memory
+    if getattr(file, 'path', None):
+        sha256 = await asyncio.to_thread(file_sha256, file.path)
+        content = iter_file_chunks(file.path)
+    elif getattr(file, 'content', None) is not None:
+        content = file.content if isinstance(file.content, bytes) else file.content.encode()
+        sha256 = hashlib.sha256(content).hexdigest()
+    else:
+        raise ValueError(f"Could not find a way to read file content for {file.name}")
     
-    # Create temp directory if not exists
-    temp_dir = cl.user_session.get("temp_dir")
-    if not temp_dir:
-        temp_dir = tempfile.mkdtemp(prefix="chainlit_logs_")
-        cl.user_session.set("temp_dir", temp_dir)
-        print(f"Created temp directory: {temp_dir}")
+    response = await backend_request(
+        "POST", "uploads/by-hash",
+        json={"sha256": sha256, "filename": file.name, "session_id": session_id}
+    )
+    if response.status_code == 404:
+        response = await backend_request(
+            "POST", "uploads",
+            params={"filename": file.name, "session_id": session_id},
+            content=content,
+            headers={"Content-Type": "application/octet-stream"}
+        )
+    response.raise_for_status()
+    return response.json()
+
+async def handle_uploaded_files(files: List[cl.File]) -> List[dict]:
+    """
+    Upload files to the backend concurrently and return their upload info
+    (upload_id, filename, size, sha256)
+    """
+    session_id = cl.user_session.get("session_id")
+    results = await asyncio.gather(*[upload_file(file, session_id) for file in files], return_exceptions=True)
     
-    for file in files:
-        try:
-            # Debug info
-            print(f"Processing file: {file.name}")
-            print(f"File attributes: {dir(file)}")
-            
-            # Save file to temp directory
-            file_path = os.path.join(temp_dir, file.name)
-            
-            # Read file content properly
-            content = None
-            
-            # Method 1: Try to read using path
-            if hasattr(file, 'path') and file.path:
-                print(f"Reading from path: {file.path}")
-                with open(file.path, 'rb') as src:
-                    content = src.read()
-            
-            # Method 2: Try to get content directly
-            elif hasattr(file, 'content') and file.content is not None:
-                print(f"Using direct content")
-                content = file.content if isinstance(file.content, bytes) else file.content.encode()
-            
-            # Method 3: Try async read
-            elif hasattr(file, 'read'):
-                print(f"Using async read method")
-                content = await file.read()
-            
-            # Method 4: Check for other possible attributes
-            else:
-                # List all attributes for debugging
-                attrs = {attr: getattr(file, attr, None) for attr in dir(file) if not attr.startswith('_')}
-                print(f"File attributes: {attrs}")
-                raise ValueError(f"Could not find a way to read file content for {file.name}")
-            
-            if content is None:
-                raise ValueError(f"File content is None for {file.name}")
-            
-            # Write content to temp location
-            with open(file_path, 'wb') as f:
-                f.write(content)
-            
-            print(f"Saved file to: {file_path}")
-            uploaded_paths.append(file_path)
-            
-        except Exception as e:
-            print(f"Error handling file {file.name}: {str(e)}")
-            raise
-        
-    return uploaded_paths
+    uploads = [result for result in results if not isinstance(result, Exception)]
+    errors = [f"{file.name}: {result}" for file, result in zip(files, results) if isinstance(result, Exception)]
+    if errors:
+        # Don't keep a partial set of files from a failed batch on the backend
+        await delete_uploads(uploads)
+        raise ValueError("; ".join(errors))
+    
+    for upload in uploads:
+        reused = " (already on the backend)" if upload.get("deduplicated") else ""
+        print(f"Uploaded {upload['filename']} as {upload['upload_id']} ({upload['size']} bytes){reused}")
+    return uploads
+
+@cl.on_app_startup
+async def on_app_startup():
+    """Open the pooled backend client shared by all sessions"""
+    get_client()
+
+@cl.on_app_shutdown
+async def on_app_shutdown():
+    """Close the backend client and its connections"""
+    await close_client()
 
 # Authentication using Chainlit's built-in password auth
 @cl.password_auth_callback
@@ -140,8 +159,7 @@ async def start():
     session_id = str(uuid.uuid4())[:8]
     cl.user_session.set("session_id", session_id)
     cl.user_session.set("message_count", 0)
-    cl.user_session.set("uploaded_files", [])  # Store uploaded file paths
-    cl.user_session.set("temp_dir", None)  # Store temp directory for cleanup
+    cl.user_session.set("uploaded_files", [])  # Upload info of files stored on the backend
     
     # Welcome message
     welcome_msg = f"""👋 **Welcome to Cross-Component Interaction Analyzer!**
@@ -169,6 +187,184 @@ This tool analyzes log files to detect cross-component interactions and categori
     
     await cl.Message(content=welcome_msg, author="System").send()
 
+async def post_analysis(endpoint: str, payload: dict) -> dict:
+    """Call an analysis endpoint of the backend and return its JSON response"""
+    response = await backend_request("POST", endpoint, json=payload)
+    response.raise_for_status()
+    return response.json()
+
+async def preflight_summary(payloads: dict) -> str:
+    """
+    Estimate each run without starting it and describe its size, cost and any warnings.
+    Best effort: if estimating fails the analysis still runs.
+    """
+    responses = await asyncio.gather(*[
+        backend_request("POST", "estimate", json={"kind": kind, "request": payload})
+        for kind, payload in payloads.items()
+    ], return_exceptions=True)
+    lines = []
+    for kind, response in zip(payloads, responses):
+        if isinstance(response, Exception) or response.status_code != 200:
+            continue
+        estimate = response.json()
+        line = (f"{kind}: {estimate['total_lines']:,} lines in {estimate['blocks']} blocks, "
+                f"~{estimate['llm_calls']} LLM calls, ~{estimate['prompt_tokens']:,} prompt tokens "
+                f"(${estimate['cost_usd']:.2f})")
+        if estimate.get("latency_seconds_high") is not None:
+            line += f", {estimate['latency_seconds_low']:.0f}-{estimate['latency_seconds_high']:.0f}s"
+        lines.append(line)
+        lines.extend(f"⚠️ {warning}" for warning in estimate.get("warnings", []))
+    return "\n".join(lines)
+
+def format_request_error(error: Exception, name: str) -> str:
+    """Describe a failed backend request for one result section"""
+    if isinstance(error, httpx.TimeoutException):
+        return f"""⏰ **Request Timeout**
+
+The {name} took too long to complete. This can happen with large log files.
+
+Please try again with fewer files or check the server logs for more information."""
+    
+    if isinstance(error, httpx.HTTPStatusError):
+        if error.response.status_code == 402:
+            retry_after = error.response.headers.get("Retry-After")
+            when = f" in about {format_duration(int(retry_after))}" if retry_after and retry_after.isdigit() else " later"
+            return f"""💳 **LLM Budget Exhausted**
+
+You have used your LLM budget for now, so the {name} was not run. Please try again{when}."""
+        if error.response.status_code == 429:
+            retry_after = error.response.headers.get("Retry-After", "a few")
+            return f"""⏳ **Server Busy**
+
+Too many analyses are running right now. Please try again in about {retry_after} seconds."""
+        return f"""❌ **API Error**
+
+The {name} request failed. Status: {error.response.status_code}
+
+**Error**: {truncate(error.response.text, MAX_PREVIEW_CHARS) if hasattr(error.response, 'text') else 'Unknown error'}"""
+    
+    return f"""❌ **Processing Error**
+
+An error occurred during the {name}.
+
+**Error**: {str(error)}"""
+
+def format_duration(seconds: int) -> str:
+    """Round a number of seconds to a readable duration"""
+    if seconds < 120:
+        return f"{seconds} seconds"
+    if seconds < 2 * 3600:
+        return f"{round(seconds / 60)} minutes"
+    return f"{round(seconds / 3600)} hours"
+
+def truncate(text: str, limit: int) -> str:
+    """Cut text to at most `limit` characters, marking the cut"""
+    if len(text) <= limit:
+        return text
+    return text[:limit].rstrip() + f"\n… ({len(text) - limit} more characters)"
+
+def pretty_json(text: Optional[str]) -> Optional[str]:
+    """Pretty-print a JSON string, or return it unchanged if it does not parse"""
+    if not text:
+        return None
+    try:
+        return json.dumps(json.loads(text), indent=2)
+    except ValueError:
+        return text
+
+def raw_response_file(name: str, result: dict) -> cl.File:
+    """Full API response offered as a download instead of being rendered"""
+    return cl.File(
+        name=name,
+        content=json.dumps(result, indent=2).encode("utf-8"),
+        mime="application/json",
+        display="inline"
+    )
+
+def format_analysis_section(result: dict) -> Tuple[str, List[cl.Element], bool, str]:
+    """
+    Render the interaction analysis response.
+    The message shows a bounded summary; full JSON is attached as elements loaded on demand.
+    Returns the markdown, its elements, whether the analysis succeeded and the backend's message.
+    """
+    success = result.get("success", False)
+    message_text = result.get("message", "")
+    if not success:
+        return f"❌ Analysis failed: {truncate(message_text, MAX_PREVIEW_CHARS)}", [], False, message_text
+    
+    log_files = result.get("log_files", [])
+    interaction_json = pretty_json(extract_json_from_text(result.get("interaction_pairs", "")))
+    dispatched_json = extract_json_from_text(result.get("dispatched_interactions", ""))
+    elements = []
+    
+    content = "🔗 **Interaction Analysis**\n\n"
+    if log_files:
+        content += f"📁 **Analyzed Log Files** ({len(log_files)} files):"
+        for log_file in log_files[:MAX_LISTED_ITEMS]:
+            content += f"\n- {os.path.basename(log_file)}"
+        if len(log_files) > MAX_LISTED_ITEMS:
+            content += f"\n- … and {len(log_files) - MAX_LISTED_ITEMS} more"
+        content += "\n\n"
+    
+    # Summary statistics inline, the JSON itself on demand
+    if dispatched_json:
+        try:
+            parsed_json = json.loads(dispatched_json)
+            content += "📈 **Summary:**\n"
+            content += f"- 🔴 Resource Invocation: {len(parsed_json.get('resource_invocation', []))} patterns\n"
+            content += f"- 🟡 Abnormal Usage: {len(parsed_json.get('abnormal_usage', []))} patterns\n"
+            content += f"- 🟢 Shared Object: {len(parsed_json.get('shared_object', []))} patterns\n\n"
+        except ValueError:
+            pass
+    
+    if interaction_json:
+        elements.append(cl.Text(name="interaction_pairs", content=interaction_json, language="json", display="side"))
+        content += "**1️⃣ Interaction Pairs (Component Relationships):** interaction_pairs\n"
+    if dispatched_json:
+        elements.append(cl.Text(name="bug_patterns", content=pretty_json(dispatched_json), language="json", display="side"))
+        content += "**2️⃣ Categorized Interactions (Bug Patterns):** bug_patterns\n"
+    
+    elements.append(raw_response_file("analysis_response.json", result))
+    return content, elements, True, message_text
+
+def format_diagnosis_section(result: dict) -> Tuple[str, List[cl.Element], bool, str]:
+    """
+    Render the template diagnosis response.
+    Each template's answer is a side element opened on click; the message lists the templates
+    with a one-line preview, up to MAX_LISTED_ITEMS, and the full response is a download.
+    Returns the markdown, its elements, whether the diagnosis succeeded and the backend's message.
+    """
+    success = result.get("success", False)
+    message_text = result.get("message", "")
+    diagnosis_results = result.get("results", {})
+    template_status = result.get("template_status", {})
+    
+    content = "📋 **Template-Based Diagnosis**\n"
+    if not success:
+        return content + f"\n❌ Diagnosis failed: {truncate(message_text, MAX_PREVIEW_CHARS)}\n", [], False, message_text
+    if not diagnosis_results:
+        return content + "\n⚠️ No template diagnosis results found.\n", [], True, message_text
+    
+    # Count total diagnosis results
+    total_responses = sum(len(responses) for responses in diagnosis_results.values())
+    content += f"\n📋 **Templates Analyzed**: {len(diagnosis_results)}\n"
+    content += f"📝 **Total Responses**: {total_responses}\n\n"
+    
+    elements = []
+    for template_id, responses in list(diagnosis_results.items())[:MAX_LISTED_ITEMS]:
+        element_name = f"template_{template_id}"
+        full_text = "\n\n".join(f"--- Response {i} ---\n{text}" for i, text in enumerate(responses, 1))
+        elements.append(cl.Text(name=element_name, content=full_text, display="side"))
+        
+        first_line = next((line.strip() for line in "\n".join(responses).splitlines() if line.strip() and not line.startswith("#")), "")
+        status = template_status.get(template_id)
+        content += f"- {element_name}{f' ({status})' if status else ''}: {truncate(first_line, 160)}\n"
+    if len(diagnosis_results) > MAX_LISTED_ITEMS:
+        content += f"- … and {len(diagnosis_results) - MAX_LISTED_ITEMS} more templates in diagnosis_response.json\n"
+    
+    elements.append(raw_response_file("diagnosis_response.json", result))
+    return content, elements, True, message_text
+
 @cl.on_message
 async def main(message: cl.Message):
     """Process user messages and handle file uploads"""
@@ -193,16 +389,16 @@ async def main(message: cl.Message):
         
         if uploaded_files:
             try:
-                # Process uploaded files
-                file_paths = await handle_uploaded_files(uploaded_files)
+                # Stream uploaded files to the backend
+                uploads = await handle_uploaded_files(uploaded_files)
                 
                 # Update session with uploaded files
                 existing_files = cl.user_session.get("uploaded_files", [])
-                existing_files.extend(file_paths)
+                existing_files.extend(uploads)
                 cl.user_session.set("uploaded_files", existing_files)
                 
                 # Inform user about uploaded files
-                file_list = "\n".join([f"- {os.path.basename(fp)}" for fp in file_paths])
+                file_list = "\n".join([f"- {upload['filename']}" for upload in uploads])
                 await cl.Message(
                     content=f"📤 **Files uploaded successfully!**\n\n{file_list}\n\nTotal files ready for analysis: {len(existing_files)}\n\nType 'analyze' to analyze these files."
                 ).send()
@@ -243,6 +439,7 @@ async def main(message: cl.Message):
     
     # Check if user wants to clear files
     if user_input == "clear":
+        await release_session_uploads()
         cl.user_session.set("uploaded_files", [])
         await cl.Message(content="🗑️ All uploaded files have been cleared.").send()
         return
@@ -264,188 +461,109 @@ async def main(message: cl.Message):
         msg = cl.Message(content="🔍 Analyzing default log files...\n\nThis may take a few minutes...")
     await msg.send()
     
+    # Uploaded files are referenced by upload ID; without uploads the backend uses its default files
+    upload_ids = [upload["upload_id"] for upload in uploaded_files] or None
+    session_id = cl.user_session.get("session_id")
+    
+    # Interaction analysis and diagnosis are independent, so both run at once and
+    # each section is shown as soon as its own request finishes
+    analysis_msg = cl.Message(content="🔗 **Interaction Analysis**: running...")
+    diagnosis_msg = cl.Message(content="📋 **Template-Based Diagnosis**: running...")
+    payloads = {
+        "analyze_interaction": {
+            "upload_ids": upload_ids,
+            "templates_path": "./template/",
+            "session_id": session_id,
+            "user_id": user.identifier
+        },
+        "diagnose": {
+            "upload_ids": upload_ids,
+            "templates_path": None,  # Use default templates
+            "session_id": session_id,
+            "user_id": user.identifier
+        }
+    }
+    
+    await analysis_msg.send()
+    await diagnosis_msg.send()
+    
+    sections = {
+        asyncio.create_task(post_analysis("analyze_interaction", payloads["analyze_interaction"])):
+            (analysis_msg, format_analysis_section, "analysis"),
+        asyncio.create_task(post_analysis("diagnose", payloads["diagnose"])):
+            (diagnosis_msg, format_diagnosis_section, "diagnosis")
+    }
+    # The expected size and cost, and warnings such as an exceeded budget, are shown
+    # when the estimate arrives; the analyses don't wait for it
+    estimate_task = asyncio.create_task(preflight_summary(payloads))
+    
+    status_lines = []
+    all_succeeded = True
+    pending = set(sections) | {estimate_task}
     try:
-        # Get session ID
-        session_id = cl.user_session.get("session_id")
-        
-        # Prepare log files parameter
-        log_files_param = uploaded_files if uploaded_files else None
-        
-        # Call /analyze_interaction API
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{BACKEND_URL}/analyze_interaction",
-                json={
-                    "log_files": log_files_param,
-                    "templates_path": "./template/",
-                    "session_id": session_id
-                },
-                headers={"Content-Type": "application/json"},
-                timeout=300.0  # 5 minute timeout for analysis
-            )
-            response.raise_for_status()
-            result = response.json()
-        
-        # Extract data from result
-        interaction_pairs = result.get("interaction_pairs", "")
-        dispatched_interactions = result.get("dispatched_interactions", "")
-        log_files = result.get("log_files", [])
-        success = result.get("success", False)
-        message_text = result.get("message", "")
-        
-        if not success:
-            await msg.update(content=f"❌ Analysis failed: {message_text}")
-            return
-        
-        # Call /diagnose API for template-based diagnosis
-        async with httpx.AsyncClient() as client:
-            diagnose_response = await client.post(
-                f"{BACKEND_URL}/diagnose",
-                json={
-                    "log_files": log_files_param,
-                    "templates_path": None,  # Use default templates
-                    "session_id": session_id
-                },
-                headers={"Content-Type": "application/json"},
-                timeout=300.0  # 5 minute timeout for diagnosis
-            )
-            diagnose_response.raise_for_status()
-            diagnose_result = diagnose_response.json()
-        
-        # Extract diagnosis data
-        diagnosis_results = diagnose_result.get("results", {})
-        diagnosis_success = diagnose_result.get("success", False)
-        diagnosis_message = diagnose_result.get("message", "")
-        
-        # Extract JSON contents
-        interaction_json = extract_json_from_text(interaction_pairs)
-        dispatched_json = extract_json_from_text(dispatched_interactions)
-        
-        # Format the response
-        response_content = f"""✅ **Cross-Component Analysis & Diagnosis Complete**
-
-📁 **Analyzed Log Files** ({len(log_files)} files):"""
-        
-        for log_file in log_files:
-            filename = os.path.basename(log_file)
-            response_content += f"\n- {filename}"
-        
-        response_content += "\n\n"
-        
-        # Display all JSON results
-        response_content += "📊 **Analysis Results:**\n\n"
-        
-        # Show interaction pairs JSON
-        if interaction_json:
-            response_content += "**1️⃣ Interaction Pairs (Component Relationships):**\n"
-            response_content += "```json\n"
-            try:
-                parsed_json = json.loads(interaction_json)
-                response_content += json.dumps(parsed_json, indent=2)
-            except:
-                response_content += interaction_json
-            response_content += "\n```\n\n"
-        
-        # Show dispatched interactions JSON
-        if dispatched_json:
-            response_content += "**2️⃣ Categorized Interactions (Bug Patterns):**\n"
-            response_content += "```json\n"
-            try:
-                parsed_json = json.loads(dispatched_json)
-                response_content += json.dumps(parsed_json, indent=2)
-                
-                # Add summary statistics
-                resource_invocation = len(parsed_json.get("resource_invocation", []))
-                abnormal_usage = len(parsed_json.get("abnormal_usage", []))
-                shared_object = len(parsed_json.get("shared_object", []))
-                
-                response_content += f"\n```\n\n📈 **Summary:**\n"
-                response_content += f"- 🔴 Resource Invocation: {resource_invocation} patterns\n"
-                response_content += f"- 🟡 Abnormal Usage: {abnormal_usage} patterns\n"
-                response_content += f"- 🟢 Shared Object: {shared_object} patterns\n"
-                
-            except:
-                response_content += dispatched_json
-                response_content += "\n```\n"
-        
-        # Show diagnosis results
-        if diagnosis_success and diagnosis_results:
-            response_content += "\n**3️⃣ Template-Based Diagnosis Results:**\n"
-            
-            # Count total diagnosis results
-            total_templates = len(diagnosis_results)
-            total_responses = sum(len(responses) for responses in diagnosis_results.values())
-            response_content += f"\n📋 **Templates Analyzed**: {total_templates}\n"
-            response_content += f"📝 **Total Responses**: {total_responses}\n\n"
-            
-            # Show each template result
-            for template_id, responses in diagnosis_results.items():
-                response_content += f"**Template: {template_id}**\n"
-                for i, response_text in enumerate(responses, 1):
-                    response_content += f"```\nResponse {i}:\n{response_text}\n```\n\n"
-        
-        elif diagnosis_success:
-            response_content += "\n**3️⃣ Template-Based Diagnosis:**\n"
-            response_content += "⚠️ No template diagnosis results found.\n\n"
-        else:
-            response_content += "\n**3️⃣ Template-Based Diagnosis:**\n"
-            response_content += f"❌ Diagnosis failed: {diagnosis_message}\n\n"
-        
-        # Add raw response for debugging
-        response_content += f"\n<details>\n<summary>🔧 Full API Responses (click to expand)</summary>\n\n"
-        response_content += "**Interaction Analysis Response:**\n```json\n"
-        response_content += json.dumps(result, indent=2)
-        response_content += "\n```\n\n"
-        
-        if diagnosis_success:
-            response_content += "**Diagnosis Response:**\n```json\n"
-            response_content += json.dumps(diagnose_result, indent=2)
-            response_content += "\n```\n"
-        
-        response_content += "</details>"
-        
-        response_content += f"\n\n✅ Analysis: {message_text}"
-        if diagnosis_success:
-            response_content += f"\n✅ Diagnosis: {diagnosis_message}"
-        response_content += f"\n\n**Session Info**: Message #{count} from {user.identifier}"
-        
-    except httpx.TimeoutException:
-        response_content = """⏰ **Request Timeout**
-
-The analysis took too long to complete. This can happen with large log files.
-
-Please try again with fewer files or check the server logs for more information."""
-        
-    except httpx.HTTPStatusError as e:
-        response_content = f"""❌ **API Error**
-
-Failed to analyze log files. Status: {e.response.status_code}
-
-**Error**: {e.response.text if hasattr(e.response, 'text') else 'Unknown error'}"""
-        
-    except Exception as e:
-        response_content = f"""❌ **Processing Error**
-
-An error occurred during analysis.
-
-**Error**: {str(e)}
-
-**Note**: If only diagnosis failed, interaction analysis may still be available in the full response."""
+        while pending - {estimate_task}:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task is estimate_task:
+                    preflight = task.result()
+                    if preflight:
+                        msg.content += f"\n\n**Estimate**\n{preflight}"
+                        await msg.update()
+                    continue
+                section_msg, format_section, name = sections[task]
+                try:
+                    content, elements, success, message_text = format_section(task.result())
+                except Exception as e:
+                    # One failed request does not hide the other section
+                    content, elements, success, message_text = format_request_error(e, name), [], False, str(e)
+                for element in elements:
+                    await element.send(for_id=section_msg.id)
+                section_msg.content = content
+                section_msg.elements = elements
+                await section_msg.update()
+                status_lines.append(f"{'✅' if success else '❌'} {name.capitalize()}: {truncate(message_text, MAX_PREVIEW_CHARS)}")
+                all_succeeded = all_succeeded and success
+    finally:
+        # The session went away, or the estimate is moot once both sections are in:
+        # don't leave the backend requests running for nobody
+        for task in pending:
+            task.cancel()
     
-    # Update the message with the result
-    msg.content = response_content
+    heading = "✅ **Cross-Component Analysis & Diagnosis Complete**" if all_succeeded \
+        else "⚠️ **Cross-Component Analysis & Diagnosis Finished with Errors**"
+    msg.content = (
+        heading + "\n\n"
+        + "\n".join(status_lines)
+        + f"\n\n**Session Info**: Message #{count} from {user.identifier}"
+    )
     await msg.update()
 
+async def delete_uploads(uploads: List[dict]):
+    """Release uploaded files on the backend"""
+    if not uploads:
+        return
+    results = await asyncio.gather(*[
+        backend_request("DELETE", "release_uploads", f"/uploads/{upload['upload_id']}") for upload in uploads
+    ], return_exceptions=True)
+    for upload, result in zip(uploads, results):
+        if isinstance(result, Exception):
+            print(f"Error deleting upload {upload['upload_id']}: {result}")
+
+async def release_session_uploads():
+    """Release all of this session's uploaded files on the backend"""
+    session_id = cl.user_session.get("session_id")
+    if session_id:
+        try:
+            await backend_request("DELETE", "release_uploads", "/uploads", params={"session_id": session_id})
+        except httpx.HTTPError as e:
+            print(f"Error releasing uploads of session {session_id}: {e}")
+    else:
+        await delete_uploads(cl.user_session.get("uploaded_files", []))
+
 @cl.on_chat_end
 async def on_chat_end():
-    """Clean up temporary files when chat ends"""
-    temp_dir = cl.user_session.get("temp_dir")
-    if temp_dir and os.path.exists(temp_dir):
-        try:
-            shutil.rmtree(temp_dir)
-            print(f"Cleaned up temp directory: {temp_dir}")
-        except Exception as e:
-            print(f"Error cleaning up temp directory: {e}")
+    """Release the session's uploaded files when chat ends"""
+    await release_session_uploads()
 
 @cl.on_chat_resume
 async def on_chat_resume(thread):
@@ -456,7 +574,6 @@ async def on_chat_resume(thread):
     
     # Initialize file-related session variables
     cl.user_session.set("uploaded_files", [])
-    cl.user_session.set("temp_dir", None)
     
     # Count previous messages
     message_count = 0
@@ -0,0 +1,64 @@
+"""
+Unit tests for deterministic blank extraction (src/backend/utils/blank_extraction.py).
+
+Runs without a backend server: each test writes a small log file, preprocesses it into
+a temporary cache directory and searches it with a LogIndex.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "backend"))
+
+from utils.blank_extraction import LogIndex, extract_blanks
+from utils.preprocess import preprocess_file
+from utils.template_registry import Template
+
+LOG_LINES = [
+    "2024-01-01 10:00:00 INFO Hive query started",
+    "2024-01-01 10:00:01 ERROR Hive task failed: java.io.IOException: disk full",
+    "2024-01-01 10:00:02 INFO Hive query finished",
+    "2024-01-01 10:00:03 INFO Spark executor registered",
+    "2024-01-01 10:00:04 INFO Spark stage 1 finished",
+]
+
+EG_TEMPLATE = """# Rule Pattern:
+The [platform: component] job failed with [failure: error]
+
+# Blank Definitions:
+- [platform]: Component that ran the job (e.g., Hive, Spark, Flink)
+- [failure]: Exception class reported by the job
+"""
+
+
+class TestExtractBlanks(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def make_index(self, lines):
+        path = os.path.join(self.tmp.name, "job.log")
+        with open(path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        return LogIndex([preprocess_file(path, os.path.join(self.tmp.name, "cache"))])
+
+    def test_error_near_rule_pattern_component_is_filled(self):
+        template = Template("hive_failure", "hive_failure.md", "# Rule Pattern:\nHive failed with [failure: error]\n")
+        filled, unresolved = extract_blanks(template, self.make_index(LOG_LINES))
+        self.assertEqual(filled["failure"]["value"], "IOException")
+        self.assertEqual(unresolved, [])
+
+    def test_example_components_do_not_count(self):
+        # Spark and Hive both appear, so [platform] stays open; the IOException next to Hive
+        # must not be taken because "Hive" is only an example in the blank definitions
+        template = Template("job_failure", "job_failure.md", EG_TEMPLATE)
+        filled, unresolved = extract_blanks(template, self.make_index(LOG_LINES))
+        self.assertEqual(filled, {})
+        self.assertEqual(unresolved, ["platform", "failure"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import requests
+import time
+
+BASE_URL = "http://localhost:8000"
+
+def test_jobs():
+    """Test the background job endpoints"""
+    
+    # Test case 1: Enqueue a diagnosis and poll until it finishes
+    print("=== Test Case 1: Enqueue diagnosis job ===")
+    payload = {
+        "kind": "diagnose",
+        "request": {
+            "log_files": None,
+            "templates_path": None,
+            "session_id": "test-jobs-1"
+        }
+    }
+    
+    try:
+        response = requests.post(f"{BASE_URL}/jobs", json=payload, timeout=10)
+        print(f"Status Code: {response.status_code}")
+        if response.status_code != 200:
+            print(f"❌ Error: {response.text}")
+            return
+        
+        job = response.json()
+        job_id = job["job_id"]
+        print(f"✅ Job enqueued: {job_id} ({job['status']})")
+        
+        # Poll job status
+        while job["status"] in ("queued", "running"):
+            time.sleep(5)
+            job = requests.get(f"{BASE_URL}/jobs/{job_id}", timeout=10).json()
+            print(f"   {job['status']} - {job['progress'] * 100:.0f}% ({job.get('stage')})")
+        
+        if job["status"] == "succeeded":
+            results = job["result"].get("results", {})
+            print(f"✅ Job succeeded, analyzed {len(results)} templates")
+        else:
+            print(f"❌ Job {job['status']}: {job.get('error')}")
+            
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Request failed: {e}")
+    
+    print("\n" + "="*50 + "\n")
+    
+    # Test case 2: Enqueue an interaction analysis and cancel it
+    print("=== Test Case 2: Cancel interaction analysis job ===")
+    payload = {
+        "kind": "analyze_interaction",
+        "request": {"session_id": "test-jobs-2"}
+    }
+    
+    try:
+        job = requests.post(f"{BASE_URL}/jobs", json=payload, timeout=10).json()
+        job_id = job["job_id"]
+        print(f"Job enqueued: {job_id}")
+        
+        job = requests.post(f"{BASE_URL}/jobs/{job_id}/cancel", timeout=10).json()
+        print(f"Cancel requested, status: {job['status']}")
+        
+        # Running jobs stop on their worker's next heartbeat
+        time.sleep(10)
+        job = requests.get(f"{BASE_URL}/jobs/{job_id}", timeout=10).json()
+        if job["status"] == "cancelled":
+            print("✅ Job cancelled")
+        else:
+            print(f"❌ Unexpected status: {job['status']}")
+            
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Request failed: {e}")
+
+if __name__ == "__main__":
+    print("Testing /jobs endpoints...")
+    print("="*50)
+    test_jobs()
@@ -0,0 +1,117 @@
+"""
+Unit tests for RollingSummaryChatHistory (src/backend/utils/memory.py).
+
+Runs without a backend server or an OpenAI key: a fake LLM counts one token per word
+and returns a fixed summary.
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "backend"))
+
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+
+from utils.memory import RollingSummaryChatHistory
+
+
+class FakeLLM:
+    """Counts one token per word and records the summary calls it receives."""
+
+    def __init__(self, summary: str = "Components: Hive, HDFS"):
+        self.summary = summary
+        self.counted = 0
+        self.summary_calls = []
+
+    def get_num_tokens_from_messages(self, messages):
+        self.counted += len(messages)
+        return sum(len(message.content.split()) for message in messages)
+
+    def invoke(self, messages, **kwargs):
+        self.summary_calls.append(kwargs)
+        if self.summary is None:
+            raise RuntimeError("summary model unavailable")
+        return AIMessage(content=self.summary)
+
+
+def words(count: int) -> str:
+    return " ".join(["word"] * count)
+
+
+class TestRollingSummaryChatHistory(unittest.TestCase):
+
+    def make_history(self, llm, **kwargs):
+        history = RollingSummaryChatHistory(llm, **kwargs)
+        history.add_message(SystemMessage(content=words(10)))
+        return history
+
+    def test_under_ceiling_is_not_compressed(self):
+        llm = FakeLLM()
+        history = self.make_history(llm, max_token_limit=1000, keep_recent_messages=2)
+        history.add_user_message(words(100))
+        history.add_ai_message(words(100))
+        self.assertFalse(history.compress())
+        self.assertEqual(history.num_tokens(), 210)
+        self.assertEqual(llm.summary_calls, [])
+
+    def test_prunes_whole_exchanges(self):
+        llm = FakeLLM()
+        history = self.make_history(llm, max_token_limit=250, keep_recent_messages=1)
+        for _ in range(3):
+            history.add_user_message(words(50))
+            history.add_ai_message(words(50))
+        history.add_user_message(words(50))
+        self.assertTrue(history.compress())
+        # Two exchanges are folded; the kept history starts with a user message
+        self.assertEqual(history.summarized_count, 4)
+        self.assertIsInstance(history.recent_messages[0], HumanMessage)
+        self.assertLessEqual(history.num_tokens(), 250)
+
+    def test_never_splits_an_exchange_for_keep_recent(self):
+        llm = FakeLLM()
+        history = self.make_history(llm, max_token_limit=50, keep_recent_messages=1)
+        history.add_user_message(words(100))
+        history.add_ai_message(words(100))
+        # Taking the exchange would leave nothing of the recent history
+        self.assertFalse(history.compress())
+        self.assertEqual(len(history.recent_messages), 2)
+
+    def test_summary_call_is_capped(self):
+        llm = FakeLLM()
+        history = self.make_history(llm, max_token_limit=100, keep_recent_messages=0, max_summary_tokens=300)
+        history.add_user_message(words(60))
+        history.add_ai_message(words(60))
+        self.assertTrue(history.compress())
+        self.assertEqual(llm.summary_calls, [{"max_tokens": 300}])
+        self.assertEqual(history.messages[1].content.split("\n")[-1], llm.summary)
+
+    def test_tokens_are_counted_once_per_message(self):
+        llm = FakeLLM()
+        history = self.make_history(llm, max_token_limit=100, keep_recent_messages=2)
+        for _ in range(50):
+            history.add_user_message(words(20))
+            history.add_ai_message(words(20))
+            history.compress()
+        # One count per added message plus one per new summary, never the whole history
+        self.assertEqual(llm.counted, 1 + 100 + len(llm.summary_calls))
+        self.assertLessEqual(history.num_tokens(), 100)
+
+    def test_failed_summary_keeps_messages(self):
+        llm = FakeLLM(summary=None)
+        history = self.make_history(llm, max_token_limit=100, keep_recent_messages=0)
+        history.add_user_message(words(60))
+        history.add_ai_message(words(60))
+        with self.assertRaises(RuntimeError):
+            history.compress()
+        self.assertEqual(len(history.recent_messages), 2)
+        self.assertEqual(history.summarized_count, 0)
+        self.assertEqual(history.num_tokens(), 130)
+        # The next attempt folds the same exchange
+        llm.summary = "Components: Hive"
+        self.assertTrue(history.compress())
+        self.assertEqual(history.summarized_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()